@@ -0,0 +1,239 @@
+"""
+Engine benchmark: per-key latency, expansion throughput, memory and store I/O
+over synthetic libraries of increasing size.
+
+    python -m benchmarks.bench_engine --sizes 100,10000,100000 --output bench.json
+    python -m benchmarks.bench_engine --baseline bench.json
+
+With --baseline the run is compared against an earlier report and the exit
+status is non-zero when any size regresses past --threshold.
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Optional
+
+from benchmarks.stats import emit, meta, summarize_ns
+from benchmarks.synthetic import generate_library, generate_typing_stream
+from src.common.flat_index import FlatIndex
+from src.engine.buffer import KeyBuffer
+from src.engine.core import TRIGGER_MAP, ExpansionEngine
+from src.engine.shared_index import compile_flat
+from src.engine.snapshot import cache_path
+from src.engine.store import Store
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+# Keys per process_keys call in the batched replay
+BATCH_SIZES = [1, 16, 64]
+
+# Metrics compared against a baseline; all are "lower is better"
+REGRESSION_METRICS = [
+    ("per_key", "p50_us"),
+    ("per_key", "p99_us"),
+    ("cold_start_ms", None),
+    ("store_load_ms", None),
+]
+
+
+def replay(engine: ExpansionEngine, events) -> dict:
+    samples = []
+    expansions = 0
+    process_key = engine.process_key
+    clock = time.perf_counter_ns
+
+    gc.collect()
+    started = clock()
+    for char, is_backspace in events:
+        t0 = clock()
+        result = process_key(char or "", is_backspace)
+        samples.append(clock() - t0)
+        if result is not None:
+            expansions += 1
+    elapsed_s = (clock() - started) / 1e9
+
+    return {
+        "per_key": summarize_ns(samples),
+        "batch_keys_per_sec": {str(size): replay_batched(engine, events, size) for size in BATCH_SIZES},
+        "keys_per_sec": len(events) / elapsed_s if elapsed_s else 0.0,
+        "expansions": expansions,
+        "expansions_per_sec": expansions / elapsed_s if elapsed_s else 0.0,
+    }
+
+
+def replay_batched(engine: ExpansionEngine, events, size: int) -> float:
+    """Keys per second through process_keys in runs of `size` keys."""
+    batches = [events[i:i + size] for i in range(0, len(events), size)]
+    process_keys = engine.process_keys
+    engine.buffer.clear()
+    gc.collect()
+    started = time.perf_counter()
+    for batch in batches:
+        process_keys(batch)
+    elapsed = time.perf_counter() - started
+    return len(events) / elapsed if elapsed else 0.0
+
+
+def replay_flat(engine: ExpansionEngine, events) -> dict:
+    """What the hook pays per key when it matches against the shared index itself."""
+    started = time.perf_counter()
+    data = compile_flat(engine.matcher, 1, TRIGGER_MAP).tobytes()
+    compile_ms = (time.perf_counter() - started) * 1000
+    flat = FlatIndex(data)
+    buffer = KeyBuffer(engine.max_buffer_size)
+    samples = []
+    clock = time.perf_counter_ns
+    gc.collect()
+    for char, is_backspace in events:
+        t0 = clock()
+        if is_backspace:
+            buffer.pop()
+        elif char:
+            buffer.push(char)
+            if flat.match(buffer, char):
+                buffer.clear()
+        samples.append(clock() - t0)
+    flat.release()
+    return {"flat_compile_ms": compile_ms, "flat_index_bytes": len(data), "flat_per_key": summarize_ns(samples)}
+
+
+def bench_size(size: int, keys: int, seed: int, workdir: str) -> dict:
+    library = generate_library(size, seed)
+    events = generate_typing_stream(library, keys, seed)
+    store_file = os.path.join(workdir, f"store_{size}.json")
+
+    # Store.save on a full library
+    store = Store(store_file)
+    store.snippets = library
+    t0 = time.perf_counter()
+    store.save()
+    save_ms = (time.perf_counter() - t0) * 1000
+    del store
+
+    # Single edits in journal mode (excludes the background group commit)
+    store = Store(store_file, journal=True, compact_after=10 ** 9)
+    edits = store.snippets[: min(100, len(store.snippets))]
+    t0 = time.perf_counter()
+    for snippet in edits:
+        store.update_snippet(snippet)
+    edit_us = (time.perf_counter() - t0) * 1e6 / max(1, len(edits))
+    store.save()
+    store.close()
+    del store
+
+    # Load without the snapshot cache: json parsing plus model validation
+    os.remove(cache_path(store_file))
+    gc.collect()
+    t0 = time.perf_counter()
+    Store(store_file)  # Also rewrites the cache
+    uncached_ms = (time.perf_counter() - t0) * 1000
+
+    # Cold start: what the backend pays before the first key is matched
+    gc.collect()
+    t0 = time.perf_counter()
+    store = Store(store_file)
+    load_ms = (time.perf_counter() - t0) * 1000
+    t1 = time.perf_counter()
+    engine = ExpansionEngine(store)
+    compile_ms = (time.perf_counter() - t1) * 1000
+    cold_start_ms = (time.perf_counter() - t0) * 1000
+
+    result = {
+        "size": size,
+        "active": sum(1 for s in library if s.is_active),
+        "store_save_ms": save_ms,
+        "store_edit_us": edit_us,
+        "store_load_ms": load_ms,
+        "store_load_uncached_ms": uncached_ms,
+        "compile_ms": compile_ms,
+        "cold_start_ms": cold_start_ms,
+        "store_file_bytes": os.path.getsize(store_file),
+    }
+    result.update(replay(engine, events))
+    result.update(replay_flat(engine, events))
+    del engine, store
+
+    # Memory is measured in a separate pass, tracemalloc skews the timings above
+    gc.collect()
+    tracemalloc.start()
+    store = Store(store_file)
+    store_bytes = tracemalloc.get_traced_memory()[0]
+    engine = ExpansionEngine(store)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result["resident_bytes"] = current
+    result["peak_memory_bytes"] = peak
+    result["bytes_per_snippet"] = current / size if size else 0.0
+    # The compiled matching path alone: record table plus trie
+    result["index_bytes_per_snippet"] = (current - store_bytes) / size if size else 0.0
+    del engine, store
+    return result
+
+
+def run_suite(sizes: List[int], keys: int = 20000, seed: int = 0) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_engine_") as workdir:
+        for size in sizes:
+            results.append(bench_size(size, keys, seed, workdir))
+    return {
+        "benchmark": "engine",
+        "meta": meta(keys=keys, seed=seed),
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> List[str]:
+    """Returns one line per metric that got worse than baseline * (1 + threshold)."""
+    previous = {r["size"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get(result["size"])
+        if old is None:
+            continue
+        for key, sub in REGRESSION_METRICS:
+            new_value = result[key][sub] if sub else result[key]
+            old_value = old[key][sub] if sub else old[key]
+            if old_value and new_value > old_value * (1 + threshold):
+                name = f"{key}.{sub}" if sub else key
+                regressions.append(
+                    f"size={result['size']} {name}: {old_value:.2f} -> {new_value:.2f}"
+                )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma separated library sizes (up to 1000000)")
+    parser.add_argument("--keys", type=int, default=20000, help="keystrokes replayed per size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative slowdown before a metric counts as a regression")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    report = run_suite(sizes, args.keys, args.seed)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report["regressions"] = regressions
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        status = 1 if regressions else 0
+
+    emit(report, args.output)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Injection planner benchmark: cost of compiling replacements into
+InjectionPlans, cold and from the plan cache, and the OS calls each
+replacement takes compared with the previous per-key injection.
+
+    python -m benchmarks.bench_injection --expansions 20000 --output injection.json
+
+Runs anywhere: plans are submitted to a RecordingBackend instead of SendInput.
+"""
+import argparse
+import random
+import sys
+import time
+from typing import List, Optional
+
+from benchmarks.stats import emit, meta, summarize_ns
+from benchmarks.synthetic import generate_library
+from src.hook.injection import InjectionPlanner, Injector, RecordingBackend
+
+
+def legacy_calls(backspaces: int, text: str, cursor_offset: int) -> int:
+    """keybd_event / SendInput calls of the previous HookService injection (clipboard path)."""
+    return 2 * backspaces + 4 + 2 * cursor_offset
+
+
+def legacy_typed_calls(text: str) -> int:
+    """SendInput calls of the previous send_text: one per key down and up."""
+    return 2 * len(text)
+
+
+def replacements(count: int, library_size: int, seed: int = 0):
+    rng = random.Random(seed)
+    library = generate_library(library_size, seed=seed)
+    return [
+        (len(s.abbreviation) + 1, s.expansion, rng.choice((0, 0, 0, 3)))
+        for s in rng.choices(library, k=count)
+    ]
+
+
+def bench_plans(work, cache_size: int) -> dict:
+    planner = InjectionPlanner(cache_size=cache_size)
+    injector = Injector(RecordingBackend(), planner, restore_delay=0)
+    replace = injector.replace
+    clock = time.perf_counter_ns
+    samples = []
+    for backspaces, text, cursor_offset in work:
+        t0 = clock()
+        replace(backspaces, text, cursor_offset)
+        samples.append(clock() - t0)
+    result = summarize_ns(samples)
+    result["cache_hit_rate"] = planner.hits / max(1, planner.hits + planner.misses)
+    return result
+
+
+def run_suite(expansions: int = 20000, library_size: int = 500) -> dict:
+    work = replacements(expansions, library_size)
+    backend = RecordingBackend()
+    injector = Injector(backend, restore_delay=0)
+    for replacement in work:
+        injector.replace(*replacement)
+    pasted = sum(1 for _, text, _ in work if len(text) > injector.planner.paste_threshold)
+    return {
+        "benchmark": "injection",
+        "meta": meta(expansions=expansions, library_size=library_size),
+        "per_replacement": {
+            "uncached": bench_plans(work, cache_size=0),
+            "cached": bench_plans(work, cache_size=2 * library_size),
+        },
+        "os_calls_per_replacement": {
+            "planned": len(backend.calls) / len(work),
+            "legacy_paste": sum(legacy_calls(*r) for r in work) / len(work),
+            "legacy_typed": sum(legacy_typed_calls(text) for _, text, _ in work) / len(work),
+        },
+        "events_per_replacement": sum(map(len, backend.calls)) / len(work),
+        "pasted_fraction": pasted / len(work),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--expansions", type=int, default=20000)
+    parser.add_argument("--library-size", type=int, default=500)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    emit(run_suite(args.expansions, args.library_size), args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
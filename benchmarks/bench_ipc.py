@@ -0,0 +1,235 @@
+"""
+IPC wire format microbenchmark: encode + decode cost of KEY_EVENT and
+REPLACE_TEXT frames, binary protocol against the previous JSON framing.
+
+    python -m benchmarks.bench_ipc --events 200000 --output ipc.json
+
+Codec numbers are measured in memory; stream numbers push the same events
+through a socketpair and read them back with MessageReader (or, for JSON,
+the old per-message header + body reads). Burst numbers send the events
+through IPCServer as KEY_EVENTS frames of each batch size. Prefilter
+numbers count what the hook's KeyFilter sends for a synthetic typing
+stream, against one frame per key without it.
+"""
+import argparse
+import json
+import socket
+import struct
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+
+from benchmarks.stats import emit, meta
+from benchmarks.synthetic import generate_library, generate_typing_stream
+from src.common.constants import MSG_KEY_EVENT, MSG_REPLACE_TEXT
+from src.common.ipc import (
+    HEADER,
+    IPCClient,
+    IPCServer,
+    MessageReader,
+    decode_body,
+    decode_key_event,
+    encode_key_event,
+    encode_msg,
+)
+from src.engine.core import relevance_table
+from src.engine.index import SnippetIndex
+from src.hook.prefilter import KeyFilter, RelevanceTable
+
+LENGTH = struct.Struct(">I")
+BATCH_SIZES = [1, 8, 64]
+
+KEY_MESSAGE = {
+    "type": MSG_KEY_EVENT,
+    "payload": {"char": "a", "is_backspace": False, "vk_code": 65, "seq": 1},
+}
+REPLACE_MESSAGE = {
+    "type": MSG_REPLACE_TEXT,
+    "payload": {"backspaces": 4, "text": "by the way", "cursor_offset": 0, "seq": 1},
+}
+
+
+def legacy_encode(msg: dict) -> bytes:
+    """The JSON framing used before the binary protocol."""
+    body = json.dumps(msg).encode("utf-8")
+    return LENGTH.pack(len(body)) + body
+
+
+def legacy_decode(frame: bytes) -> dict:
+    return json.loads(frame[LENGTH.size:].decode("utf-8"))
+
+
+def binary_decode(frame: bytes) -> dict:
+    _, _, code = HEADER.unpack_from(frame)
+    return decode_body(code, memoryview(frame)[HEADER.size:])
+
+
+def per_event_ns(fn: Callable[[], object], events: int) -> float:
+    clock = time.perf_counter_ns
+    started = clock()
+    for _ in range(events):
+        fn()
+    return (clock() - started) / events
+
+
+def bench_codec(msg: dict, events: int) -> dict:
+    legacy_frame = legacy_encode(msg)
+    binary_frame = encode_msg(msg)
+    assert binary_decode(binary_frame) == legacy_decode(legacy_frame) == msg
+
+    result = {
+        "legacy_encode_ns": per_event_ns(lambda: legacy_encode(msg), events),
+        "legacy_decode_ns": per_event_ns(lambda: legacy_decode(legacy_frame), events),
+        "binary_encode_ns": per_event_ns(lambda: encode_msg(msg), events),
+        "binary_decode_ns": per_event_ns(lambda: binary_decode(binary_frame), events),
+        "legacy_frame_bytes": len(legacy_frame),
+        "binary_frame_bytes": len(binary_frame),
+    }
+    legacy = result["legacy_encode_ns"] + result["legacy_decode_ns"]
+    binary = result["binary_encode_ns"] + result["binary_decode_ns"]
+    if msg["type"] == MSG_KEY_EVENT:
+        # What the hook and the server actually call: no message dict at all
+        payload = msg["payload"]
+        body = memoryview(binary_frame)[HEADER.size:]
+        result["binary_encode_direct_ns"] = per_event_ns(
+            lambda: encode_key_event(
+                payload["char"], payload["is_backspace"], payload["vk_code"], payload["seq"]
+            ),
+            events,
+        )
+        result["binary_decode_direct_ns"] = per_event_ns(lambda: decode_key_event(body), events)
+        binary = result["binary_encode_direct_ns"] + result["binary_decode_direct_ns"]
+    result["speedup"] = legacy / binary if binary else 0.0
+    return result
+
+
+def _legacy_reader(sock: socket.socket):
+    def recvall(n: int) -> Optional[bytearray]:
+        data = bytearray()
+        while len(data) < n:
+            packet = sock.recv(n - len(data))
+            if not packet:
+                return None
+            data.extend(packet)
+        return data
+
+    def read() -> Optional[dict]:
+        header = recvall(LENGTH.size)
+        if not header:
+            return None
+        return json.loads(recvall(LENGTH.unpack(header)[0]).decode("utf-8"))
+
+    return read
+
+
+def _binary_reader(sock: socket.socket):
+    # Mirrors IPCServer: key events are decoded straight from the frame
+    reader = MessageReader(sock)
+
+    def read():
+        frame = reader.read_frame()
+        if frame is None:
+            return None
+        return decode_key_event(frame[1])
+
+    return read
+
+
+def bench_stream(events: int, encode: Callable[[dict], bytes], make_reader) -> float:
+    """Keys per second from encode on one end to a decoded event on the other."""
+    a, b = socket.socketpair()
+    frame_count = [0]
+
+    def consume():
+        read = make_reader(b)
+        while read() is not None:
+            frame_count[0] += 1
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    started = time.perf_counter()
+    for _ in range(events):
+        a.sendall(encode(KEY_MESSAGE))
+    a.shutdown(socket.SHUT_WR)
+    consumer.join()
+    elapsed = time.perf_counter() - started
+    a.close()
+    b.close()
+    assert frame_count[0] == events
+    return events / elapsed if elapsed else 0.0
+
+
+def bench_burst(events: int, batch: int) -> float:
+    """Keys per second from the client to the server's key handlers, `batch` keys per frame."""
+    received = [0]
+    done = threading.Event()
+
+    def count(n: int):
+        received[0] += n
+        if received[0] >= events:
+            done.set()
+
+    server = IPCServer(
+        handler=lambda msg, sock: None,
+        key_handler=lambda char, is_backspace, vk_code, seq, sock: count(1),
+        keys_handler=lambda keys, sock: count(len(keys)),
+    )
+    a, b = socket.socketpair()
+    server.serve(b)
+    client = IPCClient.from_socket(a)
+    frame = [("a", False, 65, 1)] * batch
+    started = time.perf_counter()
+    for _ in range(events // batch):
+        client.send_key_events(frame)
+    done.wait(30)
+    elapsed = time.perf_counter() - started
+    client.close()
+    server.stop()
+    return received[0] / elapsed if elapsed else 0.0
+
+
+def bench_prefilter(keys: int, library_size: int = 1000) -> dict:
+    library = generate_library(library_size, seed=11)
+    table = relevance_table(SnippetIndex.build(1, library))
+    key_filter = KeyFilter()
+    key_filter.set_table(RelevanceTable.from_payload(table))
+    frames = 0
+    for seq, (char, is_backspace) in enumerate(generate_typing_stream(library, keys, seed=11), 1):
+        if key_filter.key(char, is_backspace, 0, seq):
+            frames += 1
+    return {
+        "library_size": library_size,
+        "keys": keys,
+        "frames": frames,
+        "events": key_filter.sent,
+        "fire_suffixes": len(table["suffixes"]),
+    }
+
+
+def run_suite(events: int = 200000) -> dict:
+    return {
+        "benchmark": "ipc",
+        "meta": meta(events=events),
+        "key_event": bench_codec(KEY_MESSAGE, events),
+        "replace_text": bench_codec(REPLACE_MESSAGE, events),
+        "stream_keys_per_sec": {
+            "legacy": bench_stream(events, legacy_encode, _legacy_reader),
+            "binary": bench_stream(events, encode_msg, _binary_reader),
+        },
+        "burst_keys_per_sec": {str(size): bench_burst(events - events % size, size) for size in BATCH_SIZES},
+        "prefilter": bench_prefilter(min(events, 50000)),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=200000, help="messages per measurement")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    emit(run_suite(args.events), args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+IPC transport benchmark: KEY_EVENT -> REPLACE_TEXT round-trip latency per
+transport, through the real IPCServer / IPCClient code.
+
+    python -m benchmarks.bench_transport --round-trips 20000 --output transport.json
+
+"tcp_nagle" is TCP with Nagle left on at both ends, the previous default, for
+comparison. The "asyncio_*" rows run the same round trips against AsyncIPCServer.
+"""
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+from benchmarks.stats import emit, meta, summarize_ns
+from src.common.async_ipc import AsyncIPCServer
+from src.common.ipc import IPCClient, IPCServer, encode_replace_text
+from src.common.transport import HAS_AF_UNIX, TCPTransport, UnixTransport
+
+REPLY = encode_replace_text(4, "by the way", 0)
+
+
+def _reply(char, is_backspace, vk_code, seq, sock):
+    sock.sendall(REPLY)
+
+
+def measure(client: IPCClient, round_trips: int, warmup: int = 200) -> dict:
+    send = client.send_key_event
+    read = client.reader.read_frame
+    clock = time.perf_counter_ns
+    samples = []
+    for i in range(warmup + round_trips):
+        t0 = clock()
+        send("a", False, 65)
+        read()
+        if i >= warmup:
+            samples.append(clock() - t0)
+    return summarize_ns(samples)
+
+
+def bench_listening(transport, client_transport, round_trips: int, server_cls=IPCServer) -> dict:
+    server = server_cls(handler=lambda msg, sock: None, key_handler=_reply, transport=transport)
+    server.start()
+    client = IPCClient(transport=client_transport)
+    try:
+        client.connect()
+        return measure(client, round_trips)
+    finally:
+        client.close()
+        server.stop()
+
+
+def bench_socketpair(round_trips: int, server_cls=IPCServer) -> dict:
+    backend_end, hook_end = socket.socketpair()
+    server = server_cls(handler=lambda msg, sock: None, key_handler=_reply)
+    server.serve(backend_end)
+    client = IPCClient.from_socket(hook_end)
+    try:
+        return measure(client, round_trips)
+    finally:
+        client.close()
+        server.stop()
+
+
+def run_suite(round_trips: int = 20000) -> dict:
+    results = {"socketpair": bench_socketpair(round_trips)}
+    if HAS_AF_UNIX:
+        with tempfile.TemporaryDirectory(prefix="bench_ipc_") as workdir:
+            path = os.path.join(workdir, "bench.sock")
+            results["unix"] = bench_listening(UnixTransport(path), UnixTransport(path), round_trips)
+    tcp = TCPTransport(port=0)
+    results["tcp"] = bench_listening(tcp, tcp, round_trips)
+    tcp = TCPTransport(port=0, nodelay=False)
+    results["tcp_nagle"] = bench_listening(tcp, tcp, round_trips)
+    results["asyncio_socketpair"] = bench_socketpair(round_trips, AsyncIPCServer)
+    tcp = TCPTransport(port=0)
+    results["asyncio_tcp"] = bench_listening(tcp, tcp, round_trips, AsyncIPCServer)
+    return {
+        "benchmark": "transport",
+        "meta": meta(round_trips=round_trips),
+        "round_trip": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--round-trips", type=int, default=20000)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    emit(run_suite(args.round_trips), args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
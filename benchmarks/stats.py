@@ -0,0 +1,46 @@
+"""Shared helpers for the benchmark scripts: latency summaries and JSON reports."""
+import json
+import platform
+import sys
+import time
+from typing import Dict, List, Optional
+
+
+def percentile(sorted_samples: List[int], pct: float) -> int:
+    if not sorted_samples:
+        return 0
+    index = min(len(sorted_samples) - 1, int(round(pct / 100.0 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def summarize_ns(samples: List[int]) -> Dict[str, float]:
+    """p50/p99/max/mean of nanosecond samples, reported in microseconds."""
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        "count": count,
+        "p50_us": percentile(ordered, 50) / 1000.0,
+        "p99_us": percentile(ordered, 99) / 1000.0,
+        "max_us": (ordered[-1] if ordered else 0) / 1000.0,
+        "mean_us": (sum(ordered) / count / 1000.0) if count else 0.0,
+    }
+
+
+def meta(**extra) -> dict:
+    info = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+    }
+    info.update(extra)
+    return info
+
+
+def emit(report: dict, output: Optional[str]) -> None:
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,120 @@
+"""
+Synthetic snippet libraries and typing streams for the benchmarks.
+
+Everything is driven by a seeded random.Random, so two runs with the same
+arguments replay exactly the same keys against exactly the same library.
+"""
+import random
+import string
+from typing import List, Optional, Tuple
+from src.common.models import Snippet, TriggerType
+
+# Abbreviation lengths as seen in typical libraries: mostly 3-5 chars
+ABBR_LENGTHS = [2, 3, 4, 5, 6, 7, 8]
+ABBR_LENGTH_WEIGHTS = [4, 25, 30, 20, 10, 6, 5]
+
+# Instant (NONE) snippets usually carry a prefix so prose never fires them
+INSTANT_PREFIXES = [";", "/", ",", "."]
+
+TRIGGERS = [TriggerType.SPACE, TriggerType.ENTER, TriggerType.NONE]
+TRIGGER_WEIGHTS = [50, 10, 40]
+
+PLACEHOLDER_MIXES = [
+    "",
+    "{{date}}",
+    "{{time}}",
+    "{{datetime}}",
+    "{{clipboard}}",
+    "{{cursor}}",
+    "{{date}} {{cursor}}",
+]
+PLACEHOLDER_WEIGHTS = [70, 6, 4, 3, 4, 9, 4]
+
+WORDS = (
+    "the of and to in is you that it he was for on are as with his they at be this "
+    "have from or one had by word but not what all were we when your can said there "
+    "use an each which she do how their if will up other about out many then them "
+    "these so some her would make like him into time has look two more write go see"
+).split()
+
+ALPHABET = string.ascii_lowercase + string.digits
+
+
+def _abbreviation(rng: random.Random, trigger: TriggerType) -> str:
+    length = rng.choices(ABBR_LENGTHS, ABBR_LENGTH_WEIGHTS)[0]
+    abbr = "".join(rng.choice(ALPHABET) for _ in range(length))
+    if trigger == TriggerType.NONE:
+        abbr = rng.choice(INSTANT_PREFIXES) + abbr
+    return abbr
+
+
+def _expansion(rng: random.Random) -> str:
+    # Mostly short phrases, with a tail of multi-KB boilerplate
+    roll = rng.random()
+    if roll < 0.80:
+        words = rng.randint(2, 12)
+    elif roll < 0.98:
+        words = rng.randint(30, 120)
+    else:
+        words = rng.randint(400, 1200)
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+
+    placeholder = rng.choices(PLACEHOLDER_MIXES, PLACEHOLDER_WEIGHTS)[0]
+    if placeholder:
+        cut = rng.randint(0, len(text))
+        text = text[:cut] + placeholder + text[cut:]
+    return text
+
+
+def generate_library(size: int, seed: int = 0) -> List[Snippet]:
+    """Builds `size` snippets with unique (abbreviation, trigger) pairs."""
+    rng = random.Random(seed)
+    seen = set()
+    snippets = []
+    while len(snippets) < size:
+        trigger = rng.choices(TRIGGERS, TRIGGER_WEIGHTS)[0]
+        abbr = _abbreviation(rng, trigger)
+        if (abbr, trigger) in seen:
+            continue
+        seen.add((abbr, trigger))
+        snippets.append(
+            Snippet(
+                abbreviation=abbr,
+                expansion=_expansion(rng),
+                trigger=trigger,
+                is_active=rng.random() > 0.02,
+            )
+        )
+    return snippets
+
+
+TRIGGER_CHARS = {TriggerType.SPACE: " ", TriggerType.ENTER: "\n", TriggerType.NONE: ""}
+
+
+def generate_typing_stream(
+    snippets: List[Snippet],
+    keys: int,
+    seed: int = 0,
+    abbreviation_rate: float = 0.05,
+    backspace_rate: float = 0.03,
+) -> List[Tuple[Optional[str], bool]]:
+    """
+    Returns `keys` (char, is_backspace) events: prose words separated by spaces,
+    the odd typo corrected with backspace, and now and then an abbreviation
+    followed by its trigger key.
+    """
+    rng = random.Random(seed)
+    active = [s for s in snippets if s.is_active]
+    events: List[Tuple[Optional[str], bool]] = []
+    while len(events) < keys:
+        if active and rng.random() < abbreviation_rate:
+            snippet = rng.choice(active)
+            chars = snippet.abbreviation + TRIGGER_CHARS[snippet.trigger]
+        else:
+            chars = rng.choice(WORDS) + " "
+        for ch in chars:
+            if rng.random() < backspace_rate:
+                events.append((rng.choice(string.ascii_lowercase), False))
+                events.append((None, True))
+            events.append((ch, False))
+    return events[:keys]
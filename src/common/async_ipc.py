@@ -0,0 +1,363 @@
+"""
+asyncio IPC server and client, same frames and handler contract as
+src/common/ipc.py.
+
+One event loop thread serves every connection (the hook, the GUI, tools).
+Key events are decoded and handled on the loop as the bytes arrive; other
+messages go to a single control worker thread so a slow RELOAD_CONFIG never
+delays a keystroke. Handlers get the Connection as their `sock`: its
+sendall() can be called from any thread.
+
+Flow control, per connection:
+
+*   Replies are written straight to the transport until its write buffer
+    passes WRITE_HIGH_WATER (the peer stopped reading). The connection is
+    then congested: we stop reading its requests, so a stalled client
+    cannot make us queue unbounded replies.
+*   While congested, DROPPABLE_MESSAGES (PING/PONG) are dropped, anything
+    else waits in a queue of at most max_pending frames. A client that lets
+    that queue fill up is disconnected.
+*   stop() stops accepting, lets the control worker finish, flushes every
+    connection's queued replies and closes it, then joins the loop thread.
+"""
+import asyncio
+import logging
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+from src.common.constants import DROPPABLE_MESSAGES, MESSAGE_CODES, PROTOCOL_VERSION
+from src.common.ipc import (
+    CODE_KEY_EVENT,
+    CODE_KEY_EVENTS,
+    HEADER,
+    MAX_BODY,
+    ProtocolError,
+    decode_body,
+    decode_key_event,
+    decode_key_events,
+    encode_key_event,
+    encode_msg,
+)
+from src.common.transport import TCPTransport, Transport, default_transport, tune
+
+logger = logging.getLogger(__name__)
+
+# Frames queued per connection while its peer is not reading
+MAX_PENDING = 256
+# Transport write buffer size at which a connection counts as congested
+WRITE_HIGH_WATER = 64 * 1024
+# How long stop() waits for queued replies to drain before cutting clients off
+SHUTDOWN_TIMEOUT = 1.0
+
+DROPPABLE_CODES = frozenset(MESSAGE_CODES[name] for name in DROPPABLE_MESSAGES)
+# The message code is the last header byte
+CODE_INDEX = HEADER.size - 1
+
+
+class Connection(asyncio.Protocol):
+    """One client connection; handed to handlers as their `sock`."""
+
+    def __init__(self, server: "AsyncIPCServer"):
+        self.server = server
+        self.transport = None
+        self.buffer = bytearray()
+        self.pending = deque()
+        self.congested = False
+        self.dropped = 0
+        self.closed = server.loop.create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.set_write_buffer_limits(high=WRITE_HIGH_WATER)
+        self.server.connections.add(self)
+        logger.debug(f"Client connected: {transport.get_extra_info('peername')!r}")
+
+    def connection_lost(self, exc):
+        self.server.connections.discard(self)
+        self.pending.clear()
+        if self.server.on_disconnect is not None:
+            try:
+                self.server.on_disconnect(self)
+            except Exception:
+                logger.exception("IPC disconnect handler failed")
+        if self.dropped:
+            logger.info(f"Client disconnected, {self.dropped} replies dropped while congested")
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    def data_received(self, data):
+        self.buffer += data
+        self._dispatch()
+
+    def _dispatch(self):
+        buf = self.buffer
+        server = self.server
+        key_handler = server.key_handler
+        keys_handler = server.keys_handler
+        pos = 0
+        # Stop at congestion: the rest stays buffered until the peer reads again
+        while not self.congested and len(buf) - pos >= HEADER.size:
+            length, version, code = HEADER.unpack_from(buf, pos)
+            if version != PROTOCOL_VERSION or length > MAX_BODY:
+                logger.error(f"Dropping client: bad frame (version {version}, {length} bytes)")
+                self.transport.abort()
+                return
+            start = pos + HEADER.size
+            end = start + length
+            if end > len(buf):
+                break
+            pos = end
+            try:
+                if code == CODE_KEY_EVENT and key_handler is not None:
+                    key_handler(*decode_key_event(buf, start), self)
+                elif code == CODE_KEY_EVENTS and keys_handler is not None:
+                    keys_handler(decode_key_events(bytes(buf[start:end])), self)
+                else:
+                    server.dispatch(decode_body(code, bytes(buf[start:end])), self)
+            except ProtocolError as e:
+                logger.error(f"Dropping client: {e}")
+                self.transport.abort()
+                return
+            except Exception:
+                logger.exception("IPC handler failed")
+        del buf[:pos]
+
+    def sendall(self, data: bytes):
+        """Queues one encoded frame. Safe to call from any thread."""
+        if threading.get_ident() == self.server.loop_thread_id:
+            self.send(data)
+        else:
+            self.server.loop.call_soon_threadsafe(self.send, data)
+
+    def send(self, data: bytes):
+        """Loop thread only."""
+        transport = self.transport
+        if transport is None or transport.is_closing():
+            return
+        if not self.congested:
+            transport.write(data)
+        elif data[CODE_INDEX] in DROPPABLE_CODES:
+            self.dropped += 1
+        elif len(self.pending) >= self.server.max_pending:
+            logger.warning(f"Client not reading, disconnecting with {len(self.pending)} replies queued")
+            transport.abort()
+        else:
+            self.pending.append(data)
+
+    def pause_writing(self):
+        self.congested = True
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.congested = False
+        pending = self.pending
+        while pending and not self.congested:
+            self.transport.write(pending.popleft())
+        if not self.congested:
+            self.transport.resume_reading()
+            self._dispatch()
+
+    def close(self):
+        """Flushes queued replies, then closes once the transport drained."""
+        if self.transport is None or self.transport.is_closing():
+            return
+        self.transport.pause_reading()
+        while self.pending:
+            self.transport.write(self.pending.popleft())
+        self.transport.close()
+
+
+class AsyncIPCServer:
+    """
+    Drop-in for IPCServer: handler(msg, sock) for decoded messages,
+    key_handler(char, is_backspace, vk_code, seq, sock) for KEY_EVENT frames and
+    keys_handler(events, sock) for KEY_EVENTS frames.
+    start() listens on the transport, serve() adopts a connected socket;
+    both run on the server's own event loop thread.
+
+    Messages other than key events run on one control worker thread, in
+    arrival order; with control_worker=False they run on the loop too.
+    Types in inline_types always run on the loop, in order with the keys.
+    on_disconnect(sock) runs on the loop when a connection is lost.
+    """
+
+    def __init__(
+        self,
+        port: Optional[int] = None,
+        handler: Callable[[dict, Connection], None] = None,
+        key_handler: Optional[Callable[[Optional[str], bool, int, int, Connection], None]] = None,
+        transport: Optional[Transport] = None,
+        max_pending: int = MAX_PENDING,
+        control_worker: bool = True,
+        keys_handler: Optional[Callable[[list, Connection], None]] = None,
+        inline_types: Iterable[str] = (),
+        on_disconnect: Optional[Callable[[Connection], None]] = None,
+    ):
+        if transport is None:
+            transport = TCPTransport(port=port) if port is not None else default_transport()
+        self.transport = transport
+        if handler:
+            self.handler = handler
+        self.key_handler = key_handler
+        self.keys_handler = keys_handler
+        self.max_pending = max_pending
+        self.control_worker = control_worker
+        self.inline_types = frozenset(inline_types)
+        self.on_disconnect = on_disconnect
+        self.connections = set()
+        self.loop = None
+        self.loop_thread_id = None
+        self.thread = None
+        self.executor = None
+        self._server = None
+
+    def start(self):
+        self._start_loop()
+        self._call(self._listen())
+        logger.info(f"IPC Server listening on {self.transport!r}")
+
+    def serve(self, sock: socket.socket) -> Connection:
+        """Handles messages from an already connected socket."""
+        self._start_loop()
+        _, connection = self._call(
+            self.loop.connect_accepted_socket(lambda: Connection(self), tune(sock))
+        )
+        return connection
+
+    def dispatch(self, msg: dict, connection: Connection):
+        if self.executor is not None and msg.get("type") not in self.inline_types:
+            self.executor.submit(self._handle, msg, connection)
+        else:
+            self._handle(msg, connection)
+
+    def _handle(self, msg: dict, connection: Connection):
+        try:
+            self.handler(msg, connection)
+        except Exception:
+            logger.exception(f"IPC handler failed on {msg.get('type')}")
+
+    def _start_loop(self):
+        if self.loop is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        if self.control_worker:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ipc-control")
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop_thread_id = threading.get_ident()
+            self.loop.call_soon(started.set)
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="ipc-loop", daemon=True)
+        self.thread.start()
+        started.wait()
+
+    def _call(self, coro, timeout: Optional[float] = None):
+        """Runs a coroutine on the loop thread and waits for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def _listen(self):
+        self._server = await self.loop.create_server(lambda: Connection(self), sock=self.transport.listen())
+
+    async def _stop_accepting(self):
+        if self._server is not None:
+            self._server.close()
+        for connection in list(self.connections):
+            connection.transport.pause_reading()
+
+    async def _close_connections(self, timeout: float):
+        connections = list(self.connections)
+        for connection in connections:
+            connection.close()
+        if connections:
+            await asyncio.wait([c.closed for c in connections], timeout=timeout)
+        for connection in list(self.connections):
+            connection.transport.abort()
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+
+    def stop(self, timeout: float = SHUTDOWN_TIMEOUT):
+        if self.loop is None:
+            return
+        listening = self._server is not None
+        try:
+            self._call(self._stop_accepting(), timeout)
+            if self.executor is not None:
+                # Control messages already read still get handled and answered
+                self.executor.shutdown(wait=True)
+                self.executor = None
+            self._call(self._close_connections(timeout), timeout + 1)
+        except Exception as e:
+            logger.warning(f"Unclean IPC shutdown: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        if listening:
+            self.transport.close()
+
+
+class AsyncIPCClient:
+    """
+    Client for code that already runs an event loop. send() waits for the
+    transport to drain, so a writer cannot outrun a server that stopped reading.
+    """
+
+    def __init__(self, port: Optional[int] = None, transport: Optional[Transport] = None):
+        if transport is None:
+            transport = TCPTransport(port=port) if port is not None else default_transport()
+        self.transport = transport
+        self.sock = None
+        self.reader = None
+        self.writer = None
+
+    @classmethod
+    def from_socket(cls, sock: socket.socket) -> "AsyncIPCClient":
+        """A client over an already connected socket; connect() still has to be awaited."""
+        client = cls.__new__(cls)
+        client.transport = None
+        client.sock = tune(sock)
+        client.reader = client.writer = None
+        return client
+
+    async def connect(self):
+        if self.writer is not None:
+            return
+        # Local sockets connect immediately; no point in an async connect
+        sock = self.sock if self.sock is not None else self.transport.connect()
+        self.reader, self.writer = await asyncio.open_connection(sock=sock)
+
+    async def send(self, msg: dict):
+        self.writer.write(encode_msg(msg))
+        await self.writer.drain()
+
+    async def send_key_event(
+        self, char: Optional[str], is_backspace: bool = False, vk_code: int = 0, seq: int = 0
+    ):
+        self.writer.write(encode_key_event(char, is_backspace, vk_code, seq))
+        await self.writer.drain()
+
+    async def recv(self) -> Optional[dict]:
+        """The next message, or None once the server closed the connection."""
+        try:
+            length, version, code = HEADER.unpack(await self.reader.readexactly(HEADER.size))
+            if version != PROTOCOL_VERSION:
+                raise ProtocolError(f"Unsupported protocol version {version}")
+            body = await self.reader.readexactly(length) if length else b""
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+        return decode_body(code, body)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+            self.writer = self.reader = None
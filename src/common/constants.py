@@ -3,16 +3,72 @@
 IPC_PORT = 5055
 GUI_PORT = 5001 # If needed for reverse comms, though usually GUI -> Backend is enough
 
-# Message Types
+# IPC transport (see src/common/transport.py): "unix", "tcp", "unix:<path>" or "tcp:<host>:<port>"
+IPC_TRANSPORT_ENV = "TEXT_EXPANDER_IPC"
+IPC_SOCKET_NAME = "text_expander.sock"
+
+# Set to a shared memory name (or "1" for a per-run default) to let the hook
+# match keys itself against an index the backend publishes there
+SHARED_INDEX_ENV = "TEXT_EXPANDER_SHARED_INDEX"
+
+# Message Types: the one registry shared by every process (see src/common/ipc.py)
 MSG_KEY_EVENT = "KEY_EVENT"
 MSG_REPLACE_TEXT = "REPLACE_TEXT"
 MSG_PASTE_TEXT = "PASTE_TEXT"
 MSG_RELOAD_CONFIG = "RELOAD_CONFIG"
 MSG_PING = "PING"
 MSG_PONG = "PONG"
+# A run of key events in one frame, sent when the hook has several queued
+MSG_KEY_EVENTS = "KEY_EVENTS"
+# Hook -> backend when the hook matched locally (shared index): render this snippet
+MSG_EXPAND = "EXPAND"
+# Hook -> backend to subscribe, backend -> hook with the table (see src/hook/prefilter.py)
+MSG_RELEVANCE = "RELEVANCE"
+# Hook -> backend when the foreground executable changed (profile switch)
+MSG_FOREGROUND = "FOREGROUND"
+# Backend -> hook: engine_enabled and ignored_apps, on subscribe and on every change
+MSG_GATING = "GATING"
+
+# Wire codes; never renumber, only append. Bump the version on layout changes.
+PROTOCOL_VERSION = 2
+MESSAGE_CODES = {
+    MSG_KEY_EVENT: 1,
+    MSG_REPLACE_TEXT: 2,
+    MSG_PASTE_TEXT: 3,
+    MSG_RELOAD_CONFIG: 4,
+    MSG_PING: 5,
+    MSG_PONG: 6,
+    MSG_KEY_EVENTS: 7,
+    MSG_EXPAND: 8,
+    MSG_RELEVANCE: 9,
+    MSG_FOREGROUND: 10,
+    MSG_GATING: 11,
+}
+
+# Chars the hook sends in place of keys it filtered out. Both are Unicode
+# noncharacters, so no abbreviation can contain them.
+# KEY_BARRIER stands for a run of chars outside the abbreviation alphabet;
+# its vk_code is the run length. KEY_RESET empties the backend's buffer.
+KEY_BARRIER = "\uffff"
+KEY_RESET = "\ufffe"
+
+# Vk codes after which the buffer no longer describes the text at the caret:
+# Escape, Page Up/Down, End, Home, arrows, Delete. The hook sends KEY_RESET
+# for them, or clears its own buffer when it matches locally.
+RESET_KEYS = (0x1B, *range(0x21, 0x29), 0x2E)
+
+# Replies a congested connection may drop instead of queueing; everything
+# else (text to inject, config changes) is queued or the client is cut off
+DROPPABLE_MESSAGES = (MSG_PING, MSG_PONG)
 
 # Paths
 import os
 APP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 ASSETS_DIR = os.path.join(APP_DIR, "assets")
 DATA_DIR = os.path.join(APP_DIR, "data")
+
+# Session recording (see src/engine/session.py). Set to a file path to record
+# the KEY_EVENTs the backend receives; set the redact variable to "0" to keep
+# chars that cannot occur in an abbreviation.
+SESSION_LOG_ENV = "TEXT_EXPANDER_SESSION_LOG"
+SESSION_REDACT_ENV = "TEXT_EXPANDER_SESSION_REDACT"
@@ -0,0 +1,259 @@
+"""
+Compiled matcher in a flat, position-independent layout, for matching in
+the hook process against the backend's index.
+
+The backend (src/engine/shared_index.py) flattens its trie into one array of
+native 32-bit words and writes it to a multiprocessing.shared_memory
+segment; the hook maps the segment and walks the words in place, no copy
+and no Python objects per node. Every reference is an index into a column
+of the same array, so the block means the same wherever it is mapped.
+
+Columns (CSR: the items of node i are [start[i], start[i + 1])):
+
+    node_edges     node_count + 1   into edge_chars / edge_targets
+    node_labels    node_count + 1   into label_chars (folded path, see matcher._Node)
+    node_entry     node_count       entry of the abbreviation ending here, or NO_ENTRY
+    edge_chars     edge_count       code point, sorted per node
+    edge_targets   edge_count       node index
+    label_chars    ...              code points
+    entry_lengths  entry_count      abbreviation length
+    entry_ids      entry_count + 1  byte offsets into id_bytes
+    id_bytes       ...              snippet ids as UTF-8, four bytes per word
+    root_chars     root_count       trigger char, 0 for instant (NONE) snippets
+    root_nodes     root_count       root of that trigger's trie
+
+Generations: a small control segment named `name` holds the current
+generation number; generation g lives in the segment f"{name}_{g}". The
+backend writes a new generation completely before storing its number, so a
+reader either sees the old index or the new one, never a partial one.
+"""
+import logging
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x58495854  # "TXIX"
+FORMAT = 1
+NO_ENTRY = 0xFFFFFFFF
+
+COLUMNS = (
+    "node_edges",
+    "node_labels",
+    "node_entry",
+    "edge_chars",
+    "edge_targets",
+    "label_chars",
+    "entry_lengths",
+    "entry_ids",
+    "id_bytes",
+    "root_chars",
+    "root_nodes",
+)
+# magic, format, generation, max abbreviation length, then (offset, length) per column
+HEADER_WORDS = 4 + 2 * len(COLUMNS)
+
+# Control segment: magic, format, current generation (0: none yet), spare
+CONTROL_WORDS = 4
+CONTROL_GENERATION = 2
+
+WORD_BYTES = 4
+
+
+def segment_name(name: str, generation: int) -> str:
+    return f"{name}_{generation}"
+
+
+def attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Opens an existing segment without handing it to a resource tracker: the
+    backend owns the segments, and a tracker cleaning up after the hook
+    would unlink them under it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Before Python 3.13 every attach registers; the hook attaches from one
+    # thread only, so swapping the function out for the call is safe here
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class FlatIndex:
+    """Read-only view of one compiled generation; the same match rules as SnippetMatcher."""
+
+    __slots__ = (
+        "_view", "words", "generation", "max_abbr_len", "roots",
+        "node_edges", "node_labels", "node_entry", "edge_chars", "edge_targets",
+        "label_chars", "entry_lengths", "entry_ids", "id_bytes",
+    )
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer)
+        self.words = words = self._view[: len(self._view) - len(self._view) % WORD_BYTES].cast("I")
+        if len(words) < HEADER_WORDS or words[0] != MAGIC or words[1] != FORMAT:
+            self.release()
+            raise ValueError("Not a compiled index")
+        self.generation = words[2]
+        self.max_abbr_len = words[3]
+        roots = {}
+        for i, column in enumerate(COLUMNS):
+            offset, length = words[4 + 2 * i], words[5 + 2 * i]
+            if column.startswith("root_"):
+                roots[column] = words[offset:offset + length].tolist()
+            else:
+                # Absolute word offset of the column; lookups index self.words
+                setattr(self, column, offset)
+        # Trigger char code point (0: instant) -> root node
+        self.roots = dict(zip(roots["root_chars"], roots["root_nodes"]))
+
+    def release(self) -> None:
+        """Drops the views so the underlying segment can be closed."""
+        self.words.release()
+        self._view.release()
+
+    def longest_suffix(self, root: int, buffer: Sequence[str], end: int) -> int:
+        """The entry with the longest abbreviation ending at buffer[:end], or -1."""
+        words = self.words
+        node_edges, node_labels, node_entry = self.node_edges, self.node_labels, self.node_entry
+        edge_chars, edge_targets = self.edge_chars, self.edge_targets
+        label_chars = self.label_chars
+        node = root
+        i = end
+        best = -1
+        while i > 0:
+            lo = words[node_edges + node]
+            hi = words[node_edges + node + 1]
+            if lo == hi:
+                break
+            i -= 1
+            code = ord(buffer[i])
+            # Binary search of the node's sorted edges, inlined: this is the hot loop
+            while lo < hi:
+                mid = (lo + hi) >> 1
+                found = words[edge_chars + mid]
+                if found < code:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo == words[node_edges + node + 1] or words[edge_chars + lo] != code:
+                break
+            node = words[edge_targets + lo]
+            start = words[node_labels + node]
+            stop = words[node_labels + node + 1]
+            if stop - start > i:
+                break
+            for j in range(label_chars + start, label_chars + stop):
+                i -= 1
+                if ord(buffer[i]) != words[j]:
+                    return best
+            entry = words[node_entry + node]
+            if entry != NO_ENTRY:
+                best = entry
+        return best
+
+    def match(self, buffer: Sequence[str], last_char: str) -> Optional[Tuple[int, int]]:
+        """
+        (entry, chars_to_delete) for the buffer whose last char is last_char, or None.
+        Instant snippets must end the buffer; triggered ones end right before
+        their trigger char.
+        """
+        size = len(buffer)
+        best = self.longest_suffix(self.roots[0], buffer, size) if 0 in self.roots else -1
+        root = self.roots.get(ord(last_char))
+        if root is not None:
+            triggered = self.longest_suffix(root, buffer, size - 1)
+            if triggered >= 0 and (best < 0 or self.entry_length(triggered) > self.entry_length(best)):
+                return triggered, self.entry_length(triggered) + 1
+        if best >= 0:
+            return best, self.entry_length(best)
+        return None
+
+    def entry_length(self, entry: int) -> int:
+        return self.words[self.entry_lengths + entry]
+
+    def entry_id(self, entry: int) -> str:
+        words = self.words
+        base = self.id_bytes * WORD_BYTES
+        start = base + words[self.entry_ids + entry]
+        stop = base + words[self.entry_ids + entry + 1]
+        return str(self._view[start:stop], "utf-8")
+
+
+class SharedIndexReader:
+    """
+    Follows the generations the backend publishes under `name`.
+    current() is meant to be called once per key: it is one word read unless
+    a new generation appeared.
+    """
+
+    # While the backend has not published anything yet, look again this often
+    RETRY_INTERVAL = 0.5
+
+    def __init__(self, name: str):
+        self.name = name
+        self._control = None
+        self._control_words = None
+        self._segment = None
+        self._index: Optional[FlatIndex] = None
+        self._retry_at = 0.0
+
+    def current(self) -> Optional[FlatIndex]:
+        control = self._control_words
+        if control is None:
+            if time.monotonic() < self._retry_at or not self._open_control():
+                return self._index
+            control = self._control_words
+        generation = control[CONTROL_GENERATION]
+        index = self._index
+        if index is None or generation != index.generation:
+            if not generation:
+                # The backend shut down; a new one creates a new control segment
+                self.close()
+                return None
+            self._switch(generation)
+        return self._index
+
+    def _open_control(self) -> bool:
+        try:
+            self._control = attach(self.name)
+        except FileNotFoundError:
+            self._retry_at = time.monotonic() + self.RETRY_INTERVAL
+            return False
+        self._control_words = self._control.buf[: CONTROL_WORDS * WORD_BYTES].cast("I")
+        return True
+
+    def _switch(self, generation: int) -> None:
+        try:
+            segment = attach(segment_name(self.name, generation))
+        except FileNotFoundError:
+            # Already replaced by a newer generation; the next key picks that up
+            return
+        try:
+            index = FlatIndex(segment.buf)
+        except ValueError as e:
+            logger.error(f"Ignoring shared index generation {generation}: {e}")
+            segment.close()
+            return
+        self._close_index()
+        self._segment, self._index = segment, index
+        logger.info(f"Hook now matching against index generation {generation}")
+
+    def _close_index(self) -> None:
+        if self._index is not None:
+            self._index.release()
+            self._segment.close()
+            self._segment = self._index = None
+
+    def close(self) -> None:
+        self._close_index()
+        if self._control is not None:
+            self._control_words.release()
+            self._control.close()
+            self._control = self._control_words = None
@@ -3,91 +3,341 @@ import json
 import struct
 import threading
 import logging
-from typing import Callable, Optional
-from src.common.constants import IPC_PORT
+from typing import Callable, List, Optional, Tuple
+from src.common.constants import (
+    MESSAGE_CODES,
+    PROTOCOL_VERSION,
+    MSG_KEY_EVENT,
+    MSG_KEY_EVENTS,
+    MSG_REPLACE_TEXT,
+    MSG_PASTE_TEXT,
+    MSG_RELOAD_CONFIG,
+    MSG_PING,
+    MSG_PONG,
+)
+from src.common.transport import TCPTransport, Transport, default_transport, tune
 
 logger = logging.getLogger(__name__)
 
-# Protocol: 4 bytes length (big endian) + JSON body
-MSG_KEY_EVENT = "key_event"
-MSG_REPLACE_TEXT = "replace_text"
-MSG_PING = "ping"
-MSG_PONG = "pong"
+# Protocol: every frame is a fixed header, then the body.
+#   header: body length (4 bytes), protocol version (1), message code (1), big endian
+#   KEY_EVENT:    char code point (4, 0 = none), vk code (2), flags (1), sequence (4)
+#   KEY_EVENTS:   any number of KEY_EVENT bodies back to back
+#   REPLACE_TEXT: backspaces (2), cursor offset (4), sequence (4), then the text as UTF-8
+# Sequence numbers are assigned by the hook, one per key; a REPLACE_TEXT
+# carries the one of the key it answers (0: not tied to a key).
+#   anything else: the payload as JSON (control messages are rare)
+HEADER = struct.Struct(">IBB")
+KEY_EVENT = struct.Struct(">IHBI")
+REPLACE_TEXT = struct.Struct(">HII")
+
+# Header and body packed in one call for the hot messages
+KEY_EVENT_FRAME = struct.Struct(">IBBIHBI")
+REPLACE_TEXT_FRAME = struct.Struct(">IBBHII")
+
+KEY_FLAG_BACKSPACE = 0x01
+
+MESSAGE_TYPES = {code: name for name, code in MESSAGE_CODES.items()}
+CODE_KEY_EVENT = MESSAGE_CODES[MSG_KEY_EVENT]
+CODE_KEY_EVENTS = MESSAGE_CODES[MSG_KEY_EVENTS]
+CODE_REPLACE_TEXT = MESSAGE_CODES[MSG_REPLACE_TEXT]
+
+# Largest body accepted; anything bigger is a corrupt or hostile stream
+MAX_BODY = 16 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_key_event(
+    char: Optional[str], is_backspace: bool = False, vk_code: int = 0, seq: int = 0
+) -> bytes:
+    return KEY_EVENT_FRAME.pack(
+        KEY_EVENT.size, PROTOCOL_VERSION, CODE_KEY_EVENT,
+        ord(char) if char else 0, vk_code & 0xFFFF,
+        KEY_FLAG_BACKSPACE if is_backspace else 0, seq,
+    )
+
+
+def encode_key_events(events) -> bytes:
+    """One KEY_EVENTS frame for a sequence of (char, is_backspace, vk_code, seq)."""
+    pack = KEY_EVENT.pack
+    body = b"".join(
+        pack(ord(char) if char else 0, vk_code & 0xFFFF, KEY_FLAG_BACKSPACE if is_backspace else 0, seq)
+        for char, is_backspace, vk_code, seq in events
+    )
+    return HEADER.pack(len(body), PROTOCOL_VERSION, CODE_KEY_EVENTS) + body
+
+
+def encode_replace_text(backspaces: int, text: str, cursor_offset: int = 0, seq: int = 0) -> bytes:
+    data = text.encode("utf-8")
+    return REPLACE_TEXT_FRAME.pack(
+        REPLACE_TEXT.size + len(data), PROTOCOL_VERSION, CODE_REPLACE_TEXT,
+        backspaces, cursor_offset, seq,
+    ) + data
+
+
+def encode_msg(msg: dict) -> bytes:
+    """Encodes a {"type", "payload"} message into one frame."""
+    msg_type = msg.get("type")
+    payload = msg.get("payload", {})
+    if msg_type == MSG_KEY_EVENT:
+        return encode_key_event(
+            payload.get("char"), payload.get("is_backspace", False), payload.get("vk_code") or 0,
+            payload.get("seq", 0),
+        )
+    if msg_type == MSG_KEY_EVENTS:
+        return encode_key_events(
+            (e.get("char"), e.get("is_backspace", False), e.get("vk_code") or 0, e.get("seq", 0))
+            for e in payload.get("events", [])
+        )
+    if msg_type == MSG_REPLACE_TEXT:
+        return encode_replace_text(
+            payload.get("backspaces", 0), payload.get("text", ""), payload.get("cursor_offset", 0),
+            payload.get("seq", 0),
+        )
+    code = MESSAGE_CODES.get(msg_type)
+    if code is None:
+        raise ProtocolError(f"Unknown message type {msg_type!r}")
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return HEADER.pack(len(body), PROTOCOL_VERSION, code) + body
+
+
+def decode_key_event(body, offset: int = 0) -> Tuple[Optional[str], bool, int, int]:
+    """(char, is_backspace, vk_code, seq) of a KEY_EVENT body, without building a message dict."""
+    codepoint, vk_code, flags, seq = KEY_EVENT.unpack_from(body, offset)
+    return (chr(codepoint) if codepoint else None), bool(flags & KEY_FLAG_BACKSPACE), vk_code, seq
+
+
+def decode_key_events(body) -> List[Tuple[Optional[str], bool, int, int]]:
+    """(char, is_backspace, vk_code, seq) for every event of a KEY_EVENTS body."""
+    if len(body) % KEY_EVENT.size:
+        raise ProtocolError(f"KEY_EVENTS body of {len(body)} bytes is not a whole number of events")
+    return [
+        ((chr(codepoint) if codepoint else None), bool(flags & KEY_FLAG_BACKSPACE), vk_code, seq)
+        for codepoint, vk_code, flags, seq in KEY_EVENT.iter_unpack(body)
+    ]
+
+
+def decode_body(code: int, body) -> dict:
+    """body is a bytes-like object holding exactly one frame body."""
+    if code == CODE_KEY_EVENT:
+        char, is_backspace, vk_code, seq = decode_key_event(body)
+        return {
+            "type": MSG_KEY_EVENT,
+            "payload": {"char": char, "is_backspace": is_backspace, "vk_code": vk_code, "seq": seq},
+        }
+    if code == CODE_KEY_EVENTS:
+        return {
+            "type": MSG_KEY_EVENTS,
+            "payload": {
+                "events": [
+                    {"char": char, "is_backspace": is_backspace, "vk_code": vk_code, "seq": seq}
+                    for char, is_backspace, vk_code, seq in decode_key_events(body)
+                ]
+            },
+        }
+    if code == CODE_REPLACE_TEXT:
+        backspaces, cursor_offset, seq = REPLACE_TEXT.unpack_from(body)
+        return {
+            "type": MSG_REPLACE_TEXT,
+            "payload": {
+                "backspaces": backspaces,
+                "text": str(body[REPLACE_TEXT.size:], "utf-8"),
+                "cursor_offset": cursor_offset,
+                "seq": seq,
+            },
+        }
+    msg_type = MESSAGE_TYPES.get(code)
+    if msg_type is None:
+        raise ProtocolError(f"Unknown message code {code}")
+    return {"type": msg_type, "payload": json.loads(bytes(body)) if len(body) else {}}
+
 
 def send_msg(sock: socket.socket, msg: dict):
-    """Encodes and sends a JSON message."""
+    """Encodes and sends one message."""
     try:
-        body = json.dumps(msg).encode('utf-8')
-        length = len(body)
-        sock.sendall(struct.pack('>I', length) + body)
+        sock.sendall(encode_msg(msg))
     except Exception as e:
         logger.error(f"Error sending message: {e}")
         raise
 
+
+class MessageReader:
+    """
+    Reads frames from one socket into a preallocated buffer with recv_into.
+
+    Each recv takes whatever the kernel has, so a burst of small frames is
+    read with one call and parsed in place. The buffer only grows when a
+    single frame does not fit.
+    """
+
+    def __init__(self, sock: socket.socket, size: int = 64 * 1024):
+        self.sock = sock
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+    def _fill(self, needed: int) -> bool:
+        """Reads until at least `needed` unparsed bytes are buffered."""
+        while self._end - self._start < needed:
+            if len(self._buf) - self._start < needed:
+                # Move the partial frame to the front, growing if it still can't fit
+                pending = self._end - self._start
+                if len(self._buf) < needed:
+                    buf = bytearray(max(needed, 2 * len(self._buf)))
+                    buf[:pending] = self._view[self._start:self._end]
+                    self._buf, self._view = buf, memoryview(buf)
+                else:
+                    self._view[:pending] = self._view[self._start:self._end]
+                self._start, self._end = 0, pending
+            n = self.sock.recv_into(self._view[self._end:])
+            if not n:
+                return False
+            self._end += n
+        return True
+
+    def read(self) -> Optional[dict]:
+        """The next message, or None once the peer closed the connection."""
+        frame = self.read_frame()
+        return decode_body(*frame) if frame is not None else None
+
+    def read_frame(self) -> Optional[Tuple[int, memoryview]]:
+        """
+        (message code, body) of the next frame, or None at end of stream.
+        The body is a view into the buffer, valid until the next read.
+        """
+        if not self._fill(HEADER.size):
+            return None
+        length, version, code = HEADER.unpack_from(self._buf, self._start)
+        if version != PROTOCOL_VERSION:
+            raise ProtocolError(f"Unsupported protocol version {version}")
+        if length > MAX_BODY:
+            raise ProtocolError(f"Frame of {length} bytes exceeds the limit")
+        if not self._fill(HEADER.size + length):
+            return None
+        body_start = self._start + HEADER.size
+        self._start = body_start + length
+        if self._start == self._end:
+            self._start = self._end = 0
+        return code, self._view[body_start:body_start + length]
+
+
 def recv_msg(sock: socket.socket) -> Optional[dict]:
-    """Receives and decodes a JSON message."""
+    """
+    Receives and decodes exactly one message. Reads nothing past the frame,
+    so it can be mixed with other reads; long-lived loops should keep a
+    MessageReader instead.
+    """
     try:
-        # Read length
-        raw_len = recvall(sock, 4)
-        if not raw_len:
+        header = recvall(sock, HEADER.size)
+        if not header:
             return None
-        length = struct.unpack('>I', raw_len)[0]
-        
-        # Read body
-        body = recvall(sock, length)
-        if not body:
+        length, version, code = HEADER.unpack(header)
+        if version != PROTOCOL_VERSION:
+            raise ProtocolError(f"Unsupported protocol version {version}")
+        body = recvall(sock, length) if length else b""
+        if body is None:
             return None
-        return json.loads(body.decode('utf-8'))
+        return decode_body(code, body)
     except Exception as e:
         logger.error(f"Error receiving message: {e}")
         return None
 
-def recvall(sock: socket.socket, n: int) -> Optional[bytes]:
+
+def recvall(sock: socket.socket, n: int) -> Optional[bytearray]:
     """Helper to receive exactly n bytes."""
-    data = bytearray()
-    while len(data) < n:
-        packet = sock.recv(n - len(data))
-        if not packet:
+    data = bytearray(n)
+    view = memoryview(data)
+    got = 0
+    while got < n:
+        read = sock.recv_into(view[got:])
+        if not read:
             return None
-        data.extend(packet)
+        got += read
     return data
 
+
 class IPCServer:
-    def __init__(self, port: int = IPC_PORT, handler: Callable[[dict, socket.socket], None] = None):
-        self.port = port
+    """
+    handler(msg, sock) gets every decoded message. With a key_handler,
+    KEY_EVENT frames skip the message dict: key_handler(char, is_backspace,
+    vk_code, seq, sock) is called straight from the decoded struct. Likewise
+    keys_handler(events, sock) gets KEY_EVENTS frames as a list of
+    (char, is_backspace, vk_code, seq).
+
+    Listens on `transport` (TCP on `port` if only a port is given, the
+    default transport otherwise). serve() adds an already connected socket,
+    such as one end of a socketpair inherited from the parent process.
+    """
+
+    def __init__(
+        self,
+        port: Optional[int] = None,
+        handler: Callable[[dict, socket.socket], None] = None,
+        key_handler: Optional[Callable[[Optional[str], bool, int, int, socket.socket], None]] = None,
+        transport: Optional[Transport] = None,
+        keys_handler: Optional[Callable[[list, socket.socket], None]] = None,
+    ):
+        if transport is None:
+            transport = TCPTransport(port=port) if port is not None else default_transport()
+        self.transport = transport
         if handler:
             self.handler = handler
+        self.key_handler = key_handler
+        self.keys_handler = keys_handler
         self.running = False
         self.server_sock = None
         self.thread = None
 
     def start(self):
         self.running = True
-        self.server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_sock.bind(('127.0.0.1', self.port))
-        self.server_sock.listen(5)
+        self.server_sock = self.transport.listen()
         self.thread = threading.Thread(target=self._accept_loop, daemon=True)
         self.thread.start()
-        logger.info(f"IPC Server started on port {self.port}")
+        logger.info(f"IPC Server listening on {self.transport!r}")
+
+    def serve(self, sock: socket.socket) -> threading.Thread:
+        """Handles messages from an already connected socket."""
+        self.running = True
+        client_thread = threading.Thread(target=self._handle_client, args=(tune(sock),), daemon=True)
+        client_thread.start()
+        return client_thread
 
     def _accept_loop(self):
         while self.running:
             try:
                 client_sock, addr = self.server_sock.accept()
                 logger.debug(f"Client connected: {addr}")
-                client_thread = threading.Thread(target=self._handle_client, args=(client_sock,), daemon=True)
+                client_thread = threading.Thread(
+                    target=self._handle_client,
+                    args=(self.transport.configure(client_sock),),
+                    daemon=True,
+                )
                 client_thread.start()
             except OSError:
                 break
 
     def _handle_client(self, sock: socket.socket):
+        reader = MessageReader(sock)
+        key_handler = self.key_handler
+        keys_handler = self.keys_handler
         try:
             while self.running:
-                msg = recv_msg(sock)
-                if msg is None:
+                frame = reader.read_frame()
+                if frame is None:
                     break
-                self.handler(msg, sock)
+                code, body = frame
+                if code == CODE_KEY_EVENT and key_handler is not None:
+                    key_handler(*decode_key_event(body), sock)
+                elif code == CODE_KEY_EVENTS and keys_handler is not None:
+                    keys_handler(decode_key_events(body), sock)
+                else:
+                    self.handler(decode_body(code, body), sock)
+        except (OSError, ProtocolError) as e:
+            logger.error(f"Dropping client: {e}")
         finally:
             sock.close()
 
@@ -95,21 +345,60 @@ class IPCServer:
         self.running = False
         if self.server_sock:
             self.server_sock.close()
+            self.transport.close()
 
 class IPCClient:
-    def __init__(self, port: int = IPC_PORT):
-        self.port = port
+    def __init__(self, port: Optional[int] = None, transport: Optional[Transport] = None):
+        if transport is None:
+            transport = TCPTransport(port=port) if port is not None else default_transport()
+        self.transport = transport
         self.sock = None
+        self.reader = None
+
+    @classmethod
+    def from_socket(cls, sock: socket.socket) -> "IPCClient":
+        """A client over an already connected socket (e.g. an inherited socketpair end)."""
+        client = cls.__new__(cls)
+        client.transport = None
+        client.sock = tune(sock)
+        client.reader = MessageReader(sock)
+        return client
 
     def connect(self):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.connect(('127.0.0.1', self.port))
-        logger.info(f"Connected to IPC Server on port {self.port}")
+        if self.sock is not None:
+            return
+        self.sock = self.transport.connect()
+        self.reader = MessageReader(self.sock)
+        logger.info(f"Connected to IPC Server on {self.transport!r}")
 
     def send(self, msg: dict):
         if self.sock:
             send_msg(self.sock, msg)
 
+    def send_key_event(
+        self, char: Optional[str], is_backspace: bool = False, vk_code: int = 0, seq: int = 0
+    ):
+        """KEY_EVENT without building the message dict first."""
+        if self.sock:
+            self.sock.sendall(encode_key_event(char, is_backspace, vk_code, seq))
+
+    def send_key_events(self, events):
+        """A run of (char, is_backspace, vk_code, seq); one KEY_EVENTS frame unless it is a single key."""
+        if not self.sock:
+            return
+        if len(events) == 1:
+            self.sock.sendall(encode_key_event(*events[0]))
+        else:
+            self.sock.sendall(encode_key_events(events))
+
+    def recv(self) -> Optional[dict]:
+        try:
+            return self.reader.read() if self.reader else None
+        except (OSError, ProtocolError) as e:
+            logger.error(f"Error receiving message: {e}")
+            return None
+
     def close(self):
         if self.sock:
             self.sock.close()
+            self.sock = None
@@ -1,7 +1,8 @@
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
+import ntpath
 import uuid
 
 class TriggerType(str, Enum):
@@ -40,6 +41,11 @@ class Settings(BaseModel):
     dark_mode: bool = True
     accent_color: str = "blue"
     ignored_apps: List[str] = Field(default_factory=list) # Security: Apps to never expand in
+    commands: Dict[str, str] = Field(default_factory=dict) # {{script:name}} placeholders: name -> command line
+
+def app_key(app: Optional[str]) -> str:
+    """Executables compare by file name, case-insensitively ("C:\\...\\Code.exe" is "code.exe")."""
+    return ntpath.basename(app or "").lower()
 
 class IPCMessage(BaseModel):
     type: str
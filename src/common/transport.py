@@ -0,0 +1,163 @@
+"""
+IPC transports: how the hook, the backend and the GUI reach each other.
+
+A transport only creates sockets; framing stays in src/common/ipc.py.
+
+*   UnixTransport: AF_UNIX stream socket, the lowest latency where Python has it.
+*   TCPTransport: 127.0.0.1 with TCP_NODELAY, so a 13-byte key event is never
+    held back by Nagle's algorithm waiting for the previous ACK.
+*   Inherited sockets: src/main.py connects the hook and the backend with a
+    socketpair before spawning them (IPCServer.serve / IPCClient.from_socket).
+
+The listening transport is picked from IPC_TRANSPORT_ENV ("unix", "tcp",
+"unix:<path>" or "tcp:<host>:<port>"); by default AF_UNIX when available,
+TCP otherwise. Every process resolves it the same way.
+"""
+import errno
+import logging
+import os
+import socket
+import tempfile
+from typing import Optional
+from src.common.constants import DATA_DIR, IPC_PORT, IPC_SOCKET_NAME, IPC_TRANSPORT_ENV
+
+logger = logging.getLogger(__name__)
+
+HAS_AF_UNIX = hasattr(socket, "AF_UNIX")
+
+# sun_path is 104-108 bytes depending on the platform
+MAX_SOCKET_PATH = 100
+
+
+def tune(sock: socket.socket) -> socket.socket:
+    """Disables Nagle on TCP sockets; a no-op for other families."""
+    if sock.family in (socket.AF_INET, socket.AF_INET6):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def default_socket_path() -> str:
+    path = os.path.join(DATA_DIR, IPC_SOCKET_NAME)
+    if len(path) > MAX_SOCKET_PATH:
+        path = os.path.join(tempfile.gettempdir(), IPC_SOCKET_NAME)
+    return path
+
+
+class Transport:
+    name = "base"
+
+    def listen(self, backlog: int = 5) -> socket.socket:
+        raise NotImplementedError
+
+    def connect(self) -> socket.socket:
+        raise NotImplementedError
+
+    def configure(self, sock: socket.socket) -> socket.socket:
+        """Applied to every accepted connection."""
+        return sock
+
+    def close(self) -> None:
+        """Cleans up after the listening side stopped."""
+
+
+class TCPTransport(Transport):
+    name = "tcp"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = IPC_PORT, nodelay: bool = True):
+        self.host = host
+        self.port = port
+        self.nodelay = nodelay
+
+    def listen(self, backlog: int = 5) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(backlog)
+        # Port 0 asks the OS for a free port; connect() needs the real one
+        self.port = sock.getsockname()[1]
+        return sock
+
+    def connect(self) -> socket.socket:
+        return self.configure(socket.create_connection((self.host, self.port)))
+
+    def configure(self, sock: socket.socket) -> socket.socket:
+        return tune(sock) if self.nodelay else sock
+
+    def __repr__(self) -> str:
+        return f"tcp:{self.host}:{self.port}"
+
+
+class UnixTransport(Transport):
+    name = "unix"
+
+    def __init__(self, path: Optional[str] = None):
+        if not HAS_AF_UNIX:
+            raise OSError("AF_UNIX sockets are not available on this platform")
+        self.path = path or default_socket_path()
+        self._bound = False
+
+    def listen(self, backlog: int = 5) -> socket.socket:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if os.path.exists(self.path):
+            self._remove_stale()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        sock.listen(backlog)
+        self._bound = True
+        return sock
+
+    def _remove_stale(self) -> None:
+        """Removes a socket left behind by a backend that did not shut down cleanly."""
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        finally:
+            probe.close()
+        raise OSError(errno.EADDRINUSE, f"Another backend is listening on {self.path}")
+
+    def connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def close(self) -> None:
+        # Only our own socket: a failed listen() leaves the live one alone
+        if not self._bound:
+            return
+        self._bound = False
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __repr__(self) -> str:
+        return f"unix:{self.path}"
+
+
+def parse_transport(spec: str) -> Transport:
+    kind, _, rest = spec.partition(":")
+    if kind == "unix":
+        return UnixTransport(rest or None)
+    if kind == "tcp":
+        if not rest:
+            return TCPTransport()
+        host, _, port = rest.rpartition(":")
+        return TCPTransport(host or "127.0.0.1", int(port))
+    raise ValueError(f"Unknown IPC transport {spec!r}")
+
+
+def default_transport() -> Transport:
+    spec = os.environ.get(IPC_TRANSPORT_ENV)
+    if spec:
+        return parse_transport(spec)
+    return UnixTransport() if HAS_AF_UNIX else TCPTransport()
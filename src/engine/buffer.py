@@ -0,0 +1,51 @@
+from typing import List
+
+
+class KeyBuffer:
+    """
+    Fixed-capacity ring buffer of typed characters.
+
+    Slots are preallocated once; push/pop/clear only move the head and length,
+    so the keystroke path never builds a new string. Indexing is logical:
+    buffer[0] is the oldest retained char, buffer[len(buffer) - 1] the newest.
+    Popping rewinds the head, which brings back exactly the state before the
+    last push (as long as it has not been overwritten by wrap-around).
+    """
+
+    __slots__ = ("capacity", "_slots", "_head", "_len")
+
+    def __init__(self, capacity: int = 100):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._slots: List[str] = [""] * capacity
+        self._head = 0  # Slot the next char goes into
+        self._len = 0
+
+    def push(self, char: str) -> None:
+        self._slots[self._head] = char
+        self._head = (self._head + 1) % self.capacity
+        if self._len < self.capacity:
+            self._len += 1
+
+    def pop(self) -> None:
+        if self._len:
+            self._head = (self._head - 1) % self.capacity
+            self._len -= 1
+
+    def clear(self) -> None:
+        self._len = 0
+
+    def last(self) -> str:
+        return self._slots[(self._head - 1) % self.capacity] if self._len else ""
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, index: int) -> str:
+        if not 0 <= index < self._len:
+            raise IndexError("KeyBuffer index out of range")
+        return self._slots[(self._head - self._len + index) % self.capacity]
+
+    def __str__(self) -> str:
+        return "".join(self[i] for i in range(self._len))
@@ -1,105 +1,392 @@
 import logging
-from typing import Optional, Tuple
+import threading
+from concurrent.futures import Future
+from typing import List, Optional, Sequence, Tuple
+from src.common.constants import KEY_BARRIER, KEY_RESET, RESET_KEYS
 from src.common.models import Snippet, TriggerType
 from src.engine.store import Store
 from src.engine.placeholders import PlaceholderResolver
+from src.engine.index import IndexPublisher
+from src.engine.profiles import ProfileIndexes
+from src.engine.references import ReferenceGraph
+from src.engine.buffer import KeyBuffer
 
 logger = logging.getLogger(__name__)
 
 
+# Map last char (if any) to trigger
+TRIGGER_MAP = {
+    " ": TriggerType.SPACE,
+    "\r": TriggerType.ENTER,
+    "\n": TriggerType.ENTER,
+}
+
+# Longest text suffix the hook checks before sending keys, and the most
+# suffixes a table carries before a shorter length is used
+FIRE_SUFFIX_LEN = 3
+MAX_FIRE_SUFFIXES = 50000
+
+
+def relevance_table(index, extra: Sequence = ()) -> dict:
+    """
+    What the hook needs to filter keys for a SnippetIndex (src/hook/prefilter.py):
+    the abbreviation alphabet, the reset keys, and the "fire" suffixes. A
+    match can only happen once the typed text ends with the last
+    suffix_len chars of some abbreviation followed by its trigger char
+    (the whole of it, if shorter). Indexes in extra (profiles) are merged in.
+    """
+    endings = {TriggerType.NONE: ("",)}
+    for char, trigger in TRIGGER_MAP.items():
+        endings[trigger] = endings.get(trigger, ()) + (char,)
+    keys = []
+    alphabet = set(index.alphabet)
+    for snapshot in (index, *extra):
+        table = snapshot.matcher.table
+        keys.extend(
+            table.abbreviations[row] + ending
+            for row in snapshot.matcher.locations.rows()
+            for ending in endings[table.trigger(row)]
+        )
+        alphabet.update(snapshot.alphabet)
+    for suffix_len in range(FIRE_SUFFIX_LEN, 0, -1):
+        suffixes = {key[-suffix_len:] for key in keys}
+        if len(suffixes) <= MAX_FIRE_SUFFIXES:
+            break
+    return {
+        "version": index.version,
+        "alphabet": "".join(sorted(alphabet)),
+        "suffix_len": suffix_len,
+        "suffixes": sorted(suffixes),
+        "reset_keys": list(RESET_KEYS),
+    }
+
+
+class PendingExpansion:
+    """
+    An expansion whose text waits on slow placeholders (PlaceholderResolver.submit).
+    The engine returns one in place of the (backspaces, text, cursor_offset)
+    tuple when defer_slow is set; see settle().
+    """
+
+    __slots__ = ("backspaces", "future")
+
+    def __init__(self, backspaces: int, future: Future):
+        self.backspaces = backspaces
+        self.future = future
+
+    def result(self) -> Tuple[int, str, int]:
+        text, cursor_offset = self.future.result()
+        return (self.backspaces, text, cursor_offset)
+
+
+def settle(expansions: List[tuple]) -> Future:
+    """
+    A Future of process_keys output with every PendingExpansion replaced by
+    its tuple, done once the last of them is rendered (at once if none is).
+    """
+    settled: Future = Future()
+    pending = [e for _, e in expansions if isinstance(e, PendingExpansion)]
+
+    def finish():
+        settled.set_result([
+            (position, e.result() if isinstance(e, PendingExpansion) else e) for position, e in expansions
+        ])
+
+    if not pending:
+        finish()
+        return settled
+    remaining = [len(pending)]
+    lock = threading.Lock()
+
+    def one_done(_):
+        with lock:
+            remaining[0] -= 1
+            last = not remaining[0]
+        if last:
+            finish()
+
+    for expansion in pending:
+        expansion.future.add_done_callback(one_done)
+    return settled
+
+
+def _longest_match(matchers, buffer, trigger):
+    """The longest match of any matcher; the earlier matcher wins a tie."""
+    best = None
+    for matcher in matchers:
+        found = matcher.match(buffer, trigger)
+        if found and (best is None or found[1] > best[1]):
+            best = found
+    return best
+
+
 class ExpansionEngine:
     def __init__(self, store: Store):
         self.store = store
         self.resolver = PlaceholderResolver()
-        self.buffer = ""
+        settings = getattr(store, "settings", None)
+        if settings is not None:
+            self.resolver.set_commands(settings.commands)
+        # Off by default, so callers that want text get text. The backend sets
+        # it: matching must not wait on the clipboard or a user command.
+        self.defer_slow = False
         self.max_buffer_size = 100  # Keep buffer small for performance
+        self.buffer = KeyBuffer(self.max_buffer_size)
+        # The first snapshot is built synchronously; later ones are published
+        # by a worker thread while process_key keeps reading the old one.
+        self.index = IndexPublisher(self.store.match_records())
+        # {{snippet:abbr}} references, inlined and memoized per template
+        self.references = ReferenceGraph()
+        self.references.load(self.store.match_records)
+        self.resolver.references = self.references
+        logger.info(
+            f"Compiled matcher: {self.matcher.size} abbreviations, "
+            f"longest={self.matcher.max_abbr_len}"
+        )
+        # App-specific profiles, compiled on first use (src/engine/profiles.py).
+        # _active holds the publishers for the foreground app; replacing the
+        # tuple is the whole switch.
+        self.profiles = ProfileIndexes()
+        self.profiles.update(getattr(self.store, "profiles", None) or ())
+        self.app: Optional[str] = None
+        self._active: Tuple[IndexPublisher, ...] = ()
+
+    @property
+    def matcher(self):
+        return self.index.current.matcher
+
+    def rebuild(self) -> None:
+        """Schedules a full recompile from the store."""
+        self.index.reload(self.store.match_records())
+        self.references.load(self.store.match_records)
+        self.update_profiles(getattr(self.store, "profiles", None) or ())
+        settings = getattr(self.store, "settings", None)
+        if settings is not None:
+            self.resolver.set_commands(settings.commands)
+
+    def update_profiles(self, profiles) -> None:
+        self.profiles.update(profiles)
+        self._active = self.profiles.activate(self.app)
+
+    def set_app(self, app: Optional[str]) -> None:
+        """
+        The foreground application changed: matching uses its profiles from
+        the next key on. The buffer belongs to the previous window.
+        """
+        self.app = app
+        self._active = self.profiles.activate(app)
+        self.buffer.clear()
+        logger.info(f"Foreground app {app!r}: {len(self._active)} profile indexes")
+
+    def _matchers(self) -> tuple:
+        """The active profiles' matchers, then the global one: one consistent set per call."""
+        return (*(publisher.current.matcher for publisher in self._active), self.index.current.matcher)
+
+    def on_store_change(self, op: str, data) -> None:
+        """Store listener: applies one change to the index without a full rebuild."""
+        if op == "upsert":
+            self.index.upsert(data)
+            self.references.upsert(data)
+        elif op == "delete":
+            self.index.delete(data)
+            self.references.delete(data)
+        elif op == "reload":
+            self.rebuild()
+        elif op == "profiles":
+            self.update_profiles(data)
+        elif op == "settings":
+            self.resolver.set_commands(data.commands)
 
     def process_key(
         self, char: str, is_backspace: bool = False
     ) -> Optional[Tuple[int, str, int]]:
         """
         Process a key event.
-        Returns: (backspaces_to_delete_abbr, expansion_text, cursor_left_moves) or None
+        Returns: (backspaces_to_delete_abbr, expansion_text, cursor_left_moves) or None,
+        or a PendingExpansion when defer_slow is set and the snippet has slow placeholders
+
+        The steady state (no match) allocates nothing: the char goes into the
+        ring buffer and the matcher reads the ring in place.
         """
-        logger.debug(f"process_key called with char={repr(char)}, is_backspace={is_backspace}")
+        trace = logger.isEnabledFor(logging.DEBUG)
+        if trace:
+            logger.debug(f"process_key called with char={repr(char)}, is_backspace={is_backspace}")
 
         if is_backspace:
-            if self.buffer:
-                self.buffer = self.buffer[:-1]
-            logger.debug(f"Buffer after backspace: '{self.buffer}'")
+            # Rewind: the previous chars are still in the ring, nothing to recompute
+            self.buffer.pop()
+            if trace:
+                logger.debug(f"Buffer after backspace: '{self.buffer}'")
             return None
 
-        # Append char to buffer
-        if char:
-            self.buffer += char
-            if len(self.buffer) > self.max_buffer_size:
-                self.buffer = self.buffer[-self.max_buffer_size :]
-
-        logger.info(f"Buffer before match: '{self.buffer}'")
-
-        # Map last char (if any) to trigger
-        trigger_map = {
-            " ": TriggerType.SPACE,
-            "\r": TriggerType.ENTER,
-            "\n": TriggerType.ENTER,
-        }
-        trigger = trigger_map.get(char) if char else None
-
-        potential_abbr = self.buffer
-        if trigger:
-            # Remove the trigger char to get the abbreviation candidate
-            potential_abbr = self.buffer[:-1]
-
-        logger.debug(
-            f"Trigger={trigger}, potential_abbr='{potential_abbr}' "
-            f"(full buffer='{self.buffer}')"
-        )
+        if not char:
+            return None
+        if char == KEY_RESET:
+            self.buffer.clear()
+            return None
+        self.buffer.push(char)
+
+        trigger = TRIGGER_MAP.get(char)
+        if trace:
+            logger.debug(f"Trigger={trigger} (full buffer='{self.buffer}')")
+
+        # One reference read: the whole key sees a single consistent snapshot
+        if self._active:
+            match = _longest_match(self._matchers(), self.buffer, trigger)
+        else:
+            match = self.index.current.matcher.match(self.buffer, trigger)
+        if match:
+            return self._expand(match)
 
-        # Iterate through snippets to find a match at the end of the buffer
-        for snippet in self.store.snippets:
-            if not snippet.is_active:
+        return None
+
+    def process_keys(self, keys: Sequence) -> List[Tuple[int, Tuple[int, str, int]]]:
+        """
+        Processes a run of keys, each a (char, is_backspace, ...) tuple, in one pass.
+        Returns (position, expansion) for every key that triggered an expansion,
+        the expansion being what process_key would have returned for it.
+
+        The whole run is matched against one index snapshot. See
+        batch_replacement for turning the result into a single reply.
+        """
+        expansions = []
+        buffer = self.buffer
+        if self._active:
+            matchers = self._matchers()
+            match = lambda buffer, trigger: _longest_match(matchers, buffer, trigger)  # noqa: E731
+        else:
+            match = self.index.current.matcher.match
+        trigger_for = TRIGGER_MAP.get
+        for position, key in enumerate(keys):
+            char = key[0]
+            if key[1]:
+                buffer.pop()
+                continue
+            if not char:
                 continue
+            if char == KEY_RESET:
+                buffer.clear()
+                continue
+            buffer.push(char)
+            found = match(buffer, trigger_for(char))
+            if found:
+                expansions.append((position, self._expand(found)))
+        return expansions
 
-            abbr = snippet.abbreviation
-            match_condition = False
+    def render(self, snippet_id: str) -> Optional[Tuple[str, int]]:
+        """
+        (text, cursor_offset) for a snippet the hook matched on its own, or
+        None if it is no longer in the index (deleted since the hook's generation).
+        """
+        template = self._template(snippet_id)
+        return self.resolver.render(template) if template is not None else None
 
-            if snippet.trigger == TriggerType.NONE:
-                if self.buffer.endswith(abbr):
-                    match_condition = True
-            elif trigger and snippet.trigger == trigger:
-                if potential_abbr.endswith(abbr):
-                    match_condition = True
+    def expansion(self, snippet_id: str, backspaces: int):
+        """
+        The expansion for a snippet the hook matched on its own: a tuple, a
+        PendingExpansion (with defer_slow), or None if it is gone.
+        """
+        template = self._template(snippet_id)
+        if template is None:
+            return None
+        return self._rendered(backspaces, template)
 
-            logger.debug(
-                f"Checking snippet id={snippet.id}, abbr='{abbr}', "
-                f"trigger={snippet.trigger}, match={match_condition}"
-            )
+    def _template(self, snippet_id: str):
+        for matcher in self._matchers():
+            row = matcher.locations.get(snippet_id)
+            if row is not None:
+                return matcher.table.template(row)
+        return None
+
+    def _rendered(self, backspaces: int, template):
+        if self.defer_slow and self.resolver.is_slow(template):
+            return PendingExpansion(backspaces, self.resolver.submit(template))
+        text, cursor_offset = self.resolver.render(template)
+        return (backspaces, text, cursor_offset)
+
+    def relevance(self) -> dict:
+        """The hook's filter table for the global index and every profile compiled so far."""
+        return relevance_table(self.index.current, self.profiles.loaded())
 
-            if match_condition:
-                logger.info(f"Match found: {abbr} -> {snippet.expansion}")
-                logger.debug(
-                    f"Matched abbreviation '{abbr}' -> expansion length={len(snippet.expansion)}"
-                )
+    def _expand(self, match):
+        entry, chars_to_delete = match
+        logger.info(f"Match found: {entry.abbreviation} (snippet id={entry.id})")
 
-                # Resolve placeholders
-                expanded_text = self.resolver.resolve(snippet.expansion)
-                cursor_offset = self.resolver.get_cursor_offset(snippet.expansion)
-                final_text = expanded_text.replace("{{cursor}}", "")
+        # Resolve placeholders from the precompiled template
+        expansion = self._rendered(chars_to_delete, entry.template)
 
-                # Calculate backspaces needed (abbr + trigger if any)
-                chars_to_delete = len(abbr)
-                if snippet.trigger != TriggerType.NONE:
-                    chars_to_delete += 1
+        # Clear buffer (simplest/safest for now)
+        self.buffer.clear()
+
+        if isinstance(expansion, PendingExpansion):
+            logger.info(f"Expansion deferred: delete={chars_to_delete}, waiting on slow placeholders")
+        else:
+            logger.info(
+                f"Expansion result: delete={chars_to_delete}, "
+                f"text length={len(expansion[1])}, cursor_offset={expansion[2]}"
+            )
+        return expansion
 
-                # Clear buffer (simplest/safest for now)
-                self.buffer = ""
 
-                logger.info(
-                    f"Expansion result: delete={chars_to_delete}, "
-                    f"text='{final_text}', cursor_offset={cursor_offset}"
-                )
+def batch_replacement(
+    keys: Sequence, expansions: List[Tuple[int, Tuple[int, str, int]]]
+) -> Optional[Tuple[int, str, int]]:
+    """
+    One (backspaces, text, cursor_offset) edit for a batch from process_keys.
 
-                return (chars_to_delete, final_text, cursor_offset)
+    The hook never holds keys back, so by the time a batch is answered the
+    application shows every key of it, including the ones typed after an
+    abbreviation fired. The edit rewrites the batch's text as it should read
+    with the expansions applied; the part both versions share is kept.
+    A KEY_BARRIER counts as the run of chars it stands for; a KEY_RESET
+    stands for nothing on screen.
+    """
+    if not expansions:
+        return None
+    typed: List[str] = []   # What the application shows now
+    wanted: List[str] = []  # What it should show
+    typed_cut = wanted_cut = 0  # Chars from before the batch each one deleted
+    cursor_offset = 0
+    pending = iter(expansions)
+    next_position, expansion = next(pending)
+    for position, key in enumerate(keys):
+        char = key[0]
+        if key[1]:
+            if typed:
+                typed.pop()
+            else:
+                typed_cut += 1
+            if wanted:
+                wanted.pop()
+            else:
+                wanted_cut += 1
+        elif char == KEY_BARRIER:
+            typed.extend(char * key[2])
+            wanted.extend(char * key[2])
+        elif char and char != KEY_RESET:
+            typed.append(char)
+            wanted.append(char)
+        if position != next_position:
+            # Typing on after an expansion leaves the cursor where it is
+            cursor_offset = 0
+            continue
+        backspaces, text, cursor_offset = expansion
+        keep = max(0, len(wanted) - backspaces)
+        wanted_cut += backspaces - (len(wanted) - keep)
+        del wanted[keep:]
+        wanted.extend(text)
+        next_position, expansion = next(pending, (-1, None))
 
-        logger.debug("No match found for current buffer.")
+    backspaces = len(typed) + max(0, wanted_cut - typed_cut)
+    shared = 0
+    if wanted_cut == typed_cut:
+        limit = min(len(typed), len(wanted))
+        while shared < limit and typed[shared] == wanted[shared]:
+            shared += 1
+    text = "".join(wanted[shared:])
+    if KEY_BARRIER in text:
+        # Only with an outdated filter table: chars the hook never sent would
+        # have to be typed again
+        logger.warning("Dropping batch expansion that would retype filtered chars")
         return None
+    return (backspaces - shared, text, cursor_offset)
@@ -0,0 +1,192 @@
+import gc
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, FrozenSet, Iterable, List, Optional
+from src.common.models import Snippet
+from src.engine.matcher import SnippetMatcher
+
+logger = logging.getLogger(__name__)
+
+# Yield the GIL this often while compiling a full library, so keystrokes
+# being matched against the previous snapshot are not starved.
+BUILD_YIELD_EVERY = 1000
+
+
+@contextmanager
+def gc_paused():
+    """
+    Suspends the cyclic GC for a bulk build. Compiling creates hundreds of
+    thousands of long-lived objects; left on, the collector rescans the whole
+    heap repeatedly and dominates build time. The trie has no cycles.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+class SnippetIndex:
+    """
+    Immutable, versioned snapshot of the compiled library.
+    Readers grab one reference and use it for the whole keystroke.
+    """
+
+    __slots__ = ("version", "matcher", "_alphabet")
+
+    def __init__(self, version: int, matcher: SnippetMatcher):
+        self.version = version
+        self.matcher = matcher
+        self._alphabet = None
+
+    @property
+    def alphabet(self) -> FrozenSet[str]:
+        """Every character that occurs in an active abbreviation (computed once)."""
+        if self._alphabet is None:
+            self._alphabet = self.matcher.alphabet()
+        return self._alphabet
+
+    @classmethod
+    def build(cls, version: int, snippets: Iterable[Snippet]) -> "SnippetIndex":
+        matcher = SnippetMatcher()
+        with gc_paused():
+            for i, snippet in enumerate(snippets, 1):
+                matcher.add(snippet)
+                if i % BUILD_YIELD_EVERY == 0:
+                    time.sleep(0)
+        return cls(version, matcher)
+
+
+class IndexPublisher:
+    """
+    Owns the current SnippetIndex and rebuilds it off the keystroke path.
+
+    Changes are queued and a worker thread folds every pending change into one
+    new snapshot: a full rebuild if any reload is pending, otherwise a
+    copy-on-write update of the previous matcher. The result is published by a
+    single reference assignment, which is atomic for readers. Subscribers are
+    then called with the new SnippetIndex, on the worker thread.
+    """
+
+    def __init__(self, snippets: Iterable[Snippet] = ()):
+        self.current = SnippetIndex.build(1, snippets)
+        self._changes: "queue.Queue" = queue.Queue()
+        self._published = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        # Changes come from the store listener and the control worker alike
+        self._start_lock = threading.Lock()
+        self._running = False
+        self._subscribers: List[Callable[[SnippetIndex], None]] = []
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="IndexPublisher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+            self._running = False
+            if thread is not None:
+                self._changes.put(None)
+        if thread is not None:
+            thread.join(timeout=2)
+
+    def subscribe(self, callback: Callable[[SnippetIndex], None]) -> None:
+        self._subscribers.append(callback)
+
+    @staticmethod
+    def _frozen(snippet):
+        # Copy models so later in-place edits by the caller don't race the build;
+        # cached record views are immutable already
+        return snippet.model_copy() if isinstance(snippet, Snippet) else snippet
+
+    def upsert(self, snippet: Snippet) -> None:
+        self._submit(("upsert", self._frozen(snippet)))
+
+    def delete(self, snippet_id: str) -> None:
+        self._submit(("delete", snippet_id))
+
+    def reload(self, snippets: Iterable[Snippet]) -> None:
+        self._submit(("reload", [self._frozen(s) for s in snippets]))
+
+    def _submit(self, change) -> None:
+        self.start()
+        self._changes.put(change)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until every change submitted so far is published."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._published:
+            while self._changes.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._published.wait(remaining)
+        return True
+
+    def _run(self) -> None:
+        # A worker replaced by stop() and start() exits after its batch
+        while self._running and self._thread is threading.current_thread():
+            batch = [self._changes.get()]
+            while True:
+                try:
+                    batch.append(self._changes.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                changes = [c for c in batch if c is not None]
+                if changes:
+                    self._apply(changes)
+            except Exception as e:
+                logger.error(f"Index rebuild failed, keeping version {self.current.version}: {e}")
+            finally:
+                with self._published:
+                    for _ in batch:
+                        self._changes.task_done()
+                    self._published.notify_all()
+
+    def _apply(self, changes: List[tuple]) -> None:
+        started = time.perf_counter()
+        base = self.current
+
+        # Anything before the last reload is superseded by it
+        reloads = [i for i, (op, _) in enumerate(changes) if op == "reload"]
+        if reloads:
+            last = reloads[-1]
+            matcher = SnippetIndex.build(0, changes[last][1]).matcher
+            changes = changes[last + 1:]
+        else:
+            matcher = base.matcher
+
+        if changes:
+            # Only the final state of each snippet matters
+            final = {}
+            for op, arg in changes:
+                snippet_id = arg.id if op == "upsert" else arg
+                final.pop(snippet_id, None)
+                final[snippet_id] = (op, arg)
+            upserts = [arg for op, arg in final.values() if op == "upsert"]
+            deletes = [key for key, (op, _) in final.items() if op == "delete"]
+            matcher = matcher.updated(upserts, deletes)
+
+        self.current = SnippetIndex(base.version + 1, matcher)
+        logger.info(
+            f"Published index v{self.current.version}: {matcher.size} abbreviations "
+            f"({len(changes)} changes, full={bool(reloads)}) in "
+            f"{(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+        for callback in self._subscribers:
+            try:
+                callback(self.current)
+            except Exception as e:
+                logger.error(f"Index subscriber failed on v{self.current.version}: {e}")
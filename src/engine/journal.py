@@ -0,0 +1,174 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Writes data to path via a temp file and rename, so readers never see a torn file."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_journal(path: str) -> List[dict]:
+    """Reads journal records. A torn last line (crash mid-write) is dropped."""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "rb") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Ignoring unreadable journal record {path}:{lineno}")
+    return records
+
+
+class Journal:
+    """
+    Append-only log of store mutations.
+
+    append() only encodes the record and queues it. A flusher thread waits
+    `delay` seconds for more records, then writes the whole group with one
+    write + fsync (group commit). Once the journal holds `compact_after`
+    records, `compact` is called on the flusher thread to fold it into a
+    fresh snapshot.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compact: Optional[Callable[[], None]] = None,
+        delay: float = 0.05,
+        compact_after: int = 1000,
+    ):
+        self.path = path
+        self.old_path = f"{path}.old"
+        self.delay = delay
+        self.compact_after = compact_after
+        self._compact = compact
+        self._pending: List[bytes] = []
+        self._cut_torn_tail()
+        self._records = len(read_journal(path))
+        self._lock = threading.Lock()  # Guards _pending and the file
+        self._wake = threading.Event()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="JournalFlusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _cut_torn_tail(self) -> None:
+        """
+        Truncates a record left half-written by a crash. Appending onto it
+        would glue the next record to it, and both would be dropped on load.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if not data or data.endswith(b"\n"):
+                return
+            end = data.rfind(b"\n") + 1
+            logger.warning(f"Cutting {len(data) - end} bytes of a torn record off {self.path}")
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @property
+    def records(self) -> int:
+        return self._records + len(self._pending)
+
+    def append(self, record: dict) -> None:
+        line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self._lock:
+            self._pending.append(line)
+        self._wake.set()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        data = b"".join(self._pending)
+        with open(self.path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._records += len(self._pending)
+        logger.debug(f"Journal group commit: {len(self._pending)} records, {len(data)} bytes")
+        self._pending = []
+
+    def rotate(self) -> None:
+        """
+        Flushes and moves the current journal aside, so new records start a
+        fresh file while the caller writes a snapshot. Call discard_rotated()
+        once the snapshot is safely on disk.
+        """
+        with self._lock:
+            self._flush_locked()
+            if os.path.exists(self.path):
+                if os.path.exists(self.old_path):
+                    # A previous compaction died before finishing: keep both
+                    with open(self.old_path, "ab") as old, open(self.path, "rb") as cur:
+                        old.write(cur.read())
+                    os.remove(self.path)
+                else:
+                    os.replace(self.path, self.old_path)
+            self._records = 0
+
+    def discard_rotated(self) -> None:
+        if os.path.exists(self.old_path):
+            os.remove(self.old_path)
+
+    def clear(self) -> None:
+        """Drops everything: the caller has just written a complete snapshot."""
+        with self._lock:
+            self._pending = []
+            self._records = 0
+            for path in (self.path, self.old_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def read_all(self) -> List[dict]:
+        """Records of an interrupted compaction first, then the live journal."""
+        return read_journal(self.old_path) + read_journal(self.path)
+
+    def _run(self) -> None:
+        while self._running:
+            self._wake.wait()
+            if not self._running:
+                break
+            # Debounce: let a burst of edits land in the same group
+            if self.delay:
+                time.sleep(self.delay)
+            self._wake.clear()
+            try:
+                self.flush()
+                if self._compact and self._records >= self.compact_after:
+                    self._compact()
+            except Exception as e:
+                logger.error(f"Journal flush failed: {e}")
+
+    def close(self) -> None:
+        if not self._running:
+            return
+        self._running = False
+        self._wake.set()
+        self._thread.join(timeout=2)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Journal flush on close failed: {e}")
@@ -0,0 +1,338 @@
+import logging
+from typing import Dict, FrozenSet, Iterable, Optional, Sequence, Set, Tuple
+from src.common.models import Snippet, TriggerType
+from src.engine.records import RecordTable, RecordView
+
+logger = logging.getLogger(__name__)
+
+
+class _Node:
+    """
+    A trie node, reached by one character while walking an abbreviation backwards.
+
+    Runs of nodes with a single child and no snippet are folded into label: the
+    characters that must follow (further back in the buffer) before this node
+    is reached. Leaves have children=None rather than an empty dict.
+    row is the winning snippet for this abbreviation (-1: none), shadowed holds
+    the rows of later duplicates in store order.
+    """
+
+    __slots__ = ("children", "label", "row", "shadowed")
+
+    def __init__(
+        self,
+        children: Optional[Dict[str, "_Node"]] = None,
+        label: str = "",
+        row: int = -1,
+        shadowed: tuple = (),
+    ):
+        self.children = children
+        self.label = label
+        self.row = row
+        self.shadowed: Tuple[int, ...] = shadowed
+
+    def copy(self) -> "_Node":
+        children = dict(self.children) if self.children else None
+        return _Node(children, self.label, self.row, self.shadowed)
+
+    @property
+    def rows(self) -> Tuple[int, ...]:
+        return ((self.row,) if self.row >= 0 else ()) + self.shadowed
+
+    def set_rows(self, rows: Tuple[int, ...]) -> None:
+        self.row = rows[0] if rows else -1
+        self.shadowed = rows[1:]
+
+
+class _Locations:
+    """
+    Snippet id -> row, shared between matcher versions.
+
+    base is never mutated once a derived map exists; each version only copies
+    its small overlay of changes (row -1: deleted). The overlay is folded
+    into a new base once it grows past MERGE_AT, so an update costs O(1)
+    amortized instead of a copy of every id.
+    """
+
+    MERGE_AT = 1024
+
+    __slots__ = ("base", "overlay")
+
+    def __init__(
+        self, base: Optional[Dict[str, int]] = None, overlay: Optional[Dict[str, int]] = None
+    ):
+        self.base: Dict[str, int] = base if base is not None else {}
+        self.overlay: Dict[str, int] = overlay if overlay is not None else {}
+
+    def get(self, snippet_id: str) -> Optional[int]:
+        row = self.overlay.get(snippet_id)
+        if row is None:
+            return self.base.get(snippet_id)
+        return row if row >= 0 else None
+
+    def __contains__(self, snippet_id: str) -> bool:
+        return self.get(snippet_id) is not None
+
+    def rows(self) -> Iterable[int]:
+        overlay = self.overlay
+        for snippet_id, row in self.base.items():
+            if snippet_id not in overlay:
+                yield row
+        for row in overlay.values():
+            if row >= 0:
+                yield row
+
+    def derive(self) -> "_Locations":
+        if len(self.overlay) < self.MERGE_AT:
+            return _Locations(self.base, dict(self.overlay))
+        base = dict(self.base)
+        for snippet_id, row in self.overlay.items():
+            if row >= 0:
+                base[snippet_id] = row
+            else:
+                base.pop(snippet_id, None)
+        return _Locations(base)
+
+
+class SnippetMatcher:
+    """
+    Compiled matcher over a snippet list.
+
+    Abbreviations are inserted reversed into one trie per TriggerType, so finding
+    every abbreviation that ends the buffer is a single walk backwards from the
+    last character. Cost per key is bounded by the longest abbreviation, not by
+    the number of snippets.
+
+    When several snippets match, the longest abbreviation wins. Between two
+    snippets with the same abbreviation and trigger the first one in list order
+    is kept, after updates too: orders holds each snippet's place in the list
+    (an edit keeps it, a new snippet goes last), so an updated matcher picks
+    the one a rebuild would. An instant (NONE) match beats a triggered match
+    of the same length.
+
+    The trie holds int rows of a RecordTable rather than objects per snippet;
+    the fields are copied into the table at compile time, so later in-place
+    edits of a Snippet model cannot change a published matcher.
+
+    A built matcher is treated as immutable: updated() returns a new matcher
+    that shares the table and every node except those on the changed paths.
+    """
+
+    def __init__(self, snippets: Iterable[Snippet] = (), table: Optional[RecordTable] = None):
+        self.table = table if table is not None else RecordTable()
+        self.roots: Dict[TriggerType, _Node] = {t: _Node() for t in TriggerType}
+        self.locations = _Locations()
+        # Snippet id -> place in the store's list, inactive snippets included;
+        # only the relative order matters
+        self.orders = _Locations()
+        self.next_order = 0
+        self.max_abbr_len = 0  # Upper bound; not lowered by deletes
+        self.size = 0
+        for snippet in snippets:
+            self.add(snippet)
+
+    def add(self, snippet: Snippet) -> None:
+        """Inserts in place. Only valid while the matcher is being built."""
+        if snippet.id in self.orders:
+            return
+        self.orders.base[snippet.id] = self.next_order
+        self.next_order += 1
+        if not self._is_matchable(snippet):
+            return
+        self._insert(self.table.append(snippet), None)
+
+    def updated(
+        self, upserts: Iterable[Snippet] = (), deletes: Iterable[str] = ()
+    ) -> "SnippetMatcher":
+        """
+        Returns a new matcher with the changes applied, leaving this one untouched.
+        Only the nodes on the affected abbreviation paths are copied; changed
+        snippets get new rows in the shared table.
+        """
+        new = SnippetMatcher.__new__(SnippetMatcher)
+        new.table = self.table
+        new.roots = dict(self.roots)
+        new.locations = self.locations.derive()
+        new.orders = self.orders.derive()
+        new.next_order = self.next_order
+        new.max_abbr_len = self.max_abbr_len
+        new.size = self.size
+
+        table = self.table
+        copied: Set[int] = set()  # Nodes created for this update, safe to mutate
+        for snippet_id in deletes:
+            new._remove(snippet_id, copied)
+            new.orders.overlay[snippet_id] = -1
+        for snippet in upserts:
+            if snippet.id not in new.orders:
+                # New snippets are appended to the store's list
+                new.orders.overlay[snippet.id] = new.next_order
+                new.next_order += 1
+            if not self._is_matchable(snippet):
+                new._remove(snippet.id, copied)
+                continue
+            old = new.locations.get(snippet.id)
+            row = table.append(snippet)
+            if (
+                old is not None
+                and table.trigger(old) == snippet.trigger
+                and table.abbreviations[old] == snippet.abbreviation
+            ):
+                # Same key: replace in place so it keeps its precedence
+                node = new._path(snippet.trigger, snippet.abbreviation, copied, create=False)
+                node.set_rows(tuple(row if r == old else r for r in node.rows))
+                new.locations.overlay[snippet.id] = row
+            else:
+                new._remove(snippet.id, copied)
+                new._insert(row, copied)
+        return new
+
+    def alphabet(self) -> FrozenSet[str]:
+        abbreviations = self.table.abbreviations
+        chars = set()
+        for row in self.locations.rows():
+            chars.update(abbreviations[row])
+        return frozenset(chars)
+
+    def entry(self, row: int) -> RecordView:
+        return RecordView(self.table, row)
+
+    @staticmethod
+    def _is_matchable(snippet: Snippet) -> bool:
+        return bool(snippet.is_active and snippet.abbreviation)
+
+    def _path(
+        self, trigger: TriggerType, abbr: str, copied: Optional[Set[int]], create: bool
+    ) -> Optional[_Node]:
+        """
+        Walks to the node for abbr, splitting a folded label where abbr ends or
+        branches inside it. With a copied set, every node on the way is swapped
+        for a private copy first; copied=None mutates in place.
+        """
+        node = self.roots[trigger]
+        if copied is not None and id(node) not in copied:
+            node = node.copy()
+            copied.add(id(node))
+            self.roots[trigger] = node
+
+        rest = abbr[::-1]
+        while rest:
+            ch, rest = rest[0], rest[1:]
+            child = node.children.get(ch) if node.children else None
+            if child is None:
+                if not create:
+                    return None
+                # A new leaf takes the whole remaining path as its label
+                child = _Node(label=rest)
+                if copied is not None:
+                    copied.add(id(child))
+                rest = ""
+            else:
+                if copied is not None and id(child) not in copied:
+                    child = child.copy()
+                    copied.add(id(child))
+                label = child.label
+                common = 0
+                while common < len(label) and common < len(rest) and label[common] == rest[common]:
+                    common += 1
+                if common < len(label):
+                    if not create:
+                        return None
+                    # Split: a new node for the shared part, the old one below it
+                    split = _Node({label[common]: child}, label[:common])
+                    child.label = label[common + 1:]
+                    child = split
+                    if copied is not None:
+                        copied.add(id(child))
+                rest = rest[common:]
+            if node.children is None:
+                node.children = {}
+            node.children[ch] = child
+            node = child
+        return node
+
+    def _insert(self, row: int, copied: Optional[Set[int]]) -> None:
+        table = self.table
+        abbr = table.abbreviations[row]
+        trigger = table.trigger(row)
+        node = self._path(trigger, abbr, copied, create=True)
+        if node.row >= 0:
+            rows = tuple(sorted(node.rows + (row,), key=self._order))
+            logger.debug(
+                f"Duplicate abbreviation '{abbr}' ({trigger.value}), "
+                f"keeping snippet id={table.ids[rows[0]]}"
+            )
+            node.set_rows(rows)
+        else:
+            self.size += 1
+            node.row = row
+        if copied is None:
+            # Still being built: nothing shares the map yet
+            self.locations.base[table.ids[row]] = row
+        else:
+            self.locations.overlay[table.ids[row]] = row
+        self.max_abbr_len = max(self.max_abbr_len, len(abbr))
+
+    def _order(self, row: int) -> int:
+        return self.orders.get(self.table.ids[row])
+
+    def _remove(self, snippet_id: str, copied: Set[int]) -> None:
+        row = self.locations.get(snippet_id)
+        if row is None:
+            return
+        self.locations.overlay[snippet_id] = -1
+        node = self._path(self.table.trigger(row), self.table.abbreviations[row], copied, create=False)
+        if node is None:
+            return
+        node.set_rows(tuple(r for r in node.rows if r != row))
+        if node.row < 0:
+            self.size -= 1
+
+    def longest_suffix(
+        self, trigger: TriggerType, buffer: Sequence[str], end: Optional[int] = None
+    ) -> int:
+        """
+        Returns the row with the longest abbreviation ending at buffer[:end], or -1.
+        buffer can be a str or a KeyBuffer; it is only indexed, never sliced.
+        """
+        node = self.roots[trigger]
+        i = len(buffer) if end is None else end
+        best = -1
+        while i > 0 and node.children:
+            i -= 1
+            node = node.children.get(buffer[i])
+            if node is None:
+                break
+            label = node.label
+            if label:
+                if len(label) > i:
+                    break
+                for ch in label:
+                    i -= 1
+                    if buffer[i] != ch:
+                        return best
+            if node.row >= 0:
+                best = node.row
+        return best
+
+    def match(
+        self, buffer: Sequence[str], trigger: Optional[TriggerType] = None
+    ) -> Optional[Tuple[RecordView, int]]:
+        """
+        Finds the best snippet for the current buffer.
+        trigger: the TriggerType of the last char in the buffer, if it is a trigger key.
+        Returns: (entry, chars_to_delete) or None
+        """
+        abbreviations = self.table.abbreviations
+        best = self.longest_suffix(TriggerType.NONE, buffer)
+
+        if trigger is not None and trigger != TriggerType.NONE:
+            triggered = self.longest_suffix(trigger, buffer, len(buffer) - 1)
+            if triggered >= 0 and (
+                best < 0 or len(abbreviations[triggered]) > len(abbreviations[best])
+            ):
+                return self.entry(triggered), len(abbreviations[triggered]) + 1
+
+        if best >= 0:
+            return self.entry(best), len(abbreviations[best])
+        return None
@@ -1,35 +1,249 @@
+"""
+Placeholder resolution for expansion templates.
+
+Every {{name}} / {{name:argument}} kind is a Placeholder in a registry and
+declares how it may be evaluated:
+
+*   PURE: the value depends on the argument only; computed once, then cached.
+*   CACHEABLE: computed once per cache_key() value, e.g. dates per minute.
+*   SLOW: may block (clipboard, user commands); runs on a worker pool with
+    its own timeout, and the fallback stands in when it fails or times out.
+
+render() resolves slow slots on the pool and waits for them (bounded by
+their timeouts). submit() never waits: it returns a Future, so the backend
+can answer keys while an expansion's slow slots are still running.
+{{script:name}} runs the command Settings.commands[name] in a process of
+its own, killed when its timeout expires. With a ReferenceGraph set,
+{{snippet:abbreviation}} references are inlined before anything else
+(src/engine/references.py).
+"""
 import datetime
-import pyperclip
 import logging
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional, Tuple
+import pyperclip
+from src.engine.references import ReferenceGraph  # noqa: F401  registers {{snippet:...}}
+from src.engine.templates import ExpansionTemplate, register_placeholder_names
 
 logger = logging.getLogger(__name__)
 
+PURE = "pure"
+CACHEABLE = "cacheable"
+SLOW = "slow"
+
+# Threads for slow placeholders, and as many again to assemble their results
+SLOW_WORKERS = 4
+# A locked clipboard is not worth waiting for longer than this
+CLIPBOARD_TIMEOUT = 0.25
+SCRIPT_TIMEOUT = 2.0
+
+DATE_FORMATS = {
+    "date": "%Y-%m-%d",
+    "time": "%H:%M",
+    "datetime": "%Y-%m-%d %H:%M",
+}
+
+
+def current_minute() -> int:
+    return int(time.time() // 60)
+
+
+class Placeholder:
+    """One kind of slot: resolve(argument) -> text, argument being None for a plain {{name}}."""
+
+    __slots__ = ("name", "resolve", "kind", "cache_key", "timeout", "fallback")
+
+    def __init__(
+        self,
+        name: str,
+        resolve: Callable[[Optional[str]], str],
+        kind: str = PURE,
+        cache_key: Optional[Callable[[], object]] = None,
+        timeout: float = CLIPBOARD_TIMEOUT,
+        fallback: str = "",
+    ):
+        if kind not in (PURE, CACHEABLE, SLOW):
+            raise ValueError(f"Unknown placeholder kind {kind!r}")
+        if kind == CACHEABLE and cache_key is None:
+            raise ValueError("A cacheable placeholder needs a cache_key")
+        self.name = name
+        self.resolve = resolve
+        self.kind = kind
+        self.cache_key = cache_key
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+class CommandRunner:
+    """{{script:name}}: the output of the command configured as `name`, trailing newline dropped."""
+
+    def __init__(self, timeout: float = SCRIPT_TIMEOUT):
+        self.timeout = timeout
+        self.commands: Dict[str, str] = {}
+
+    def __call__(self, name: Optional[str]) -> str:
+        command = self.commands.get(name or "")
+        if command is None:
+            raise KeyError(f"No command named {name!r}")
+        # subprocess.run kills the process when the timeout expires
+        done = subprocess.run(
+            command, shell=True, capture_output=True, text=True, timeout=self.timeout,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
+        )
+        if done.returncode:
+            raise RuntimeError(f"Command {name!r} exited with {done.returncode}: {done.stderr.strip()}")
+        return done.stdout.rstrip("\r\n")
+
+
+def _clipboard(_argument: Optional[str]) -> str:
+    return pyperclip.paste()
+
+
+class PlaceholderRegistry:
+    def __init__(self):
+        self._placeholders: Dict[str, Placeholder] = {}
+
+    def register(self, placeholder: Placeholder) -> None:
+        """Register before the library is compiled: templates parsed earlier keep {{name}} literal."""
+        self._placeholders[placeholder.name] = placeholder
+        register_placeholder_names(placeholder.name)
+
+    def lookup(self, slot: str) -> Tuple[Optional[Placeholder], Optional[str]]:
+        name, _, argument = slot.partition(":")
+        return self._placeholders.get(name), argument or None
+
+    @classmethod
+    def default(cls, commands: Optional[CommandRunner] = None) -> "PlaceholderRegistry":
+        registry = cls()
+        for name, fmt in DATE_FORMATS.items():
+            registry.register(Placeholder(
+                name, lambda _, fmt=fmt: datetime.datetime.now().strftime(fmt), CACHEABLE, current_minute,
+            ))
+        registry.register(Placeholder("clipboard", _clipboard, SLOW, timeout=CLIPBOARD_TIMEOUT))
+        commands = commands or CommandRunner()
+        registry.register(Placeholder("script", commands, SLOW, timeout=commands.timeout))
+        return registry
+
+
 class PlaceholderResolver:
-    def resolve(self, text: str) -> str:
+    def __init__(self, registry: Optional[PlaceholderRegistry] = None, workers: int = SLOW_WORKERS):
+        self.commands = CommandRunner()
+        self.registry = registry or PlaceholderRegistry.default(self.commands)
+        self.references = None  # ReferenceGraph, set by the engine
+        self.workers = workers
+        self._cache: Dict[str, Tuple[object, str]] = {}  # slot -> (cache key, value)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._joiner: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.timeouts = 0
+
+    def set_commands(self, commands: Dict[str, str]) -> None:
+        self.commands.commands = dict(commands)
+
+    def is_slow(self, template: ExpansionTemplate) -> bool:
+        """Whether rendering template would wait on a slow placeholder."""
+        for slot in self._flatten(template).slots:
+            placeholder, _ = self.registry.lookup(slot)
+            if placeholder is not None and placeholder.kind == SLOW:
+                return True
+        return False
+
+    def render(self, template: ExpansionTemplate) -> Tuple[str, int]:
         """
-        Replaces placeholders in the text with their actual values.
-        Supported: {{date}}, {{time}}, {{datetime}}, {{clipboard}}, {{cursor}} (handled by engine)
+        Renders a compiled template. Returns (final_text, cursor_offset).
+        Static templates come back as-is; otherwise only the slots the template
+        contains are evaluated. Slow slots are waited for, up to their timeouts.
         """
-        now = datetime.datetime.now()
-        
-        # Date/Time
-        text = text.replace("{{date}}", now.strftime("%Y-%m-%d"))
-        text = text.replace("{{time}}", now.strftime("%H:%M"))
-        text = text.replace("{{datetime}}", now.strftime("%Y-%m-%d %H:%M"))
-        
-        # Clipboard
-        if "{{clipboard}}" in text:
+        template = self._flatten(template)
+        if template.is_static:
+            return template.text, template.cursor_offset
+        values, running = self._start(template)
+        if running:
+            self._collect(running, values)
+        return template.render(values.__getitem__)
+
+    def submit(self, template: ExpansionTemplate) -> "Future":
+        """A Future of render(template) that never raises; slow slots run on the pool meanwhile."""
+        future: Future = Future()
+        template = self._flatten(template)
+        if template.is_static:
+            future.set_result((template.text, template.cursor_offset))
+            return future
+        values, running = self._start(template)
+        if not running:
+            future.set_result(template.render(values.__getitem__))
+            return future
+
+        def assemble():
+            self._collect(running, values)
+            future.set_result(template.render(values.__getitem__))
+
+        self._executors()[1].submit(assemble)
+        return future
+
+    def _flatten(self, template: ExpansionTemplate) -> ExpansionTemplate:
+        return self.references.flatten(template) if self.references is not None else template
+
+    def _start(self, template: ExpansionTemplate):
+        """Values of the fast slots, and (placeholder, future, deadline) per slow slot."""
+        values: Dict[str, str] = {}
+        running = {}
+        for slot in template.slots:
+            placeholder, argument = self.registry.lookup(slot)
+            if placeholder is None:
+                values[slot] = ""
+            elif placeholder.kind == SLOW:
+                future = self._executors()[0].submit(placeholder.resolve, argument)
+                running[slot] = (placeholder, future, time.monotonic() + placeholder.timeout)
+            else:
+                values[slot] = self._cached(slot, placeholder, argument)
+        return values, running
+
+    def _cached(self, slot: str, placeholder: Placeholder, argument: Optional[str]) -> str:
+        key = placeholder.cache_key() if placeholder.cache_key is not None else None
+        cached = self._cache.get(slot)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        try:
+            value = placeholder.resolve(argument)
+        except Exception as e:
+            logger.error(f"Placeholder {{{{{slot}}}}} failed: {e}")
+            return placeholder.fallback
+        self._cache[slot] = (key, value)
+        return value
+
+    def _collect(self, running: dict, values: Dict[str, str]) -> None:
+        for slot, (placeholder, future, deadline) in running.items():
             try:
-                clipboard_content = pyperclip.paste()
-                text = text.replace("{{clipboard}}", clipboard_content)
+                values[slot] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                # Only this expansion degrades; the resolver keeps its worker until it returns
+                future.cancel()
+                self.timeouts += 1
+                logger.warning(f"Placeholder {{{{{slot}}}}} timed out after {placeholder.timeout}s")
+                values[slot] = placeholder.fallback
             except Exception as e:
-                logger.error(f"Clipboard access failed: {e}")
-                text = text.replace("{{clipboard}}", "")
+                logger.error(f"Placeholder {{{{{slot}}}}} failed: {e}")
+                values[slot] = placeholder.fallback
 
-        # {{cursor}} is special, it marks where the cursor should end up.
-        # It is NOT replaced here, but handled by the engine to calculate backspaces/arrow keys.
-        
-        return text
+    def _executors(self) -> Tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._joiner = ThreadPoolExecutor(self.workers, thread_name_prefix="placeholder-join")
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="placeholder")
+        return self._pool, self._joiner
+
+    def resolve(self, text: str) -> str:
+        """
+        Replaces placeholders in the text with their actual values.
+        {{cursor}} is kept; the engine uses it to place the caret.
+        """
+        return "{{cursor}}".join(self.render(ExpansionTemplate(part))[0] for part in text.split("{{cursor}}"))
 
     def get_cursor_offset(self, text: str) -> int:
         """
@@ -38,12 +252,12 @@ class PlaceholderResolver:
         """
         if "{{cursor}}" not in text:
             return 0
-        
+
         parts = text.split("{{cursor}}")
         # The cursor should be after the first part.
         # We need to know how many chars to move LEFT from the end of the final string.
         final_text = text.replace("{{cursor}}", "")
-        
+
         # Length of text AFTER the cursor marker
         suffix_len = len(parts[1]) if len(parts) > 1 else 0
         return suffix_len
@@ -0,0 +1,112 @@
+"""
+Per-application snippet indexes.
+
+A Profile carries its own snippets and the executables (target_apps) they
+apply to. Each active profile gets an IndexPublisher of its own, created
+and compiled (on the publisher's worker thread) the first time one of its
+apps comes to the foreground, so app-specific libraries cost nothing until
+they are used. Switching apps is one dict lookup for the tuple of
+publishers that apply; the engine matches against those and the global
+index.
+"""
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from src.common.models import Profile, app_key
+from src.engine.index import IndexPublisher, SnippetIndex
+
+logger = logging.getLogger(__name__)
+
+
+class _ProfileIndex:
+    __slots__ = ("profile", "publisher")
+
+    def __init__(self, profile: Profile):
+        self.profile = profile
+        self.publisher: Optional[IndexPublisher] = None
+
+
+class ProfileIndexes:
+    """
+    update() takes the store's profiles whenever they change; profiles whose
+    snippets did not change keep their compiled index. activate(app) returns
+    the publishers for app, compiling the ones not used before.
+    """
+
+    def __init__(self):
+        self._profiles: Dict[str, _ProfileIndex] = {}
+        self._by_app: Dict[str, Tuple[_ProfileIndex, ...]] = {}
+        self._subscribers: List[Callable[[SnippetIndex], None]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[SnippetIndex], None]) -> None:
+        """callback(index) after every publish of any profile index, on its worker thread."""
+        with self._lock:
+            self._subscribers.append(callback)
+            for entry in self._profiles.values():
+                if entry.publisher is not None:
+                    entry.publisher.subscribe(callback)
+
+    def update(self, profiles: Iterable[Profile]) -> None:
+        with self._lock:
+            previous, current = self._profiles, {}
+            for profile in profiles:
+                if not profile.is_active:
+                    continue
+                entry = previous.pop(profile.id, None)
+                if entry is None:
+                    entry = _ProfileIndex(profile)
+                elif entry.publisher is not None and entry.profile.snippets != profile.snippets:
+                    entry.publisher.reload(profile.snippets)
+                entry.profile = profile
+                current[profile.id] = entry
+            for entry in previous.values():
+                if entry.publisher is not None:
+                    entry.publisher.stop()
+
+            by_app: Dict[str, List[_ProfileIndex]] = {}
+            for entry in current.values():
+                for app in {app_key(app) for app in entry.profile.target_apps}:
+                    by_app.setdefault(app, []).append(entry)
+            self._profiles = current
+            self._by_app = {app: tuple(entries) for app, entries in by_app.items()}
+        logger.info(f"{len(current)} active profiles for {len(by_app)} applications")
+
+    def activate(self, app: Optional[str]) -> Tuple[IndexPublisher, ...]:
+        entries = self._by_app.get(app_key(app), ())
+        if not entries:
+            return ()
+        with self._lock:
+            return tuple(self._publisher(entry) for entry in entries)
+
+    def _publisher(self, entry: _ProfileIndex) -> IndexPublisher:
+        if entry.publisher is None:
+            # Empty until the worker publishes the compiled snippets, a few ms later
+            entry.publisher = IndexPublisher()
+            for callback in self._subscribers:
+                entry.publisher.subscribe(callback)
+            entry.publisher.reload(entry.profile.snippets)
+            logger.info(
+                f"Compiling profile '{entry.profile.name}' ({len(entry.profile.snippets)} snippets)"
+            )
+        return entry.publisher
+
+    def apps(self) -> List[str]:
+        """Executables (app_key) that have at least one active profile."""
+        return sorted(self._by_app)
+
+    def loaded(self) -> List[SnippetIndex]:
+        """The current index of every profile compiled so far."""
+        with self._lock:
+            return [e.publisher.current for e in self._profiles.values() if e.publisher is not None]
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        with self._lock:
+            publishers = [e.publisher for e in self._profiles.values() if e.publisher is not None]
+        return all(publisher.wait(timeout) for publisher in publishers)
+
+    def stop(self) -> None:
+        with self._lock:
+            for entry in self._profiles.values():
+                if entry.publisher is not None:
+                    entry.publisher.stop()
@@ -0,0 +1,137 @@
+import sys
+from array import array
+from typing import Dict, List, Optional
+from src.common.models import TriggerType
+from src.engine.snapshot import TRIGGER_CODES, TRIGGERS_BY_CODE, SnapshotColumns, SnippetRecord
+from src.engine.templates import ExpansionTemplate
+
+FLAG_TRIGGER_MASK = 0x03
+FLAG_ACTIVE = 0x04
+
+
+class BodyPool:
+    """
+    Expansion bodies of a RecordTable, addressed by an int key.
+
+    Bodies given as text are deduplicated: identical expansions share one key,
+    and so one compiled template. Rows of snapshot columns are not copied at
+    all: their key is ~row (negative) and the text stays encoded in the
+    snapshot blob until a template is needed. Records with a lazy_body
+    (sqlite_store.SQLiteRecord) are kept as they are and read on first use
+    too. Templates are compiled on first use and kept.
+    """
+
+    __slots__ = ("columns", "_texts", "_by_text", "_templates")
+
+    def __init__(self):
+        self.columns: Optional[SnapshotColumns] = None
+        self._texts: List = []  # str, or a record whose expansion is read on use
+        self._by_text: Dict[str, int] = {}
+        self._templates: Dict[int, ExpansionTemplate] = {}
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add(self, snippet) -> int:
+        if isinstance(snippet, SnippetRecord) and self.columns in (None, snippet.columns):
+            self.columns = snippet.columns
+            return ~snippet.row
+        if getattr(snippet, "lazy_body", False):
+            self._texts.append(snippet)
+            return len(self._texts) - 1
+        text = snippet.expansion
+        key = self._by_text.get(text)
+        if key is None:
+            key = self._by_text[text] = len(self._texts)
+            self._texts.append(text)
+        return key
+
+    def text(self, key: int) -> str:
+        if key < 0:
+            return self.columns.expansion(~key)
+        text = self._texts[key]
+        return text if isinstance(text, str) else text.expansion
+
+    def template(self, key: int) -> ExpansionTemplate:
+        template = self._templates.get(key)
+        if template is None:
+            template = self._templates[key] = ExpansionTemplate(self.text(key))
+        return template
+
+
+class RecordTable:
+    """
+    Columnar, append-only store of what the matcher needs per snippet.
+
+    A row is a plain int: ids[row], abbreviations[row] (interned), flags[row]
+    (trigger code in the low bits plus FLAG_ACTIVE) and body_ids[row], a key
+    into the table's BodyPool. The full Snippet model is not referenced;
+    callers map ids back to the store when they need it.
+
+    Rows are never rewritten, so matchers sharing a table stay valid: an edit
+    appends a new row and the old one is simply no longer referenced. A full
+    reload starts a fresh table.
+    """
+
+    __slots__ = ("ids", "abbreviations", "flags", "body_ids", "bodies")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.abbreviations: List[str] = []
+        self.flags = bytearray()
+        self.body_ids = array("i")
+        self.bodies = BodyPool()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, snippet) -> int:
+        row = len(self.ids)
+        self.body_ids.append(self.bodies.add(snippet))
+        self.flags.append(TRIGGER_CODES[snippet.trigger] | (FLAG_ACTIVE if snippet.is_active else 0))
+        self.abbreviations.append(sys.intern(snippet.abbreviation))
+        # Appended last: a row is only reachable once every column has it
+        self.ids.append(snippet.id)
+        return row
+
+    def trigger(self, row: int) -> TriggerType:
+        return TRIGGERS_BY_CODE[self.flags[row] & FLAG_TRIGGER_MASK]
+
+    def is_active(self, row: int) -> bool:
+        return bool(self.flags[row] & FLAG_ACTIVE)
+
+    def expansion(self, row: int) -> str:
+        return self.bodies.text(self.body_ids[row])
+
+    def template(self, row: int) -> ExpansionTemplate:
+        return self.bodies.template(self.body_ids[row])
+
+
+class RecordView:
+    """A matched row, with the fields the engine reports. Built per match only."""
+
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: RecordTable, row: int):
+        self.table = table
+        self.row = row
+
+    @property
+    def id(self) -> str:
+        return self.table.ids[self.row]
+
+    @property
+    def abbreviation(self) -> str:
+        return self.table.abbreviations[self.row]
+
+    @property
+    def trigger(self) -> TriggerType:
+        return self.table.trigger(self.row)
+
+    @property
+    def expansion(self) -> str:
+        return self.table.expansion(self.row)
+
+    @property
+    def template(self) -> ExpansionTemplate:
+        return self.table.template(self.row)
@@ -0,0 +1,272 @@
+"""
+Snippets embedding other snippets: {{snippet:abbreviation}}.
+
+A signature or a greeting shared by many templates is stored once and
+referenced everywhere else. ReferenceGraph follows the store (load, upsert,
+delete) and keeps, per abbreviation, the abbreviations its expansion
+references and the ones referencing it. It is built the first time a
+template references a snippet, decoding only the bodies that mention
+{{snippet:. Rendering goes through flatten():
+the references of a template are inlined, recursively, into one source text
+that is compiled into a single ExpansionTemplate and memoized, so a nested
+expansion costs what a flat one does, and a fully static tree is
+prerendered text.
+
+A change to a snippet drops the memos of that snippet and of its
+dependents only. A reference to a snippet on a cycle, to a missing one, or
+nested deeper than MAX_DEPTH renders as nothing. Profile snippets may
+reference the global library.
+"""
+import logging
+import re
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, List, Set, Tuple
+from src.common.models import Snippet
+from src.engine.snapshot import mentions
+from src.engine.templates import ExpansionTemplate, register_placeholder_names
+
+logger = logging.getLogger(__name__)
+
+REFERENCE = "snippet"
+REFERENCE_PREFIX = REFERENCE + ":"
+REFERENCE_OPEN = "{{" + REFERENCE_PREFIX
+REFERENCE_RE = re.compile(r"\{\{" + REFERENCE + r":([^{}]+)\}\}")
+MAX_DEPTH = 16
+
+register_placeholder_names(REFERENCE)
+
+
+def references(text: str) -> FrozenSet[str]:
+    """Abbreviations text embeds."""
+    if "{{" not in text:
+        return frozenset()
+    return frozenset(REFERENCE_RE.findall(text))
+
+
+class ReferenceGraph:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # abbreviation -> active snippets with it, in store order; the first one is used
+        self._snippets: Dict[str, List] = {}
+        self._abbreviation_of: Dict[str, str] = {}  # snippet id -> abbreviation
+        self._refs: Dict[str, FrozenSet[str]] = {}  # abbreviation -> abbreviations it embeds
+        self._dependents: Dict[str, Set[str]] = {}  # abbreviation -> abbreviations embedding it
+        self.cyclic: FrozenSet[str] = frozenset()
+        # Memos: complete flattened source and its height per abbreviation,
+        # flattened template per source text, and which sources embed an
+        # abbreviation directly
+        self._flat: Dict[str, Tuple[str, int]] = {}
+        self._templates: Dict[str, ExpansionTemplate] = {}
+        self._users: Dict[str, Set[str]] = {}
+        self.invalidated = 0
+        self._source: Callable[[], Iterable] = tuple
+        self._built = False
+
+    def load(self, source: Callable[[], Iterable]) -> None:
+        """
+        Follows source(), the store's records, from now on. Nothing is read
+        until a template first references a snippet: a library without
+        references never has its bodies decoded for the graph.
+        """
+        with self._lock:
+            self._source = source
+            self._built = False
+            self._snippets, self._abbreviation_of = {}, {}
+            self._refs, self._dependents = {}, {}
+            self._flat, self._templates, self._users = {}, {}, {}
+            self.cyclic = frozenset()
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def _build(self) -> None:
+        for snippet in self._source():
+            if snippet.is_active:
+                self._snippets.setdefault(snippet.abbreviation, []).append(snippet)
+                self._abbreviation_of[snippet.id] = snippet.abbreviation
+        for abbreviation in self._snippets:
+            self._set_edges(abbreviation)
+        self._find_cycles()
+        self._built = True
+        logger.info(f"Snippet references: {len(self._refs)} snippets embed others")
+
+    def upsert(self, snippet) -> None:
+        if isinstance(snippet, Snippet):
+            # Later in-place edits by the caller must come back through upsert
+            snippet = snippet.model_copy()
+        with self._lock:
+            if not self._built:
+                return  # The store has it already; _build will read it
+            touched = set()
+            previous = self._abbreviation_of.pop(snippet.id, None)
+            position = None
+            if previous is not None:
+                entries = self._snippets[previous]
+                position = next(i for i, s in enumerate(entries) if s.id == snippet.id)
+                del entries[position]
+                if not entries:
+                    del self._snippets[previous]
+                touched.add(previous)
+            if snippet.is_active:
+                entries = self._snippets.setdefault(snippet.abbreviation, [])
+                if previous == snippet.abbreviation:
+                    entries.insert(position, snippet)
+                else:
+                    entries.append(snippet)
+                self._abbreviation_of[snippet.id] = snippet.abbreviation
+                touched.add(snippet.abbreviation)
+            self._changed(touched)
+
+    def delete(self, snippet_id: str) -> None:
+        with self._lock:
+            if not self._built:
+                return
+            previous = self._abbreviation_of.pop(snippet_id, None)
+            if previous is None:
+                return
+            entries = self._snippets[previous]
+            entries[:] = [s for s in entries if s.id != snippet_id]
+            if not entries:
+                del self._snippets[previous]
+            self._changed({previous})
+
+    def _changed(self, abbreviations: Set[str]) -> None:
+        cyclic = self.cyclic
+        for abbreviation in abbreviations:
+            self._set_edges(abbreviation)
+        self._find_cycles()
+        # A snippet joining or leaving a cycle changes what its dependents render
+        self._invalidate(abbreviations | (cyclic ^ self.cyclic))
+
+    def _set_edges(self, abbreviation: str) -> None:
+        entries = self._snippets.get(abbreviation)
+        # Only bodies that mention a reference are decoded
+        if entries and mentions(entries[0], REFERENCE_OPEN):
+            refs = references(entries[0].expansion)
+        else:
+            refs = frozenset()
+        for target in self._refs.get(abbreviation, ()):
+            self._dependents.get(target, set()).discard(abbreviation)
+        if refs:
+            self._refs[abbreviation] = refs
+            for target in refs:
+                self._dependents.setdefault(target, set()).add(abbreviation)
+        else:
+            self._refs.pop(abbreviation, None)
+
+    def _find_cycles(self) -> None:
+        """Tarjan's strongly connected components over the snippets that embed others."""
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        cyclic: Set[str] = set()
+        for root in self._refs:
+            if root in index:
+                continue
+            # Iterative DFS: (node, iterator over its references)
+            work = [(root, iter(self._refs.get(root, ())))]
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, targets = work[-1]
+                for target in targets:
+                    if target not in index:
+                        index[target] = low[target] = len(index)
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(self._refs.get(target, ()))))
+                        break
+                    if target in on_stack:
+                        low[node] = min(low[node], index[target])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        if len(component) > 1 or node in self._refs.get(node, ()):
+                            cyclic.update(component)
+        if cyclic and cyclic != self.cyclic:
+            logger.warning(f"Snippet references form a cycle, left empty: {', '.join(sorted(cyclic))}")
+        self.cyclic = frozenset(cyclic)
+
+    def _invalidate(self, abbreviations: Set[str]) -> None:
+        """Drops the memos of abbreviations and of everything embedding them."""
+        closure: Set[str] = set()
+        pending = list(abbreviations)
+        while pending:
+            abbreviation = pending.pop()
+            if abbreviation in closure:
+                continue
+            closure.add(abbreviation)
+            pending.extend(self._dependents.get(abbreviation, ()))
+        for abbreviation in closure:
+            self._flat.pop(abbreviation, None)
+            for source in self._users.pop(abbreviation, ()):
+                self._templates.pop(source, None)
+        self.invalidated += len(closure)
+
+    def flatten(self, template: ExpansionTemplate) -> ExpansionTemplate:
+        """template with its references inlined; itself if it has none."""
+        for slot in template.slots:
+            if slot.startswith(REFERENCE_PREFIX):
+                break
+        else:
+            return template
+        source = template.source
+        flat = self._templates.get(source)
+        if flat is not None:
+            return flat
+        with self._lock:
+            if not self._built:
+                self._build()
+            flat = self._templates.get(source)
+            if flat is None:
+                flat = self._templates[source] = ExpansionTemplate(self._inline(source, ())[0])
+                for abbreviation in references(source):
+                    self._users.setdefault(abbreviation, set()).add(source)
+        return flat
+
+    def _inline(self, source: str, path: tuple) -> Tuple[str, int, bool]:
+        """(flattened source, levels of references below it, whether MAX_DEPTH cut it short)."""
+        below = 0
+        cut = False
+
+        def inline(match) -> str:
+            nonlocal below, cut
+            text, height, truncated = self._flat_source(match.group(1), path)
+            below = max(below, height)
+            cut = cut or truncated
+            return text
+
+        return REFERENCE_RE.sub(inline, source), below, cut
+
+    def _flat_source(self, abbreviation: str, path: tuple) -> Tuple[str, int, bool]:
+        """
+        (text, height, truncated) for a reference reached through path. Only
+        complete expansions are memoized, with their height: a memo is used
+        where it still fits under MAX_DEPTH, so the same snippet renders alike
+        whichever chain reached it first.
+        """
+        memo = self._flat.get(abbreviation)
+        if memo is not None and len(path) + memo[1] <= MAX_DEPTH:
+            return memo[0], memo[1], False
+        entries = self._snippets.get(abbreviation)
+        if not entries or abbreviation in self.cyclic:
+            return "", 0, False
+        if len(path) >= MAX_DEPTH:
+            return "", 0, True
+        text, below, cut = self._inline(entries[0].expansion, path + (abbreviation,))
+        if not cut:
+            self._flat[abbreviation] = (text, below + 1)
+        return text, below + 1, cut
@@ -1,10 +1,30 @@
 import logging
+import os
+import socket
 import sys
+import threading
 import time
-from src.common.ipc import IPCServer, MSG_KEY_EVENT, MSG_REPLACE_TEXT, MSG_PING, MSG_PONG
-from src.common.constants import IPC_PORT
+from concurrent.futures import Future
+from typing import Callable, Optional
+from src.common.async_ipc import AsyncIPCServer
+from src.common.ipc import encode_msg, encode_replace_text
+from src.common.constants import (
+    MSG_EXPAND,
+    MSG_FOREGROUND,
+    MSG_GATING,
+    MSG_KEY_EVENT,
+    MSG_KEY_EVENTS,
+    MSG_PING,
+    MSG_RELEVANCE,
+    MSG_RELOAD_CONFIG,
+    SESSION_LOG_ENV,
+    SESSION_REDACT_ENV,
+    SHARED_INDEX_ENV,
+)
+from src.common.models import Settings
 from src.engine.store import Store
-from src.engine.core import ExpansionEngine
+from src.engine.core import TRIGGER_MAP, ExpansionEngine, PendingExpansion, batch_replacement, settle
+from src.engine.session import SessionRecorder
 
 # Configure Logging (more verbose: DEBUG)
 logging.basicConfig(
@@ -19,14 +39,65 @@ logger = logging.getLogger("Backend")
 
 
 class BackendService:
-    def __init__(self):
+    def __init__(
+        self,
+        session_log: Optional[str] = None,
+        redact: Optional[bool] = None,
+        hook_sock: Optional[socket.socket] = None,
+        shared_index: Optional[str] = None,
+    ):
         self.store = Store()
         self.engine = ExpansionEngine(self.store)
-        self.server = IPCServer(IPC_PORT, self.handle_message)
+        # Snippets with slow placeholders are answered once rendered, off the key path
+        self.engine.defer_slow = True
+        # Per connection: done when its last deferred reply has been sent.
+        # Only touched on the event loop: keys and EXPAND are handled there.
+        self._replies = {}
+        self.store.subscribe(self.engine.on_store_change)
+        self.store.subscribe(self.on_store_change)
+        # One event loop for the hook, the GUI and tools; keys are handled on
+        # the loop, control messages on the server's worker thread. An app
+        # switch must land between the same keys as it did in the hook, and
+        # an EXPAND's reply is chained after theirs.
+        self.server = AsyncIPCServer(
+            handler=self.handle_message, key_handler=self.handle_key, keys_handler=self.handle_keys,
+            inline_types=(MSG_FOREGROUND, MSG_EXPAND), on_disconnect=self.on_disconnect,
+        )
+        # The hook's end of a socketpair, when src/main.py spawned both of us
+        self.hook_sock = hook_sock
+
+        # Hooks that asked for the relevance table; they get every change of
+        # it and of the gating settings
+        self.hooks = set()
+        self._relevance = None
+        self._relevance_lock = threading.Lock()
+        self.engine.index.subscribe(self.publish_relevance)
+        self.engine.profiles.subscribe(self.publish_relevance)
+
+        self.recorder = None
+        session_log = session_log or os.environ.get(SESSION_LOG_ENV)
+        if session_log:
+            if redact is None:
+                redact = os.environ.get(SESSION_REDACT_ENV, "1") != "0"
+            alphabet = (lambda: self.engine.index.current.alphabet) if redact else None
+            self.recorder = SessionRecorder(session_log, alphabet)
+
+        # Optional: the hook matches against a copy of the index in shared
+        # memory and only asks us to render what it matched (MSG_EXPAND)
+        self.index_writer = None
+        shared_index = shared_index or os.environ.get(SHARED_INDEX_ENV)
+        if shared_index:
+            from src.engine.shared_index import SharedIndexWriter
+
+            self.index_writer = SharedIndexWriter(shared_index, TRIGGER_MAP)
+            self.index_writer.publish(self.engine.index.current)
+            self.engine.index.subscribe(self.index_writer.publish)
 
     def start(self):
         logger.info("Starting Backend Service...")
         self.server.start()
+        if self.hook_sock is not None:
+            self.server.serve(self.hook_sock)
 
         # Keep main thread alive
         try:
@@ -38,6 +109,12 @@ class BackendService:
     def stop(self):
         logger.info("Stopping Backend Service...")
         self.server.stop()
+        self.engine.profiles.stop()
+        if self.index_writer:
+            self.engine.index.stop()
+            self.index_writer.close()
+        if self.recorder:
+            self.recorder.close()
 
     def handle_message(self, msg: dict, sock):
         msg_type = msg.get("type")
@@ -48,33 +125,170 @@ class BackendService:
         if msg_type == MSG_PING:
             logger.debug("Received PING")
 
+        elif msg_type == MSG_RELOAD_CONFIG:
+            # Library edits from the GUI, already persisted by it
+            records = payload.get("records", [])
+            self.store.apply_records(records)
+            logger.info(f"Applied {len(records)} library changes from the GUI")
+
         elif msg_type == MSG_KEY_EVENT:
-            char = payload.get("char")
-            is_backspace = payload.get("is_backspace", False)
+            self.handle_key(
+                payload.get("char"), payload.get("is_backspace", False), payload.get("vk_code"),
+                payload.get("seq", 0), sock,
+            )
+
+        elif msg_type == MSG_EXPAND:
+            self.handle_expand(payload.get("id"), payload.get("backspaces", 0), payload.get("seq", 0), sock)
+
+        elif msg_type == MSG_FOREGROUND:
+            self.engine.set_app(payload.get("app"))
+
+        elif msg_type == MSG_RELEVANCE:
+            self.hooks.add(sock)
+            sock.sendall(encode_msg({"type": MSG_RELEVANCE, "payload": self._current_relevance()}))
+            sock.sendall(encode_msg({"type": MSG_GATING, "payload": self._gating()}))
+
+        elif msg_type == MSG_KEY_EVENTS:
+            events = [
+                (e.get("char"), e.get("is_backspace", False), e.get("vk_code"), e.get("seq", 0))
+                for e in payload.get("events", [])
+            ]
+            self.handle_keys(events, sock)
+
+    def _current_relevance(self) -> dict:
+        with self._relevance_lock:
+            if self._relevance is None:
+                self._relevance = self.engine.relevance()
+            return self._relevance
+
+    def publish_relevance(self, index):
+        """
+        Subscriber of the global and the profile indexes: pushes the table to
+        the hooks when it changed. It covers every profile compiled so far,
+        so app switches do not need a new table.
+        """
+        with self._relevance_lock:
+            previous = self._relevance
+            table = self._relevance = self.engine.relevance()
+        if previous is not None and all(previous[k] == table[k] for k in ("alphabet", "suffixes", "reset_keys")):
+            return
+        self._push(encode_msg({"type": MSG_RELEVANCE, "payload": table}))
+
+    def _gating(self) -> dict:
+        settings = getattr(self.store, "settings", None) or Settings()
+        return {
+            "engine_enabled": settings.engine_enabled,
+            "ignored_apps": list(settings.ignored_apps),
+            # A hook matching on the shared index sends keys for these apps instead
+            "profile_apps": self.engine.profiles.apps(),
+        }
+
+    def on_store_change(self, op: str, data):
+        """
+        Store listener: the hooks apply the pause switch and ignored apps
+        themselves, and learn which apps have profiles.
+        """
+        if op in ("settings", "reload", "profiles"):
+            self._push(encode_msg({"type": MSG_GATING, "payload": self._gating()}))
+
+    def on_disconnect(self, sock):
+        """A client went away, on the event loop."""
+        self.hooks.discard(sock)
+        self._replies.pop(sock, None)
+
+    def _push(self, frame: bytes):
+        for sock in list(self.hooks):
+            try:
+                sock.sendall(frame)
+            except OSError:
+                self.hooks.discard(sock)
+
+    def handle_key(
+        self, char: Optional[str], is_backspace: bool, vk_code: Optional[int], seq: int, sock
+    ):
+        """
+        KEY_EVENT fast path: called with the decoded fields, no message dict.
+        A reply carries the key's seq so the hook can account for keys typed since.
+        """
+        if self.recorder:
+            self.recorder.record_key(char, is_backspace, vk_code)
+
+        logger.info(f"Backend received key event: char={repr(char)}, backspace={is_backspace}")
+
+        # Only process keys that matter
+        if char or is_backspace:
+            result = self.engine.process_key(char if char else "", is_backspace)
+
+            logger.info(f"Engine.process_key result: {result}")
+
+            if result:
+                self._reply(sock, seq, [(0, result)], lambda expansions: expansions[0][1])
+
+    def handle_expand(self, snippet_id: str, backspaces: int, seq: int, sock):
+        """The hook matched snippet_id itself; we only resolve placeholders."""
+        result = self.engine.expansion(snippet_id, backspaces)
+        if result is None:
+            logger.info(f"Hook matched snippet id={snippet_id}, which is gone by now")
+            return
+        self._reply(sock, seq, [(0, result)], lambda expansions: expansions[0][1])
+
+    def handle_keys(self, events: list, sock):
+        """
+        KEY_EVENTS: a run of (char, is_backspace, vk_code, seq) the hook had queued up.
+        The reply accounts for the whole batch, so it carries the last key's seq.
+        """
+        if self.recorder:
+            for char, is_backspace, vk_code, _ in events:
+                self.recorder.record_key(char, is_backspace, vk_code)
+
+        logger.info(f"Backend received {len(events)} key events")
+
+        expansions = self.engine.process_keys(events)
+        if expansions:
+            self._reply(sock, events[-1][3], expansions, lambda settled: batch_replacement(events, settled))
 
-            logger.info(f"Backend received key event: char={repr(char)}, backspace={is_backspace}")
+    def _reply(self, sock, seq: int, expansions: list, combine: Callable[[list], Optional[tuple]]):
+        """
+        Sends combine(expansions), a (backspaces, text, cursor_offset) or None,
+        as the reply for seq. If an expansion is still rendering (PendingExpansion)
+        it is sent from the resolver's thread once done; either way replies to
+        one hook leave in key order, since the hook corrects each against the
+        keys typed after it.
+        """
+        previous = self._replies.get(sock)
+        deferred = any(isinstance(e, PendingExpansion) for _, e in expansions)
+        if not deferred and (previous is None or previous.done()):
+            self._send_replacement(sock, combine(expansions), seq)
+            return
 
-            # Only process keys that matter
-            if char or is_backspace:
-                result = self.engine.process_key(char if char else "", is_backspace)
+        sent: Future = Future()
+        self._replies[sock] = sent
 
-                logger.info(f"Engine.process_key result: {result}")
+        def send(settled: Future):
+            try:
+                self._send_replacement(sock, combine(settled.result()), seq)
+            except Exception as e:
+                logger.error(f"Deferred reply for seq={seq} failed: {e}")
+            finally:
+                sent.set_result(None)
 
-                if result:
-                    backspaces, text, cursor_offset = result
-                    response = {
-                        "type": MSG_REPLACE_TEXT,
-                        "payload": {
-                            "backspaces": backspaces,
-                            "text": text,
-                            "cursor_offset": cursor_offset,
-                        },
-                    }
+        def start(_=None):
+            settle(expansions).add_done_callback(send)
 
-                    from src.common.ipc import send_msg
+        if previous is None:
+            start()
+        else:
+            previous.add_done_callback(start)
 
-                    logger.info(f"Sending MSG_REPLACE_TEXT to hook: {response}")
-                    send_msg(sock, response)
+    def _send_replacement(self, sock, result: Optional[tuple], seq: int):
+        if not result:
+            return
+        backspaces, text, cursor_offset = result
+        logger.info(
+            f"Sending MSG_REPLACE_TEXT to hook: backspaces={backspaces}, "
+            f"text length={len(text)}, cursor_offset={cursor_offset}, seq={seq}"
+        )
+        sock.sendall(encode_replace_text(backspaces, text, cursor_offset, seq))
 
 
 if __name__ == "__main__":
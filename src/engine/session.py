@@ -0,0 +1,234 @@
+"""
+Keystroke session recording and offline replay.
+
+A session log is what the backend saw on the wire: one compact binary record
+per KEY_EVENT. The replayer pushes a log back through an ExpansionEngine, so
+latency spikes and false expansions from the field can be reproduced without
+the Windows hook.
+
+    python -m src.engine.session replay session.bin --store store.json [--speed 1]
+    python -m src.engine.session diff session.bin --store old.json --candidate-store new.json
+"""
+import argparse
+import importlib
+import json
+import logging
+import struct
+import sys
+import threading
+import time
+from typing import Callable, FrozenSet, Iterator, List, NamedTuple, Optional, Tuple
+from src.common.constants import KEY_RESET
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TXSESS\x00\x01"
+
+# delta since previous event (us), flags, vk code, char length; then the char as UTF-8
+RECORD = struct.Struct(">IBBB")
+
+FLAG_BACKSPACE = 0x01
+FLAG_REDACTED = 0x02
+
+# Stands in for redacted chars: it never occurs in an abbreviation, so the
+# engine sees a buffer of the same length that can never match through it
+REDACTED_CHAR = "\x00"
+
+MAX_DELTA_US = 0xFFFFFFFF
+
+
+class SessionEvent(NamedTuple):
+    delta_us: int
+    char: Optional[str]
+    is_backspace: bool
+    vk_code: int
+    redacted: bool
+
+
+class SessionRecorder:
+    """
+    Appends KEY_EVENT payloads to a session log.
+
+    With an alphabet, every char outside it (and outside the trigger keys) is
+    stored as REDACTED_CHAR. alphabet can be a callable so the recorder follows
+    library reloads.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        alphabet: Optional[Callable[[], FrozenSet[str]]] = None,
+        keep_chars: FrozenSet[str] = frozenset((" ", "\r", "\n", KEY_RESET)),
+    ):
+        self.path = path
+        self.alphabet = alphabet
+        self.keep_chars = keep_chars
+        self.count = 0
+        self._lock = threading.Lock()
+        self._last_ns: Optional[int] = None
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        logger.info(f"Recording key events to {path} (redact={alphabet is not None})")
+
+    def record(self, payload: dict) -> None:
+        self.record_key(payload.get("char"), payload.get("is_backspace", False), payload.get("vk_code"))
+
+    def record_key(self, char: Optional[str], is_backspace: bool, vk_code: Optional[int]) -> None:
+        char = char or ""
+        flags = FLAG_BACKSPACE if is_backspace else 0
+        if char and self.alphabet is not None and char not in self.keep_chars:
+            if char not in self.alphabet():
+                char = REDACTED_CHAR
+                flags |= FLAG_REDACTED
+        data = char.encode("utf-8")[:255]
+        # The vk code of a letter or digit is the character itself
+        vk = 0 if flags & FLAG_REDACTED else vk_code or 0
+
+        with self._lock:
+            now = time.perf_counter_ns()
+            delta = 0 if self._last_ns is None else (now - self._last_ns) // 1000
+            self._last_ns = now
+            self._file.write(RECORD.pack(min(delta, MAX_DELTA_US), flags, vk & 0xFF, len(data)))
+            if data:
+                self._file.write(data)
+            self.count += 1
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+        logger.info(f"Session log closed: {self.count} events in {self.path}")
+
+
+def read_session(path: str) -> Iterator[SessionEvent]:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session log")
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return
+            delta, flags, vk, length = RECORD.unpack(head)
+            char = f.read(length).decode("utf-8") if length else None
+            yield SessionEvent(
+                delta, char, bool(flags & FLAG_BACKSPACE), vk, bool(flags & FLAG_REDACTED)
+            )
+
+
+class ReplayResult(NamedTuple):
+    # (event index, engine result) for every event that expanded
+    decisions: List[Tuple[int, Tuple[int, str, int]]]
+    latencies_ns: List[int]
+    elapsed_s: float
+
+    def profile(self) -> dict:
+        ordered = sorted(self.latencies_ns)
+
+        def pct(p):
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))] / 1000.0
+
+        return {
+            "events": len(ordered),
+            "expansions": len(self.decisions),
+            "p50_us": pct(50),
+            "p99_us": pct(99),
+            "max_us": ordered[-1] / 1000.0 if ordered else 0.0,
+            "elapsed_s": self.elapsed_s,
+        }
+
+
+def replay(engine, events, speed: Optional[float] = None) -> ReplayResult:
+    """
+    Feeds events into engine.process_key.
+    speed=None replays as fast as possible; 1.0 keeps the recorded pacing,
+    10.0 plays it ten times faster.
+    """
+    decisions = []
+    latencies = []
+    clock = time.perf_counter_ns
+    started = clock()
+    due = started
+    for i, event in enumerate(events):
+        if speed:
+            due += int(event.delta_us * 1000 / speed)
+            wait = due - clock()
+            if wait > 0:
+                time.sleep(wait / 1e9)
+        t0 = clock()
+        result = engine.process_key(event.char or "", event.is_backspace)
+        latencies.append(clock() - t0)
+        if result is not None:
+            decisions.append((i, result))
+    return ReplayResult(decisions, latencies, (clock() - started) / 1e9)
+
+
+def diff_decisions(baseline: ReplayResult, candidate: ReplayResult) -> List[dict]:
+    """Events where the two runs expanded differently (or only one expanded)."""
+    a = dict(baseline.decisions)
+    b = dict(candidate.decisions)
+    diffs = []
+    for i in sorted(set(a) | set(b)):
+        if a.get(i) != b.get(i):
+            diffs.append({"event": i, "baseline": a.get(i), "candidate": b.get(i)})
+    return diffs
+
+
+def _load_engine(spec: str, store_file: str):
+    """spec is "module:Class", constructed with a Store over store_file."""
+    from src.engine.store import Store
+
+    module_name, _, class_name = spec.partition(":")
+    engine_cls = getattr(importlib.import_module(module_name), class_name)
+    return engine_cls(Store(store_file))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded key sessions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rep = sub.add_parser("replay", help="replay a session and print a timing profile")
+    rep.add_argument("session")
+    rep.add_argument("--store", required=True)
+    rep.add_argument("--engine", default="src.engine.core:ExpansionEngine")
+    rep.add_argument("--speed", type=float, default=None,
+                     help="1.0 = original pacing; omit for as fast as possible")
+
+    dif = sub.add_parser("diff", help="compare expansion decisions of two engines")
+    dif.add_argument("session")
+    dif.add_argument("--store", required=True)
+    dif.add_argument("--engine", default="src.engine.core:ExpansionEngine")
+    dif.add_argument("--candidate-store")
+    dif.add_argument("--candidate-engine")
+
+    args = parser.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+    events = list(read_session(args.session))
+
+    if args.command == "replay":
+        result = replay(_load_engine(args.engine, args.store), events, args.speed)
+        report = {"profile": result.profile(), "decisions": result.decisions}
+    else:
+        baseline = replay(_load_engine(args.engine, args.store), events)
+        candidate = replay(
+            _load_engine(args.candidate_engine or args.engine, args.candidate_store or args.store),
+            events,
+        )
+        report = {
+            "baseline": baseline.profile(),
+            "candidate": candidate.profile(),
+            "diff": diff_decisions(baseline, candidate),
+        }
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Publishes the compiled matcher to shared memory for the hook (see
+src/common/flat_index.py for the layout and the reader).
+
+SharedIndexWriter is an IndexPublisher subscriber: every published
+SnippetIndex version is flattened and written as a new generation. That
+happens on the publisher's worker thread, off the keystroke path.
+"""
+import logging
+import time
+from array import array
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+from src.common.flat_index import (
+    COLUMNS,
+    CONTROL_GENERATION,
+    CONTROL_WORDS,
+    FORMAT,
+    HEADER_WORDS,
+    MAGIC,
+    NO_ENTRY,
+    WORD_BYTES,
+    segment_name,
+)
+from src.common.models import TriggerType
+from src.engine.matcher import SnippetMatcher
+
+logger = logging.getLogger(__name__)
+
+
+def compile_flat(matcher: SnippetMatcher, generation: int, trigger_chars: Dict[str, TriggerType]) -> array:
+    """
+    Flattens matcher into the word array of src/common/flat_index.py.
+    trigger_chars maps each trigger key to its TriggerType, as the engine does.
+    """
+    columns: Dict[str, List[int]] = {name: [] for name in COLUMNS}
+    node_edges, node_labels = columns["node_edges"], columns["node_labels"]
+    node_entry = columns["node_entry"]
+    edge_chars, edge_targets = columns["edge_chars"], columns["edge_targets"]
+    label_chars = columns["label_chars"]
+    entry_ids = columns["entry_ids"]
+    id_bytes = bytearray()
+    table = matcher.table
+
+    roots = {}
+    order = []  # Nodes in breadth-first order; a node's index is its position
+    for trigger in (TriggerType.NONE, *sorted(set(trigger_chars.values()), key=lambda t: t.value)):
+        roots[trigger] = len(order)
+        order.append(matcher.roots[trigger])
+    position = 0
+    while position < len(order):
+        node = order[position]
+        position += 1
+        node_edges.append(len(edge_chars))
+        node_labels.append(len(label_chars))
+        label_chars.extend(map(ord, node.label))
+        if node.row >= 0:
+            node_entry.append(len(columns["entry_lengths"]))
+            columns["entry_lengths"].append(len(table.abbreviations[node.row]))
+            entry_ids.append(len(id_bytes))
+            id_bytes += table.ids[node.row].encode("utf-8")
+        else:
+            node_entry.append(NO_ENTRY)
+        if node.children:
+            for ch in sorted(node.children, key=ord):
+                edge_chars.append(ord(ch))
+                edge_targets.append(len(order))
+                order.append(node.children[ch])
+    node_edges.append(len(edge_chars))
+    node_labels.append(len(label_chars))
+    entry_ids.append(len(id_bytes))
+    id_bytes += bytes(-len(id_bytes) % WORD_BYTES)
+    columns["id_bytes"] = array("I", bytes(id_bytes))
+
+    for ch, trigger in sorted(trigger_chars.items()):
+        columns["root_chars"].append(ord(ch))
+        columns["root_nodes"].append(roots[trigger])
+    columns["root_chars"].append(0)
+    columns["root_nodes"].append(roots[TriggerType.NONE])
+
+    words = array("I", [MAGIC, FORMAT, generation, matcher.max_abbr_len])
+    offset = HEADER_WORDS
+    for name in COLUMNS:
+        words.extend((offset, len(columns[name])))
+        offset += len(columns[name])
+    for name in COLUMNS:
+        words.extend(columns[name])
+    return words
+
+
+class SharedIndexWriter:
+    """
+    Owns the control segment `name` and one data segment per generation.
+    Only the newest generation is kept: once its number is stored, the
+    previous segment is unlinked (a hook still reading it keeps its mapping).
+    """
+
+    def __init__(self, name: str, trigger_chars: Dict[str, TriggerType]):
+        self.name = name
+        self.trigger_chars = trigger_chars
+        self._control = self._create(name, CONTROL_WORDS * WORD_BYTES)
+        self._control_words = self._control.buf[: CONTROL_WORDS * WORD_BYTES].cast("I")
+        self._control_words[0] = MAGIC
+        self._control_words[1] = FORMAT
+        self._segment: Optional[shared_memory.SharedMemory] = None
+
+    @staticmethod
+    def _create(name: str, size: int) -> shared_memory.SharedMemory:
+        try:
+            return shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a backend that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            return shared_memory.SharedMemory(name=name, create=True, size=size)
+
+    @property
+    def generation(self) -> int:
+        return self._control_words[CONTROL_GENERATION]
+
+    def publish(self, index) -> None:
+        """IndexPublisher subscriber: writes index (a SnippetIndex) as generation index.version."""
+        started = time.perf_counter()
+        words = compile_flat(index.matcher, index.version, self.trigger_chars)
+        data = words.tobytes()
+        segment = self._create(segment_name(self.name, index.version), len(data))
+        segment.buf[: len(data)] = data
+        # The single word store that makes the new generation visible
+        self._control_words[CONTROL_GENERATION] = index.version
+        previous, self._segment = self._segment, segment
+        if previous is not None:
+            previous.close()
+            previous.unlink()
+        logger.info(
+            f"Shared index generation {index.version}: {len(data) // 1024} KiB in "
+            f"{(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+
+    def close(self) -> None:
+        self._control_words[CONTROL_GENERATION] = 0
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+        self._control_words.release()
+        self._control.close()
+        self._control.unlink()
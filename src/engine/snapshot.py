@@ -0,0 +1,380 @@
+"""
+Binary snapshot cache for store.json.
+
+The cache (store.json.snap) holds the library column by column, serialized
+with marshal: ids and abbreviations as string lists, trigger and active flags
+as one byte per snippet. Loading it is a handful of bulk copies, with no json
+parsing and no pydantic validation.
+
+Expansions live apart from it, in one body file (store.json.bodies.<token>)
+addressed by an offset table. Large bodies are zlib-compressed one by one.
+The body file is memory-mapped read-only, so a body is only paged in and
+decoded when a snippet is actually used, and every process mapping the same
+file shares its pages through the OS page cache. Each cache write creates a
+body file under a fresh token rather than replacing the mapped one.
+
+The cache is only trusted while it describes the current store.json: same
+mtime and size, or, when only the mtime moved, the same content hash.
+"""
+import glob
+import hashlib
+import logging
+import marshal
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from collections.abc import MutableSequence
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+from src.common.models import Snippet, TriggerType
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TXSNAP03"
+# marshal version, store.json mtime_ns, store.json size, blake2b-128 of store.json,
+# token naming the body file
+HEADER = struct.Struct(">IQQ16s8s")
+
+# Bodies at least this long are stored compressed when that saves space
+COMPRESS_MIN_BYTES = 256
+
+TRIGGER_CODES = {t: i for i, t in enumerate(TriggerType)}
+TRIGGERS_BY_CODE = list(TriggerType)
+TRIGGERS = {t.value: t for t in TriggerType}
+
+
+def cache_path(store_file: str) -> str:
+    return store_file + ".snap"
+
+
+def bodies_path(store_file: str, token: bytes) -> str:
+    return f"{store_file}.bodies.{token.hex()}"
+
+
+def digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def encode_body(text: str):
+    """Returns (payload, compressed) for one expansion."""
+    raw = text.encode("utf-8")
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw)
+        if len(packed) < len(raw) * 0.9:
+            return packed, 1
+    return raw, 0
+
+
+def map_file(path: str):
+    """Maps path read-only. Empty files cannot be mapped and read as b""."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        # The mapping stays valid after the file object is closed
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class SnapshotColumns:
+    """The library as parallel columns; row i is the i-th snippet of the snapshot."""
+
+    __slots__ = ("ids", "abbreviations", "labels", "triggers", "active", "compressed",
+                 "offsets", "bodies", "_dates_blob", "_dates")
+
+    def __init__(
+        self, ids, abbreviations, labels, triggers, active, compressed, offsets, bodies, dates_blob
+    ):
+        self.ids: List[str] = ids
+        self.abbreviations: List[str] = abbreviations
+        self.labels: List[Optional[str]] = labels
+        self.triggers: bytes = triggers
+        self.active: bytes = active
+        self.compressed: bytes = compressed
+        self.offsets = offsets  # array("Q"), len(ids) + 1 entries into bodies
+        self.bodies = bodies  # bytes, or the mmap of the body file
+        self._dates_blob: bytes = dates_blob
+        self._dates: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_dicts(cls, data: List[dict]) -> "SnapshotColumns":
+        bodies = []
+        compressed = bytearray()
+        offsets = array("Q", [0])
+        total = 0
+        for d in data:
+            body, packed = encode_body(d["expansion"])
+            bodies.append(body)
+            compressed.append(packed)
+            total += len(body)
+            offsets.append(total)
+        dates = [d["created_at"] for d in data] + [d["updated_at"] for d in data]
+        return cls(
+            [d["id"] for d in data],
+            [d["abbreviation"] for d in data],
+            [d.get("label") for d in data],
+            bytes(TRIGGER_CODES[TRIGGERS[d["trigger"]]] for d in data),
+            bytes(1 if d["is_active"] else 0 for d in data),
+            bytes(compressed),
+            offsets,
+            b"".join(bodies),
+            "\n".join(dates).encode("utf-8"),
+        )
+
+    def dump(self) -> bytes:
+        """Everything but the bodies, which go to their own file."""
+        return marshal.dumps((
+            self.ids, self.abbreviations, self.labels, self.triggers, self.active,
+            self.compressed, self.offsets.tobytes(), self._dates_blob,
+        ))
+
+    @classmethod
+    def load(cls, payload: bytes, bodies) -> "SnapshotColumns":
+        ids, abbreviations, labels, triggers, active, compressed, offsets, dates = marshal.loads(payload)
+        table = array("Q")
+        table.frombytes(offsets)
+        if table[-1] != len(bodies):
+            raise ValueError(f"body file holds {len(bodies)} bytes, expected {table[-1]}")
+        return cls(ids, abbreviations, labels, triggers, active, compressed, table, bodies, dates)
+
+    def trigger(self, row: int) -> TriggerType:
+        return TRIGGERS_BY_CODE[self.triggers[row]]
+
+    def expansion(self, row: int) -> str:
+        body = self.bodies[self.offsets[row]:self.offsets[row + 1]]
+        if self.compressed[row]:
+            body = zlib.decompress(body)
+        return body.decode("utf-8")
+
+    def mentions(self, row: int, needle: bytes) -> bool:
+        """Whether the expansion contains needle (UTF-8), searched without decoding it."""
+        start, end = self.offsets[row], self.offsets[row + 1]
+        if self.compressed[row]:
+            return needle in zlib.decompress(self.bodies[start:end])
+        return self.bodies.find(needle, start, end) != -1
+
+    def preview(self, row: int, chars: int = 80) -> str:
+        """The start of the expansion, reading only as much of the body as it needs."""
+        start, end = self.offsets[row], self.offsets[row + 1]
+        limit = chars * 4  # UTF-8 is at most 4 bytes per char
+        if self.compressed[row]:
+            body = zlib.decompressobj().decompress(self.bodies[start:end], limit)
+        else:
+            body = self.bodies[start:min(end, start + limit)]
+        return body.decode("utf-8", errors="ignore")[:chars]
+
+    def dates(self, row: int):
+        if self._dates is None:
+            self._dates = self._dates_blob.decode("utf-8").split("\n")
+        return self._dates[row], self._dates[len(self.ids) + row]
+
+    def materialize(self, row: int) -> Snippet:
+        """Builds the model without validation: the row came from a validated save."""
+        created_at, updated_at = self.dates(row)
+        return Snippet.model_construct(
+            id=self.ids[row],
+            abbreviation=self.abbreviations[row],
+            expansion=self.expansion(row),
+            label=self.labels[row],
+            trigger=self.trigger(row),
+            is_active=bool(self.active[row]),
+            created_at=datetime.fromisoformat(created_at),
+            updated_at=datetime.fromisoformat(updated_at),
+        )
+
+    def to_dict(self, row: int) -> dict:
+        created_at, updated_at = self.dates(row)
+        return {
+            "id": self.ids[row],
+            "abbreviation": self.abbreviations[row],
+            "expansion": self.expansion(row),
+            "label": self.labels[row],
+            "trigger": self.trigger(row).value,
+            "is_active": bool(self.active[row]),
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+
+class SnippetRecord:
+    """
+    Read-only view of one snapshot row with the fields the engine compiles.
+    The expansion is decoded on first access.
+    """
+
+    __slots__ = ("id", "abbreviation", "trigger", "is_active", "columns", "row")
+
+    def __init__(self, columns: SnapshotColumns, row: int):
+        self.id = columns.ids[row]
+        self.abbreviation = columns.abbreviations[row]
+        self.trigger = columns.trigger(row)
+        self.is_active = bool(columns.active[row])
+        self.columns = columns
+        self.row = row
+
+    @property
+    def expansion(self) -> str:
+        return self.columns.expansion(self.row)
+
+    @property
+    def label(self) -> Optional[str]:
+        return self.columns.labels[self.row]
+
+    def preview(self, chars: int = 80) -> str:
+        return self.columns.preview(self.row, chars)
+
+    def mentions(self, needle: bytes) -> bool:
+        return self.columns.mentions(self.row, needle)
+
+
+def preview(snippet, chars: int = 80) -> str:
+    """Short expansion preview for a Snippet or a SnippetRecord."""
+    if isinstance(snippet, SnippetRecord):
+        return snippet.preview(chars)
+    return snippet.expansion[:chars]
+
+
+def mentions(snippet, needle: str) -> bool:
+    """Whether the expansion of a Snippet or a record contains needle, read as little as possible."""
+    if isinstance(snippet, SnippetRecord):
+        return snippet.mentions(needle.encode("utf-8"))
+    if getattr(snippet, "lazy_body", False):
+        return snippet.mentions(needle)
+    return needle in snippet.expansion
+
+
+def write_cache(store_file: str, data: List[dict], store_bytes: bytes) -> None:
+    """
+    data are the snippet dicts and store_bytes the exact content just written
+    to (or read from) store_file.
+    """
+    try:
+        st = os.stat(store_file)
+        columns = SnapshotColumns.from_dicts(data)
+        token = os.urandom(8)
+        with open(bodies_path(store_file, token), "wb") as f:
+            f.write(columns.bodies)
+        header = HEADER.pack(marshal.version, st.st_mtime_ns, st.st_size, digest(store_bytes), token)
+        tmp = cache_path(store_file) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + header + columns.dump())
+        os.replace(tmp, cache_path(store_file))
+        _remove_stale_bodies(store_file, token)
+    except Exception as e:
+        logger.warning(f"Could not write snapshot cache: {e}")
+
+
+def _remove_stale_bodies(store_file: str, keep: bytes) -> None:
+    # Another process may still map an older file; where the OS refuses to
+    # delete it (Windows), it is retried on the next write
+    for path in glob.glob(glob.escape(store_file) + ".bodies.*"):
+        if path != bodies_path(store_file, keep):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def read_cache(store_file: str) -> Optional[SnapshotColumns]:
+    path = cache_path(store_file)
+    try:
+        st = os.stat(store_file)
+        with open(path, "rb") as f:
+            blob = f.read()
+        head_len = len(MAGIC) + HEADER.size
+        if len(blob) < head_len or blob[:len(MAGIC)] != MAGIC:
+            return None
+        version, mtime_ns, size, hashed, token = HEADER.unpack_from(blob, len(MAGIC))
+        if version != marshal.version or size != st.st_size:
+            return None
+        refresh = False
+        if mtime_ns != st.st_mtime_ns:
+            # Touched but maybe not changed: fall back to the content hash
+            with open(store_file, "rb") as src:
+                if digest(src.read()) != hashed:
+                    return None
+            refresh = True
+        columns = SnapshotColumns.load(
+            memoryview(blob)[head_len:], map_file(bodies_path(store_file, token))
+        )
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable snapshot cache {path}: {e}")
+        return None
+
+    if refresh:
+        # Re-stamp so the next start takes the cheap path again
+        with open(path, "r+b") as f:
+            f.seek(len(MAGIC))
+            f.write(HEADER.pack(version, st.st_mtime_ns, size, hashed, token))
+    return columns
+
+
+class LazySnippetList(MutableSequence):
+    """
+    The store's snippet list, restored from snapshot columns.
+    A Snippet model is only built when an entry is first accessed; until then
+    the engine compiles from SnippetRecord views of the rows. Entries added or
+    replaced later are plain Snippets (row -1).
+    """
+
+    def __init__(self, columns: SnapshotColumns):
+        self.columns = columns
+        self._rows = array("l", range(len(columns)))
+        self._items: List[Optional[Snippet]] = [None] * len(columns)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        item = self._items[index]
+        if item is None:
+            item = self._items[index] = self.columns.materialize(self._rows[index])
+        return item
+
+    def __setitem__(self, index, snippet: Snippet) -> None:
+        if isinstance(index, slice):
+            raise TypeError("LazySnippetList does not support slice assignment")
+        self._items[index] = snippet
+        self._rows[index] = -1
+
+    def __delitem__(self, index) -> None:
+        del self._items[index]
+        del self._rows[index]
+
+    def insert(self, index: int, snippet: Snippet) -> None:
+        self._items.insert(index, snippet)
+        self._rows.insert(index, -1)
+
+    def copy(self) -> "LazySnippetList":
+        """Shallow copy that keeps unmaterialized entries unmaterialized."""
+        clone = LazySnippetList.__new__(LazySnippetList)
+        clone.columns = self.columns
+        clone._rows = array("l", self._rows)
+        clone._items = list(self._items)
+        return clone
+
+    @property
+    def materialized(self) -> int:
+        return sum(1 for item in self._items if item is not None)
+
+    def ids(self) -> Iterator[str]:
+        ids = self.columns.ids
+        for item, row in zip(self._items, self._rows):
+            yield item.id if item is not None else ids[row]
+
+    def match_records(self) -> Iterator:
+        columns = self.columns
+        for item, row in zip(self._items, self._rows):
+            yield item if item is not None else SnippetRecord(columns, row)
+
+    def to_dicts(self) -> Iterable[dict]:
+        columns = self.columns
+        for item, row in zip(self._items, self._rows):
+            yield item.to_dict() if item is not None else columns.to_dict(row)
@@ -0,0 +1,291 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Optional
+from src.common.models import Settings, Snippet, TriggerType
+from src.common.constants import DATA_DIR
+from src.engine.store import Store
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("id", "abbreviation", "expansion", "label", "trigger", "is_active", "created_at", "updated_at")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snippets (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    abbreviation TEXT NOT NULL,
+    expansion TEXT NOT NULL,
+    label TEXT,
+    trigger TEXT NOT NULL,
+    is_active INTEGER NOT NULL,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_snippets_abbreviation ON snippets(abbreviation, is_active);
+CREATE INDEX IF NOT EXISTS idx_snippets_trigger ON snippets(trigger, is_active);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS snippets_fts USING fts5(
+    label, expansion, content='snippets', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS snippets_ai AFTER INSERT ON snippets BEGIN
+    INSERT INTO snippets_fts(rowid, label, expansion) VALUES (new.rowid, new.label, new.expansion);
+END;
+CREATE TRIGGER IF NOT EXISTS snippets_ad AFTER DELETE ON snippets BEGIN
+    INSERT INTO snippets_fts(snippets_fts, rowid, label, expansion)
+    VALUES ('delete', old.rowid, old.label, old.expansion);
+END;
+CREATE TRIGGER IF NOT EXISTS snippets_au AFTER UPDATE ON snippets BEGIN
+    INSERT INTO snippets_fts(snippets_fts, rowid, label, expansion)
+    VALUES ('delete', old.rowid, old.label, old.expansion);
+    INSERT INTO snippets_fts(rowid, label, expansion) VALUES (new.rowid, new.label, new.expansion);
+END;
+"""
+
+SELECT = "SELECT " + ", ".join(COLUMNS) + " FROM snippets"
+# What the engine compiles from; expansions are read per row when needed
+SELECT_RECORDS = "SELECT rowid, id, abbreviation, trigger, is_active FROM snippets ORDER BY rowid"
+TRIGGERS = {t.value: t for t in TriggerType}
+
+
+def _like_pattern(text: str) -> str:
+    """text as a literal inside a LIKE pattern (with ESCAPE '\\')."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class SQLiteRecord:
+    """
+    A row with the fields the engine compiles, like snapshot.SnippetRecord.
+    The expansion is selected by rowid on each access; the compiled template
+    is what gets kept.
+    """
+
+    __slots__ = ("id", "abbreviation", "trigger", "is_active", "store", "rowid")
+    lazy_body = True
+
+    def __init__(self, store: "SQLiteStore", rowid: int, snippet_id: str, abbreviation: str,
+                 trigger: str, is_active: int):
+        self.id = snippet_id
+        self.abbreviation = abbreviation
+        self.trigger = TRIGGERS[trigger]
+        self.is_active = bool(is_active)
+        self.store = store
+        self.rowid = rowid
+
+    @property
+    def expansion(self) -> str:
+        row = self.store._fetch_one("SELECT expansion FROM snippets WHERE rowid = ?", (self.rowid,))
+        return row[0] if row else ""
+
+    def mentions(self, needle: str) -> bool:
+        row = self.store._fetch_one(
+            "SELECT instr(expansion, ?) FROM snippets WHERE rowid = ?", (needle, self.rowid)
+        )
+        return bool(row and row[0])
+
+
+class SQLiteStore(Store):
+    """
+    Store backed by the stdlib sqlite3 module instead of store.json.
+
+    Lookups by abbreviation, trigger and active flag hit indexes instead of a
+    list scan, and search() uses an FTS5 table over label and expansion when
+    the SQLite build has it. The database runs in WAL mode, so the backend,
+    the GUI and tooling can read concurrently while one of them writes.
+
+    `snippets` is materialized on first access and cached until the next write.
+    The engine compiles from match_records() instead, which reads neither
+    expansions nor models.
+    Profiles and settings stay in JSON files next to the database, as with Store.
+    """
+
+    def __init__(self, db_file: Optional[str] = None):
+        self.db_file = db_file or os.path.join(DATA_DIR, "store.db")
+        self.store_file = self.db_file
+        self._listeners = []
+        self._lock = threading.RLock()
+        self._journal = None
+        self._cache: Optional[List[Snippet]] = None
+        self._pos_cache = None
+        self._pos_list = None
+        self._pos_len = 0
+        self.profiles = []
+        self.settings = Settings()
+        self._ensure_data_dir()
+
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 unavailable, search falls back to LIKE: {e}")
+            self.has_fts = False
+        self.conn.commit()
+        self.load()
+
+    @property
+    def snippets(self) -> List[Snippet]:
+        with self._lock:
+            if self._cache is None:
+                self._cache = self._query(SELECT + " ORDER BY rowid")
+            return self._cache
+
+    @snippets.setter
+    def snippets(self, snippets: Iterable[Snippet]) -> None:
+        """Replaces the whole library in one transaction."""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM snippets")
+            self._insert_many(snippets)
+            self._cache = None
+
+    def match_records(self) -> List[SQLiteRecord]:
+        """
+        Light records for the engine: no expansion is read and no model
+        validated, so startup cost does not grow with the size of the bodies.
+        """
+        with self._lock:
+            rows = self.conn.execute(SELECT_RECORDS).fetchall()
+        return [SQLiteRecord(self, *row) for row in rows]
+
+    def _fetch_one(self, sql: str, params: tuple):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def _query(self, sql: str, params: tuple = ()) -> List[Snippet]:
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [self._row_to_snippet(row) for row in rows]
+
+    @staticmethod
+    def _row_to_snippet(row) -> Snippet:
+        data = dict(zip(COLUMNS, row))
+        data["is_active"] = bool(data["is_active"])
+        return Snippet.from_dict(data)
+
+    @staticmethod
+    def _snippet_to_row(snippet: Snippet) -> tuple:
+        data = snippet.to_dict()
+        data["is_active"] = int(data["is_active"])
+        return tuple(data[c] for c in COLUMNS)
+
+    def _insert_many(self, snippets: Iterable[Snippet]) -> None:
+        self.conn.executemany(
+            f"INSERT INTO snippets ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            (self._snippet_to_row(s) for s in snippets),
+        )
+
+    def load(self) -> None:
+        """Drops the cached list; the database itself is always current."""
+        with self._lock:
+            self._cache = None
+            self._load_profiles()
+            self._load_settings()
+        self._notify("reload")
+
+    def save(self) -> None:
+        # Every mutation is committed as it happens
+        pass
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    def apply_records(self, records: List[dict]) -> None:
+        """The database is shared: only the cache is dropped, then listeners are told."""
+        if any(record.get("op") == "reload" for record in records):
+            self.load()
+            return
+        with self._lock:
+            self._cache = None
+        for record in records:
+            if record.get("op") == "upsert":
+                self._notify("upsert", Snippet.from_dict(record["snippet"]))
+            elif record.get("op") == "delete":
+                self._notify("delete", record["id"])
+            elif record.get("op") == "profiles":
+                self.reload_profiles()
+            elif record.get("op") == "settings":
+                self.reload_settings()
+
+    def import_json(self, store_file: str) -> int:
+        """One-off migration from a JSON store (snapshot plus journal)."""
+        snippets = Store(store_file).snippets
+        self.snippets = snippets
+        self.load()
+        logger.info(f"Imported {len(snippets)} snippets from {store_file}")
+        return len(snippets)
+
+    def add_snippet(self, snippet: Snippet) -> None:
+        if not snippet.id:
+            import uuid
+            snippet.id = uuid.uuid4().hex
+        with self._lock, self.conn:
+            self._insert_many([snippet])
+            if self._cache is not None:
+                self._cache.append(snippet)
+        self._notify("upsert", snippet)
+
+    def update_snippet(self, snippet: Snippet) -> None:
+        row = self._snippet_to_row(snippet)
+        with self._lock, self.conn:
+            cur = self.conn.execute(
+                f"UPDATE snippets SET {', '.join(c + ' = ?' for c in COLUMNS[1:])} WHERE id = ?",
+                row[1:] + (snippet.id,),
+            )
+            if cur.rowcount == 0:
+                return
+            self._cache = None
+        self._notify("upsert", snippet)
+
+    def delete_snippet(self, snippet_id: str) -> None:
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM snippets WHERE id = ?", (snippet_id,))
+            self._cache = None
+        self._notify("delete", snippet_id)
+
+    def get_snippet(self, snippet_id: str) -> Optional[Snippet]:
+        rows = self._query(SELECT + " WHERE id = ?", (snippet_id,))
+        return rows[0] if rows else None
+
+    def get_snippet_by_abbreviation(self, abbr: str) -> Optional[Snippet]:
+        rows = self._query(
+            SELECT + " WHERE abbreviation = ? AND is_active = 1 ORDER BY rowid LIMIT 1", (abbr,)
+        )
+        return rows[0] if rows else None
+
+    def active_snippets(self, trigger: Optional[TriggerType] = None) -> List[Snippet]:
+        if trigger is None:
+            return self._query(SELECT + " WHERE is_active = 1 ORDER BY rowid")
+        return self._query(
+            SELECT + " WHERE trigger = ? AND is_active = 1 ORDER BY rowid", (trigger.value,)
+        )
+
+    def search(self, query: str, limit: int = 50) -> List[Snippet]:
+        """Full-text search over label and expansion (plus abbreviation prefix)."""
+        if not query.strip():
+            return []
+        if self.has_fts:
+            # Quote every term so user input is never parsed as FTS syntax
+            terms = " ".join('"' + t.replace('"', '""') + '"*' for t in query.split())
+            try:
+                return self._query(
+                    SELECT + " WHERE abbreviation LIKE ? ESCAPE '\\' OR rowid IN "
+                    "(SELECT rowid FROM snippets_fts WHERE snippets_fts MATCH ?) "
+                    "ORDER BY rowid LIMIT ?",
+                    (_like_pattern(query) + "%", terms, limit),
+                )
+            except sqlite3.OperationalError as e:
+                logger.warning(f"FTS query failed, using LIKE: {e}")
+        literal = _like_pattern(query)
+        like = f"%{literal}%"
+        return self._query(
+            SELECT + " WHERE abbreviation LIKE ? ESCAPE '\\' OR label LIKE ? ESCAPE '\\' "
+            "OR expansion LIKE ? ESCAPE '\\' ORDER BY rowid LIMIT ?",
+            (literal + "%", like, like, limit),
+        )
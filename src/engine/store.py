@@ -1,65 +1,349 @@
 import json
 import os
 import logging
-from typing import List, Dict, Optional
+import threading
+from typing import Callable, List, Dict, Optional
 from src.common.models import Snippet, Profile, Settings
 from src.common.constants import DATA_DIR
+from src.engine.journal import Journal, read_journal, write_atomic
+from src.engine.snapshot import LazySnippetList, read_cache, write_cache
 
 logger = logging.getLogger(__name__)
 
 class Store:
-    def __init__(self):
-        self.store_file = os.path.join(DATA_DIR, "store.json")
+    """
+    The snippet library, persisted as a JSON snapshot (store.json).
+
+    In journal mode every mutation appends one small record to
+    store.json.journal instead of rewriting the snapshot; the journal is
+    group-committed in the background and periodically compacted into a new
+    snapshot. load() always replays a journal it finds, whatever the mode.
+
+    apply_records() takes changes made by another process in the same record
+    format (see src/engine/sync.py) and applies them in memory only.
+
+    Profiles (app-specific snippet sets) and Settings are small and rarely
+    edited; they live next to the snapshot in store.profiles.json and
+    store.settings.json, rewritten whole on every change.
+    """
+
+    def __init__(
+        self,
+        store_file: Optional[str] = None,
+        journal: bool = False,
+        compact_after: int = 1000,
+    ):
+        self.store_file = store_file or os.path.join(DATA_DIR, "store.json")
+        self.journal_file = self.store_file + ".journal"
         self.snippets: List[Snippet] = []
+        self.profiles: List[Profile] = []
+        self.settings = Settings()
+        # id -> list position, rebuilt lazily (see _positions)
+        self._pos_cache: Optional[Dict[str, int]] = None
+        self._pos_list = None
+        self._pos_len = 0
+        self._listeners: List[Callable[[str, object], None]] = []
+        self._lock = threading.RLock()
         self._ensure_data_dir()
         self.load()
+        self._journal = (
+            Journal(self.journal_file, self.compact, compact_after=compact_after)
+            if journal else None
+        )
 
     def _ensure_data_dir(self):
-        os.makedirs(DATA_DIR, exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(self.store_file)), exist_ok=True)
+
+    def subscribe(self, listener: Callable[[str, object], None]) -> None:
+        """
+        Registers listener(op, data), called after every change:
+        ("upsert", snippet), ("delete", snippet_id), ("reload", None),
+        ("profiles", profiles) or ("settings", settings).
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, op: str, data=None) -> None:
+        for listener in self._listeners:
+            try:
+                listener(op, data)
+            except Exception as e:
+                logger.error(f"Store listener failed on {op}: {e}")
 
     def load(self) -> None:
-        if not os.path.exists(self.store_file):
-            self.snippets = []
+        self._load()
+        self._load_profiles()
+        self._load_settings()
+        self._notify("reload")
+
+    @property
+    def profiles_file(self) -> str:
+        return os.path.splitext(self.store_file)[0] + ".profiles.json"
+
+    def _load_profiles(self) -> None:
+        self.profiles = []
+        if not os.path.exists(self.profiles_file):
             return
+        try:
+            with open(self.profiles_file, "rb") as f:
+                self.profiles = [Profile(**item) for item in json.loads(f.read())]
+            logger.info(f"Loaded {len(self.profiles)} profiles from {self.profiles_file}")
+        except Exception as e:
+            logger.error(f"Failed to load profiles: {e}")
+            self.profiles = []
+
+    @property
+    def settings_file(self) -> str:
+        return os.path.splitext(self.store_file)[0] + ".settings.json"
 
+    def _load_settings(self) -> None:
+        self.settings = Settings()
+        if not os.path.exists(self.settings_file):
+            return
         try:
-            with open(self.store_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.snippets = [Snippet.from_dict(item) for item in data]
-            logger.info(f"Loaded {len(self.snippets)} snippets from {self.store_file}")
+            with open(self.settings_file, "rb") as f:
+                self.settings = Settings(**json.loads(f.read()))
         except Exception as e:
-            logger.error(f"Failed to load store: {e}")
-            self.snippets = []
+            logger.error(f"Failed to load settings: {e}")
+
+    def _save_profiles(self) -> None:
+        data = [profile.model_dump(mode="json") for profile in self.profiles]
+        write_atomic(self.profiles_file, json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+    def _load(self) -> None:
+        self.snippets = []
+        if os.path.exists(self.store_file):
+            cached = read_cache(self.store_file)
+            if cached is not None:
+                self.snippets = LazySnippetList(cached)
+                logger.info(f"Loaded {len(self.snippets)} snippets from snapshot cache")
+            else:
+                try:
+                    with open(self.store_file, 'rb') as f:
+                        raw = f.read()
+                    data = json.loads(raw)
+                    self.snippets = [Snippet.from_dict(item) for item in data]
+                    logger.info(f"Loaded {len(self.snippets)} snippets from {self.store_file}")
+                    write_cache(self.store_file, [s.to_dict() for s in self.snippets], raw)
+                except Exception as e:
+                    logger.error(f"Failed to load store: {e}")
+                    self.snippets = []
+
+        # Records of an interrupted compaction first, then the live journal
+        records = read_journal(self.journal_file + ".old") + read_journal(self.journal_file)
+        if records:
+            self._replay(records)
+            logger.info(f"Replayed {len(records)} journal records")
+
+    def _ids(self) -> List[str]:
+        ids = getattr(self.snippets, "ids", None)
+        return list(ids()) if ids else [s.id for s in self.snippets]
+
+    def _positions(self) -> Dict[str, int]:
+        """
+        Position of every snippet id. Kept up to date by appends and in-place
+        replacements; rebuilt after a delete or when the list was swapped or
+        resized behind the store's back.
+        """
+        if (
+            self._pos_cache is None
+            or self._pos_list is not self.snippets
+            or self._pos_len != len(self.snippets)
+        ):
+            self._pos_cache = {snippet_id: i for i, snippet_id in enumerate(self._ids())}
+            self._pos_list = self.snippets
+            self._pos_len = len(self.snippets)
+        return self._pos_cache
+
+    def _position(self, snippet_id: str) -> Optional[int]:
+        return self._positions().get(snippet_id)
+
+    def _append(self, snippet: Snippet) -> None:
+        positions = self._positions()
+        self.snippets.append(snippet)
+        positions.setdefault(snippet.id, len(self.snippets) - 1)
+        self._pos_len = len(self.snippets)
+
+    def _delete_at(self, i: int) -> None:
+        del self.snippets[i]
+        self._pos_cache = None
+
+    def match_records(self):
+        """
+        What the engine compiles from and list views iterate: the snippets
+        themselves, or cheap record views for entries of a cached load that
+        were never materialized (their bodies are not read).
+        """
+        records = getattr(self.snippets, "match_records", None)
+        return records() if records else self.snippets
+
+    def _replay(self, records: List[dict]) -> List[tuple]:
+        """Applies journal records in memory. Returns the (op, data) changes made."""
+        changes = []
+        for record in records:
+            try:
+                if record["op"] == "upsert":
+                    snippet = Snippet.from_dict(record["snippet"])
+                    i = self._position(snippet.id)
+                    if i is None:
+                        self._append(snippet)
+                    else:
+                        self.snippets[i] = snippet
+                    changes.append(("upsert", snippet))
+                elif record["op"] == "delete":
+                    i = self._position(record["id"])
+                    if i is not None:
+                        self._delete_at(i)
+                        changes.append(("delete", record["id"]))
+            except Exception as e:
+                logger.error(f"Skipping bad journal record {record}: {e}")
+        return changes
+
+    def apply_records(self, records: List[dict]) -> None:
+        """
+        Applies changes another process already persisted, without writing
+        anything, and notifies listeners per change. A "reload" record
+        re-reads the whole store instead; "profiles" and "settings" records
+        re-read those files.
+        """
+        if any(record.get("op") == "reload" for record in records):
+            self.load()
+            return
+        with self._lock:
+            changes = self._replay([r for r in records if r.get("op") not in ("profiles", "settings")])
+        for op, data in changes:
+            self._notify(op, data)
+        if any(record.get("op") == "profiles" for record in records):
+            self.reload_profiles()
+        if any(record.get("op") == "settings" for record in records):
+            self.reload_settings()
+
+    def reload_profiles(self) -> None:
+        with self._lock:
+            self._load_profiles()
+            profiles = list(self.profiles)
+        self._notify("profiles", profiles)
+
+    def reload_settings(self) -> None:
+        with self._lock:
+            self._load_settings()
+        self._notify("settings", self.settings)
+
+    def _write_snapshot(self, snippets: List[Snippet]) -> None:
+        to_dicts = getattr(snippets, "to_dicts", None)
+        data = list(to_dicts()) if to_dicts else [s.to_dict() for s in snippets]
+        raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        write_atomic(self.store_file, raw)
+        write_cache(self.store_file, data, raw)
 
     def save(self) -> None:
+        """Writes a full snapshot (atomically) and drops the journal it supersedes."""
         try:
-            data = [s.to_dict() for s in self.snippets]
-            with open(self.store_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2)
+            with self._lock:
+                self._write_snapshot(self.snippets)
+                if self._journal is not None:
+                    self._journal.clear()
+                else:
+                    for path in (self.journal_file, self.journal_file + ".old"):
+                        if os.path.exists(path):
+                            os.remove(path)
             logger.info("Store saved successfully")
         except Exception as e:
             logger.error(f"Failed to save store: {e}")
 
+    def compact(self) -> None:
+        """Folds the journal into a fresh snapshot. Safe to run while edits continue."""
+        if self._journal is None:
+            return
+        with self._lock:
+            self._journal.rotate()
+            # Shallow copy: an in-place edit racing the write is also in the new
+            # journal, and replaying it over the snapshot is idempotent
+            snippets = self.snippets.copy()
+        try:
+            self._write_snapshot(snippets)
+            self._journal.discard_rotated()
+            logger.info(f"Compacted journal into snapshot of {len(snippets)} snippets")
+        except Exception as e:
+            # The rotated journal is still there and is replayed on next load
+            logger.error(f"Journal compaction failed: {e}")
+
+    def flush(self) -> None:
+        if self._journal is not None:
+            self._journal.flush()
+
+    def close(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+
+    def _persist(self, record: dict) -> None:
+        if self._journal is not None:
+            self._journal.append(record)
+        else:
+            self.save()
+
     def add_snippet(self, snippet: Snippet) -> None:
         if not snippet.id:
             import uuid
             snippet.id = uuid.uuid4().hex
-        self.snippets.append(snippet)
-        self.save()
+        with self._lock:
+            self._append(snippet)
+            self._persist({"op": "upsert", "snippet": snippet.to_dict()})
+        self._notify("upsert", snippet)
 
     def update_snippet(self, snippet: Snippet) -> None:
-        for i, s in enumerate(self.snippets):
-            if s.id == snippet.id:
-                self.snippets[i] = snippet
-                break
-        self.save()
+        with self._lock:
+            i = self._position(snippet.id)
+            if i is None:
+                return
+            self.snippets[i] = snippet
+            self._persist({"op": "upsert", "snippet": snippet.to_dict()})
+        self._notify("upsert", snippet)
 
     def delete_snippet(self, snippet_id: str) -> None:
-        self.snippets = [s for s in self.snippets if s.id != snippet_id]
-        self.save()
+        with self._lock:
+            i = self._position(snippet_id)
+            if i is not None:
+                self._delete_at(i)
+            self._persist({"op": "delete", "id": snippet_id})
+        self._notify("delete", snippet_id)
+
+    def get_snippet(self, snippet_id: str) -> Optional[Snippet]:
+        with self._lock:
+            i = self._position(snippet_id)
+            return self.snippets[i] if i is not None else None
 
     def get_snippet_by_abbreviation(self, abbr: str) -> Optional[Snippet]:
-        for s in self.snippets:
+        for i, s in enumerate(self.match_records()):
             if s.is_active and s.abbreviation == abbr:
-                return s
+                return self.snippets[i]
         return None
+
+    def add_profile(self, profile: Profile) -> None:
+        with self._lock:
+            self.profiles.append(profile)
+            self._save_profiles()
+        self._notify("profiles", list(self.profiles))
+
+    def update_profile(self, profile: Profile) -> None:
+        with self._lock:
+            i = next((i for i, p in enumerate(self.profiles) if p.id == profile.id), None)
+            if i is None:
+                return
+            self.profiles[i] = profile
+            self._save_profiles()
+        self._notify("profiles", list(self.profiles))
+
+    def delete_profile(self, profile_id: str) -> None:
+        with self._lock:
+            self.profiles = [p for p in self.profiles if p.id != profile_id]
+            self._save_profiles()
+        self._notify("profiles", list(self.profiles))
+
+    def get_profile(self, profile_id: str) -> Optional[Profile]:
+        return next((p for p in self.profiles if p.id == profile_id), None)
+
+    def update_settings(self, settings: Settings) -> None:
+        with self._lock:
+            self.settings = settings
+            write_atomic(self.settings_file, settings.model_dump_json().encode("utf-8"))
+        self._notify("settings", settings)
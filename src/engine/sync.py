@@ -0,0 +1,82 @@
+"""
+Live library updates from the GUI to the backend.
+
+The GUI's Store notifies a ChangeForwarder after every edit. The forwarder
+sends the change to the backend as one RELOAD_CONFIG message. The message
+carries journal records: {"op": "upsert", "snippet": {...}} or
+{"op": "delete", "id": ...}, {"op": "profiles"} or {"op": "settings"} after
+a profile or settings edit (the backend re-reads that file) or
+{"op": "reload"} after a full reload. The
+backend hands them to Store.apply_records, which patches its in-memory list
+and, through the store listeners, the compiled matcher. Nothing is re-read
+from disk and only the changed snippet is validated.
+"""
+import logging
+import time
+from typing import Callable, Optional
+from src.common.constants import MSG_RELOAD_CONFIG
+from src.common.ipc import IPCClient
+
+logger = logging.getLogger(__name__)
+
+# After a failed connect, wait this long before trying again
+RECONNECT_INTERVAL = 2.0
+
+
+def change_record(op: str, data) -> dict:
+    """Journal record for a Store notification."""
+    if op == "upsert":
+        return {"op": "upsert", "snippet": data.to_dict()}
+    if op == "delete":
+        return {"op": "delete", "id": data}
+    if op in ("profiles", "settings"):
+        return {"op": op}
+    return {"op": "reload"}
+
+
+def reload_message(op: str, data) -> dict:
+    return {"type": MSG_RELOAD_CONFIG, "payload": {"records": [change_record(op, data)]}}
+
+
+class ChangeForwarder:
+    """
+    Store listener that pushes every change to the backend.
+
+    If the backend is not reachable the change is dropped: a backend that
+    starts later loads the store (and its journal) from disk anyway.
+    """
+
+    def __init__(self, client_factory: Callable[[], IPCClient] = IPCClient):
+        self._client_factory = client_factory
+        self._client: Optional[IPCClient] = None
+        self._retry_at = 0.0
+
+    def __call__(self, op: str, data) -> None:
+        client = self._connected()
+        if client is None:
+            return
+        try:
+            client.send(reload_message(op, data))
+        except Exception as e:
+            logger.warning(f"Could not forward {op} to backend: {e}")
+            self.close()
+
+    def _connected(self) -> Optional[IPCClient]:
+        if self._client is not None:
+            return self._client
+        if time.monotonic() < self._retry_at:
+            return None
+        client = self._client_factory()
+        try:
+            client.connect()
+        except OSError as e:
+            logger.info(f"Backend not reachable, library changes stay local for now: {e}")
+            self._retry_at = time.monotonic() + RECONNECT_INTERVAL
+            return None
+        self._client = client
+        return client
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
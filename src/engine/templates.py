@@ -0,0 +1,112 @@
+import re
+from typing import List, Optional, Tuple
+
+CURSOR = "cursor"
+
+# Placeholder names templates recognize, as {{name}} or {{name:argument}}; the
+# resolver's registry adds its own (src/engine/placeholders.py). Anything else
+# in {{...}} is literal text.
+PLACEHOLDERS = ("date", "time", "datetime", "clipboard", CURSOR)
+
+
+def _placeholder_re(names) -> "re.Pattern":
+    return re.compile(r"\{\{((?:" + "|".join(map(re.escape, names)) + r")(?::[^{}]*)?)\}\}")
+
+
+PLACEHOLDER_RE = _placeholder_re(PLACEHOLDERS)
+
+
+def register_placeholder_names(*names: str) -> None:
+    """Makes templates parsed from now on treat {{name}} as a slot."""
+    global PLACEHOLDERS, PLACEHOLDER_RE
+    added = tuple(name for name in names if name not in PLACEHOLDERS)
+    if added:
+        PLACEHOLDERS += added
+        PLACEHOLDER_RE = _placeholder_re(PLACEHOLDERS)
+
+
+class ExpansionTemplate:
+    """
+    An expansion parsed once into literal segments and placeholder slots.
+
+    segments holds literal strings and slot names ("date", "script:weather") in
+    order; is_slot says which is which. The first {{cursor}} splits the segments into before/after the cursor,
+    every cursor marker is dropped from the output. Templates without slots
+    carry their final text and cursor offset precomputed.
+    """
+
+    __slots__ = ("source", "segments", "is_slot", "slots", "cursor_index", "text", "cursor_offset")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.cursor_index: Optional[int] = None  # Segment index the cursor sits before
+
+        if "{{" not in source:
+            # Plain text, by far the common case: nothing to parse
+            self.segments = [source]
+            self.is_slot = [False]
+            self.slots = frozenset()
+            self.text = source
+            self.cursor_offset = 0
+            return
+
+        self.segments: List[str] = []
+        self.is_slot: List[bool] = []
+
+        pos = 0
+        for m in PLACEHOLDER_RE.finditer(source):
+            if m.start() > pos:
+                self._append(source[pos:m.start()], False)
+            name = m.group(1)
+            if name == CURSOR:
+                if self.cursor_index is None:
+                    self.cursor_index = len(self.segments)
+            else:
+                self._append(name, True)
+            pos = m.end()
+        if pos < len(source):
+            self._append(source[pos:], False)
+
+        self.slots = frozenset(s for s, slot in zip(self.segments, self.is_slot) if slot)
+
+        # Static templates are rendered here, once
+        self.text: Optional[str] = None
+        self.cursor_offset = 0
+        if not self.slots:
+            self.text, self.cursor_offset = self._join(self.segments)
+
+    def _append(self, value: str, slot: bool) -> None:
+        # Merge adjacent literals so rendering joins as few parts as possible,
+        # but never across the cursor position
+        if (
+            not slot
+            and self.segments
+            and not self.is_slot[-1]
+            and self.cursor_index != len(self.segments)
+        ):
+            self.segments[-1] += value
+            return
+        self.segments.append(value)
+        self.is_slot.append(slot)
+
+    @property
+    def is_static(self) -> bool:
+        return self.text is not None
+
+    def _join(self, parts: List[str]) -> Tuple[str, int]:
+        text = "".join(parts)
+        if self.cursor_index is None:
+            return text, 0
+        return text, sum(len(p) for p in parts[self.cursor_index:])
+
+    def render(self, resolve_slot) -> Tuple[str, int]:
+        """
+        Returns (final_text, cursor_offset).
+        resolve_slot(name) is only called for the slots this template contains.
+        """
+        if self.text is not None:
+            return self.text, self.cursor_offset
+
+        values = {name: resolve_slot(name) for name in self.slots}
+        parts = [values[s] if slot else s for s, slot in zip(self.segments, self.is_slot)]
+        return self._join(parts)
@@ -4,6 +4,7 @@ from src.gui.views.dashboard import DashboardView
 from src.gui.views.library import LibraryView
 from src.gui.views.settings import SettingsView
 from src.engine.store import Store
+from src.engine.sync import ChangeForwarder
 
 def main(page: ft.Page):
     page.title = "Text Expander"
@@ -13,11 +14,13 @@ def main(page: ft.Page):
     page.window_height = 700
     page.bgcolor = "#1E1E1E" # Deep gray background
     
-    # Initialize Store
-    store = Store()
+    # Initialize Store (journal mode: edits append instead of rewriting the library)
+    store = Store(journal=True)
+    # Push every edit to the running backend so it is live without a restart
+    store.subscribe(ChangeForwarder())
     
     # Views
-    dashboard = DashboardView()
+    dashboard = DashboardView(store)
     library = LibraryView(store)
     settings = SettingsView()
     
@@ -3,11 +3,15 @@ from src.gui.components.glass_card import GlassCard
 
 
 class DashboardView(ft.Column):
-    def __init__(self):
+    def __init__(self, store=None):
         super().__init__(expand=True, spacing=20)
 
-        self.status_text = ft.Text("Engine Active", size=24, weight=ft.FontWeight.BOLD)
-        self.toggle_switch = ft.Switch(value=True, on_change=self.toggle_engine)
+        self.store = store
+        enabled = store.settings.engine_enabled if store is not None else True
+        self.status_text = ft.Text(
+            "Engine Active" if enabled else "Engine Paused", size=24, weight=ft.FontWeight.BOLD
+        )
+        self.toggle_switch = ft.Switch(value=enabled, on_change=self.toggle_engine)
 
         # Main dashboard layout, using only basic controls (no icons, no ft.colors)
         self.controls = [
@@ -63,4 +67,6 @@ class DashboardView(ft.Column):
         is_on = self.toggle_switch.value
         self.status_text.value = "Engine Active" if is_on else "Engine Paused"
         self.status_text.update()
-        # TODO: send IPC to backend/hook when engine is toggled
+        if self.store is not None:
+            # Persisted, then forwarded to the backend, which pushes it to the hook
+            self.store.update_settings(self.store.settings.model_copy(update={"engine_enabled": is_on}))
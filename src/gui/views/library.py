@@ -2,6 +2,7 @@ import flet as ft
 from src.gui.components.glass_card import GlassCard
 from src.common.models import Snippet, TriggerType
 from src.engine.store import Store
+from src.engine.snapshot import preview
 
 
 class LibraryView(ft.Row):
@@ -87,7 +88,8 @@ class LibraryView(ft.Row):
     def refresh_list(self):
         self.snippet_list.controls.clear()
 
-        for snippet in self.store.snippets:
+        # Records, not models: only the start of each body is read for the preview
+        for snippet in self.store.match_records():
             self.snippet_list.controls.append(
                 ft.Container(
                     content=ft.Column(
@@ -97,7 +99,7 @@ class LibraryView(ft.Row):
                                 weight=ft.FontWeight.BOLD,
                             ),
                             ft.Text(
-                                snippet.expansion,
+                                preview(snippet),
                                 max_lines=1,
                                 overflow=ft.TextOverflow.ELLIPSIS,
                                 size=12,
@@ -108,7 +110,7 @@ class LibraryView(ft.Row):
                     padding=10,
                     border_radius=8,
                     bgcolor="rgba(255, 255, 255, 0.05)",
-                    on_click=lambda e, s=snippet: self.select_snippet(s),
+                    on_click=lambda e, i=snippet.id: self.select_snippet(i),
                     # IMPORTANT: no cursor=ft.Cursor.CLICK here
                 )
             )
@@ -121,7 +123,11 @@ class LibraryView(ft.Row):
         # TODO: Optional filtering
         pass
 
-    def select_snippet(self, snippet: Snippet):
+    def select_snippet(self, snippet_id: str):
+        # The full body is only loaded here
+        snippet = self.store.get_snippet(snippet_id)
+        if snippet is None:
+            return
         self.current_snippet = snippet
         self.abbr_field.value = snippet.abbreviation
         self.content_field.value = snippet.expansion
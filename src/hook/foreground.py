@@ -0,0 +1,70 @@
+"""
+Foreground application tracking for the hook.
+
+The backend picks the snippet profiles for the foreground executable
+(src/engine/profiles.py) and the hook's Gate checks it against the ignored
+apps, so both have to hear about every switch, and only about switches.
+Nothing is queried per key: the focus source calls focus(window) when the
+foreground window changes (Win32Input through SetWinEventHook, on the hook
+thread), and the executable is looked up then.
+"""
+import logging
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ForegroundTracker:
+    """
+    source provides foreground_window() -> handle, process_name(handle) ->
+    executable name or None, and watch(callback), which calls
+    callback(handle) on every foreground change (Win32Input, or FakeFocus).
+    on_change(app) runs on the source's thread for every new window, even of
+    the same app: the text around the caret changed either way.
+    """
+
+    def __init__(self, source, on_change: Callable[[Optional[str]], object] = lambda app: None):
+        self.source = source
+        self.on_change = on_change
+        self.window = None
+        self.app: Optional[str] = None
+        self.lookups = 0
+
+    def start(self) -> None:
+        self.source.watch(self.focus)
+        self.focus(self.source.foreground_window())
+
+    def focus(self, window) -> None:
+        if window == self.window:
+            return
+        self.window = window
+        self.lookups += 1
+        try:
+            self.app = self.source.process_name(window)
+        except OSError as e:
+            logger.debug(f"Could not resolve the foreground process: {e}")
+            self.app = None
+        self.on_change(self.app)
+
+
+class FakeFocus:
+    """Focus source for tests: windows map to executables, switch() fires the focus callback."""
+
+    def __init__(self, apps: Optional[Dict[int, str]] = None, window: int = 0):
+        self.apps = dict(apps or {})
+        self.window = window
+        self._callback = None
+
+    def foreground_window(self):
+        return self.window
+
+    def process_name(self, window) -> Optional[str]:
+        return self.apps.get(window)
+
+    def watch(self, callback) -> None:
+        self._callback = callback
+
+    def switch(self, window) -> None:
+        self.window = window
+        if self._callback is not None:
+            self._callback(window)
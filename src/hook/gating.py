@@ -0,0 +1,47 @@
+"""
+Whether the hook handles keys at all.
+
+Settings.engine_enabled (the dashboard's pause switch) and
+Settings.ignored_apps are pushed by the backend (GATING), the foreground
+app comes from the ForegroundTracker. Both change rarely, so the decision
+is computed when they change and the hook callback reads one attribute:
+while the gate is closed a key is not queued, numbered or sent, and the
+first key after it opens again carries a gap (src/hook/handoff.py).
+"""
+import logging
+from typing import Iterable, Optional
+from src.common.models import app_key
+
+logger = logging.getLogger(__name__)
+
+
+class Gate:
+    __slots__ = ("engine_enabled", "ignored_apps", "app", "open")
+
+    def __init__(self, engine_enabled: bool = True, ignored_apps: Iterable[str] = ()):
+        self.engine_enabled = engine_enabled
+        self.ignored_apps = frozenset(app_key(app) for app in ignored_apps)
+        self.app: Optional[str] = None
+        self.open = True
+        self._update()
+
+    def set_settings(self, engine_enabled: bool, ignored_apps: Iterable[str]) -> None:
+        """From the backend's GATING message, on the hook's reader thread."""
+        self.engine_enabled = engine_enabled
+        self.ignored_apps = frozenset(app_key(app) for app in ignored_apps)
+        self._update()
+
+    def set_app(self, app: Optional[str]) -> None:
+        """From the focus source, on the hook thread."""
+        self.app = app
+        self._update()
+
+    def _update(self) -> None:
+        is_open = self.engine_enabled and app_key(self.app) not in self.ignored_apps
+        if is_open != self.open:
+            if is_open:
+                logger.info("Key handling resumed")
+            else:
+                reason = "paused" if not self.engine_enabled else f"{self.app} is ignored"
+                logger.info(f"Key handling off: {reason}")
+        self.open = is_open
@@ -0,0 +1,243 @@
+"""
+Hand-off between the low-level keyboard hook callback and the rest of the hook.
+
+Windows removes a low-level hook that is slow to return, without telling
+it. The callback therefore does as little as possible: it drops injected
+events (our own SendInput, see LLKHF_INJECTED), packs the key into one
+integer in a preallocated ring and returns. A drain thread unpacks the
+keys and runs the real handler (pipeline numbering, local matching,
+queueing for the backend).
+
+The ring has one producer (the hook thread) and one consumer (the drain
+thread); each index is written by one side only, so no lock is taken on
+the way in. A Watchdog checks, from inside the callback, that keys are
+still being drained and the backend is still reading; if not, the callback
+passes keys through untouched until both recover. Keys lost to an overflow
+or a stall are reported to the drain thread as a gap (on_gap) before the
+next key, since the text around the caret is no longer known. So are keys
+a closed Gate (src/hook/gating.py) kept out, and a focus change reaches
+the drain thread (on_focus) ahead of the first key typed after it.
+
+Nothing here touches Win32, so the whole path can be driven from a test.
+"""
+import logging
+import threading
+import time
+from array import array
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# KBDLLHOOKSTRUCT.flags: the event came from SendInput / keybd_event
+LLKHF_INJECTED = 0x10
+
+RING_CAPACITY = 1024
+# Far below the system's LowLevelHooksTimeout; a single thread switch can cost 5ms
+CALLBACK_BUDGET = 0.05
+# Keys waiting, or a backend write in flight, for longer than this is a stall
+STALL_TIMEOUT = 0.25
+
+# Set on the first event queued after keys were lost
+GAP = 1 << 33
+# Set on the first event queued after the foreground window changed
+FOCUS = 1 << 34
+
+
+def pack(vk_code: int, scan_code: int, flags: int, is_down: bool) -> int:
+    return (vk_code & 0xFF) | (scan_code & 0xFFFF) << 8 | (flags & 0xFF) << 24 | is_down << 32
+
+
+def unpack(event: int):
+    """(vk_code, scan_code, flags, is_down)"""
+    return event & 0xFF, (event >> 8) & 0xFFFF, (event >> 24) & 0xFF, bool(event >> 32 & 1)
+
+
+class KeyRing:
+    """Fixed-size single-producer single-consumer ring of packed key events."""
+
+    def __init__(self, capacity: int = RING_CAPACITY):
+        if capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        self._slots = array("Q", bytes(8 * capacity))
+        self._mask = capacity - 1
+        self.capacity = capacity
+        self._head = 0  # Written by the producer only
+        self._tail = 0  # Written by the consumer only
+        self._idle = False
+        self._wakeup = threading.Event()
+        self.pending_since = 0.0  # When the ring last went from empty to not empty
+        self.drained_at = 0.0  # When the consumer last took events
+        self.dropped = 0
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def put(self, event: int, now: float) -> bool:
+        """Producer side; never blocks. False if the ring is full."""
+        head = self._head
+        if head - self._tail > self._mask:
+            self.dropped += 1
+            return False
+        if head == self._tail:
+            self.pending_since = now
+        self._slots[head & self._mask] = event
+        self._head = head + 1
+        if self._idle:
+            self._wakeup.set()
+        return True
+
+    def take(self, timeout: Optional[float] = None) -> list:
+        """Consumer side: every event queued so far, waiting up to timeout for one."""
+        if self._head == self._tail:
+            self._idle = True
+            if self._head == self._tail:
+                self._wakeup.wait(timeout)
+            self._idle = False
+            self._wakeup.clear()
+        tail, head = self._tail, self._head
+        slots, mask = self._slots, self._mask
+        events = [slots[i & mask] for i in range(tail, head)]
+        self._tail = head
+        self.drained_at = time.monotonic()
+        return events
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+
+class Watchdog:
+    """
+    Decides, per key, whether the callback may queue it. It trips to
+    pass-through when queued keys have waited past stall_timeout, a
+    backend write has been in flight that long, or the callback ran over
+    budget; it recovers once the ring is empty and the backend is reading.
+    """
+
+    def __init__(self, stall_timeout: float = STALL_TIMEOUT, budget: float = CALLBACK_BUDGET):
+        self.stall_timeout = stall_timeout
+        self.budget = budget
+        self.passthrough = False
+        self.trips = 0
+        self.slow_callbacks = 0
+        self.max_callback = 0.0
+
+    def stalled(self, ring: KeyRing, busy_since: float, now: float) -> bool:
+        if len(ring) and now - max(ring.pending_since, ring.drained_at) > self.stall_timeout:
+            return True
+        return bool(busy_since) and now - busy_since > self.stall_timeout
+
+    def allow(self, ring: KeyRing, busy_since: float, now: float) -> bool:
+        if self.passthrough:
+            if len(ring) or self.stalled(ring, busy_since, now):
+                return False
+            self.passthrough = False
+            logger.warning("Hook watchdog: backend caught up, handling keys again")
+            return True
+        if self.stalled(ring, busy_since, now):
+            self._trip("keys are not being consumed")
+            return False
+        return True
+
+    def record(self, duration: float) -> None:
+        if duration > self.max_callback:
+            self.max_callback = duration
+        if duration > self.budget:
+            self.slow_callbacks += 1
+            if not self.passthrough:
+                self._trip(f"callback took {duration * 1000:.1f}ms")
+
+    def _trip(self, reason: str) -> None:
+        self.passthrough = True
+        self.trips += 1
+        logger.warning(f"Hook watchdog: passing keys through, {reason}")
+
+
+class HookDispatcher:
+    """
+    on_event is the hook callback; handler(vk_code, scan_code, is_down) runs
+    on the drain thread. busy_since returns when the in-flight backend write
+    started (0 when idle). on_gap runs on the drain thread before the first
+    key queued after keys were lost, on_focus before the first key queued
+    after focus_changed(). Keys are not queued while gate.open is false.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[int, int, bool], object],
+        busy_since: Callable[[], float] = lambda: 0.0,
+        on_gap: Callable[[], object] = lambda: None,
+        capacity: int = RING_CAPACITY,
+        watchdog: Optional[Watchdog] = None,
+        gate=None,
+        on_focus: Callable[[], object] = lambda: None,
+    ):
+        self.handler = handler
+        self.busy_since = busy_since
+        self.on_gap = on_gap
+        self.on_focus = on_focus
+        self.gate = gate
+        self.ring = KeyRing(capacity)
+        self.watchdog = watchdog or Watchdog()
+        self.injected = 0
+        self.passed = 0
+        self.gated = 0
+        # GAP and FOCUS bits for the next queued key; hook thread only
+        self._marks = 0
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def on_event(self, vk_code: int, scan_code: int, flags: int, is_down: bool) -> bool:
+        """Returns whether to block the key; never, so far."""
+        if flags & LLKHF_INJECTED:
+            self.injected += 1
+            return False
+        gate = self.gate
+        if gate is not None and not gate.open:
+            self.gated += 1
+            self._marks |= GAP
+            return False
+        started = time.perf_counter()
+        now = time.monotonic()
+        if self.watchdog.allow(self.ring, self.busy_since(), now):
+            if self.ring.put(pack(vk_code, scan_code, flags, is_down) | self._marks, now):
+                self._marks = 0
+            else:
+                self._marks |= GAP
+        else:
+            self.passed += 1
+            self._marks |= GAP
+        self.watchdog.record(time.perf_counter() - started)
+        return False
+
+    def focus_changed(self) -> None:
+        """Called on the hook thread when the foreground window changed."""
+        self._marks |= FOCUS
+
+    def start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self._drain, name="hook-drain", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self.ring.wake()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _drain(self) -> None:
+        while self._running:
+            for event in self.ring.take(timeout=0.5):
+                if event & FOCUS:
+                    self._call(self.on_focus)
+                if event & GAP:
+                    self._call(self.on_gap)
+                vk_code, scan_code, _, is_down = unpack(event)
+                self._call(self.handler, vk_code, scan_code, is_down)
+
+    @staticmethod
+    def _call(fn, *args) -> None:
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.error(f"Error handling hook event: {e}")
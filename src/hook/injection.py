@@ -0,0 +1,277 @@
+"""
+Plans for the input the hook injects to perform a replacement.
+
+A replacement (backspaces, text, cursor_offset) compiles to one flat list
+of keyboard events: the backspaces, then the text typed as Unicode
+keystrokes or pasted with Ctrl+V, then the Left presses that place the
+caret. The platform layer submits the whole list at once (Win32Input
+turns it into a single INPUT array and one SendInput call), so the
+application never sees a half-applied replacement.
+
+Planning is plain Python and does not touch the OS, so it runs and is
+measured anywhere; RecordingBackend stands in for Win32Input off Windows.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Win32 KEYBDINPUT flags
+KEYEVENTF_EXTENDEDKEY = 0x0001
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
+
+VK_BACK = 0x08
+VK_TAB = 0x09
+VK_RETURN = 0x0D
+VK_CONTROL = 0x11
+VK_LEFT = 0x25
+VK_V = 0x56
+
+# Texts longer than this are pasted; typing them floods the target with WM_CHARs
+PASTE_THRESHOLD = 64
+PLAN_CACHE_SIZE = 256
+# The target reads the clipboard when it handles Ctrl+V, after SendInput returns
+CLIPBOARD_RESTORE_DELAY = 0.2
+
+# (vk, scan, flags): one KEYBDINPUT
+Event = Tuple[int, int, int]
+
+
+def _tap(vk: int, flags: int = 0) -> Tuple[Event, Event]:
+    return (vk, 0, flags), (vk, 0, flags | KEYEVENTF_KEYUP)
+
+
+# Characters sent as their key rather than as a Unicode keystroke, which
+# many applications ignore for line breaks and tabs
+_KEYED = {"\n": _tap(VK_RETURN), "\r": (), "\t": _tap(VK_TAB)}
+_BACKSPACE = _tap(VK_BACK)
+_LEFT = _tap(VK_LEFT, KEYEVENTF_EXTENDEDKEY)
+PASTE_EVENTS = ((VK_CONTROL, 0, 0), *_tap(VK_V), (VK_CONTROL, 0, KEYEVENTF_KEYUP))
+
+
+def typed_events(text: str) -> List[Event]:
+    """Unicode keystrokes for text; characters outside the BMP go as surrogate pairs."""
+    events: List[Event] = []
+    down, up = KEYEVENTF_UNICODE, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP
+    for char in text:
+        keyed = _KEYED.get(char)
+        if keyed is not None:
+            events.extend(keyed)
+            continue
+        code = ord(char)
+        if code > 0xFFFF:
+            code -= 0x10000
+            units = (0xD800 | (code >> 10), 0xDC00 | (code & 0x3FF))
+        else:
+            units = (code,)
+        for unit in units:
+            events.append((0, unit, down))
+            events.append((0, unit, up))
+    return events
+
+
+class InjectionPlan:
+    """
+    The events of one replacement, and the text to put on the clipboard
+    first when it is pasted. `native` is left to the platform layer to
+    keep its converted form in, so cached plans are converted only once.
+    """
+
+    __slots__ = ("events", "paste", "native")
+
+    def __init__(self, events: Tuple[Event, ...], paste: Optional[str] = None):
+        self.events = events
+        self.paste = paste
+        self.native = None
+
+    def __len__(self):
+        return len(self.events)
+
+
+class InjectionPlanner:
+    """
+    Compiles replacements into InjectionPlans. Texts up to paste_threshold
+    characters are typed, longer ones pasted. Plans are kept in an LRU
+    cache: a snippet without dynamic placeholders renders to the same
+    replacement every time, so after its first expansion it costs a lookup.
+    """
+
+    def __init__(self, paste_threshold: int = PASTE_THRESHOLD, cache_size: int = PLAN_CACHE_SIZE):
+        self.paste_threshold = paste_threshold
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, InjectionPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def plan(self, backspaces: int, text: str, cursor_offset: int = 0, paste: bool = True) -> InjectionPlan:
+        """paste=False forces typing, e.g. when the clipboard cannot be used."""
+        key = (backspaces, text, cursor_offset, paste and len(text) > self.paste_threshold)
+        with self._lock:
+            plan = self._cache.get(key)
+            if plan is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+        plan = self._compile(*key)
+        with self._lock:
+            self._cache[key] = plan
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return plan
+
+    @staticmethod
+    def _compile(backspaces: int, text: str, cursor_offset: int, paste: bool) -> InjectionPlan:
+        events = list(_BACKSPACE * backspaces)
+        if paste:
+            events.extend(PASTE_EVENTS)
+        else:
+            events.extend(typed_events(text))
+        events.extend(_LEFT * cursor_offset)
+        return InjectionPlan(tuple(events), text if paste else None)
+
+
+class Injector:
+    """
+    Performs replacements through a backend with send(plan) -> events
+    inserted, get_clipboard() and set_clipboard(text) (Win32Input, or
+    RecordingBackend in tests and benchmarks).
+    """
+
+    def __init__(self, backend, planner: Optional[InjectionPlanner] = None,
+                 restore_delay: float = CLIPBOARD_RESTORE_DELAY):
+        self.backend = backend
+        self.planner = planner or InjectionPlanner()
+        self.restore_delay = restore_delay
+        # The restore not done yet: (timer, the user's clipboard)
+        self._restore: Optional[Tuple[threading.Timer, str]] = None
+        self._lock = threading.Lock()
+
+    def replace(self, backspaces: int, text: str, cursor_offset: int = 0) -> InjectionPlan:
+        plan = self.planner.plan(backspaces, text, cursor_offset)
+        previous = None
+        if plan.paste is not None:
+            try:
+                previous = self._saved_clipboard()
+                self.backend.set_clipboard(plan.paste)
+            except Exception as e:
+                logger.error(f"Clipboard unavailable, typing instead: {e}")
+                plan = self.planner.plan(backspaces, text, cursor_offset, paste=False)
+                if previous is not None:
+                    # It may have been an earlier paste's pending restore
+                    self._restore_clipboard(previous)
+
+        sent = self.backend.send(plan)
+        if sent != len(plan):
+            # Blocked by UIPI, or the desktop is locked
+            logger.error(f"Only {sent} of {len(plan)} input events were injected")
+
+        if plan.paste is not None and previous is not None:
+            self._restore_clipboard(previous)
+        return plan
+
+    def _saved_clipboard(self) -> str:
+        """
+        The user's clipboard. While an earlier paste's restore is pending the
+        clipboard holds that paste's text, so the saved value is taken over.
+        """
+        with self._lock:
+            pending, self._restore = self._restore, None
+        if pending is not None:
+            timer, previous = pending
+            timer.cancel()
+            return previous
+        return self.backend.get_clipboard()
+
+    def _restore_clipboard(self, previous: str) -> None:
+        if self.restore_delay <= 0:
+            self._write_clipboard(previous)
+            return
+        timer = threading.Timer(self.restore_delay, lambda: self._restore_pending(timer))
+        timer.daemon = True
+        with self._lock:
+            self._restore = (timer, previous)
+        timer.start()
+
+    def _restore_pending(self, timer: threading.Timer) -> None:
+        with self._lock:
+            if self._restore is None or self._restore[0] is not timer:
+                return  # Taken over by a later paste
+            previous = self._restore[1]
+            self._restore = None
+        self._write_clipboard(previous)
+
+    def _write_clipboard(self, text: str) -> None:
+        try:
+            self.backend.set_clipboard(text)
+        except Exception:
+            pass
+
+
+class RecordingBackend:
+    """Injection backend that records each send(plan) call instead of injecting."""
+
+    def __init__(self, clipboard: Optional[str] = ""):
+        self.calls: List[Tuple[Event, ...]] = []
+        self.clipboard = clipboard
+        self.clipboard_writes: List[str] = []
+        self._pasted: List[Optional[str]] = []  # Clipboard as each call saw it
+
+    def send(self, plan: InjectionPlan) -> int:
+        self.calls.append(plan.events)
+        self._pasted.append(self.clipboard)
+        return len(plan.events)
+
+    def get_clipboard(self) -> Optional[str]:
+        if self.clipboard is None:
+            raise RuntimeError("No clipboard")
+        return self.clipboard
+
+    def set_clipboard(self, text: str) -> None:
+        if self.clipboard is None:
+            raise RuntimeError("No clipboard")
+        self.clipboard = text
+        self.clipboard_writes.append(text)
+
+    def typed_text(self) -> str:
+        """Rebuilds what the recorded calls leave in a plain text field."""
+        text: List[str] = []
+        caret = 0
+        pending_high = None
+        for events, clipboard in zip(self.calls, self._pasted):
+            ctrl = False
+            for vk, scan, flags in events:
+                if flags & KEYEVENTF_KEYUP:
+                    if vk == VK_CONTROL:
+                        ctrl = False
+                    continue
+                if flags & KEYEVENTF_UNICODE:
+                    if 0xD800 <= scan < 0xDC00:
+                        pending_high = scan
+                        continue
+                    if pending_high is not None:
+                        scan = 0x10000 + ((pending_high - 0xD800) << 10) + (scan - 0xDC00)
+                        pending_high = None
+                    inserted = chr(scan)
+                elif vk == VK_CONTROL:
+                    ctrl = True
+                    continue
+                elif vk == VK_V and ctrl:
+                    inserted = clipboard or ""
+                elif vk == VK_BACK:
+                    if caret:
+                        caret -= 1
+                        del text[caret]
+                    continue
+                elif vk == VK_LEFT:
+                    caret = max(0, caret - 1)
+                    continue
+                else:
+                    inserted = {VK_RETURN: "\n", VK_TAB: "\t"}.get(vk, "")
+                text[caret:caret] = inserted
+                caret += len(inserted)
+        return "".join(text)
@@ -0,0 +1,75 @@
+"""
+Matching in the hook process against the index the backend publishes in
+shared memory (src/common/flat_index.py). With it, keys never travel to the
+backend: only a match does, as MSG_EXPAND, for placeholder resolution.
+
+Only the global index is published. While the foreground app has profiles
+of its own (Profile.target_apps, pushed with GATING), the hook sends keys
+to the backend as without a shared index, so profile snippets still fire.
+"""
+import logging
+from typing import Iterable, Optional, Tuple
+from src.common.constants import RESET_KEYS
+from src.common.flat_index import SharedIndexReader
+from src.common.models import app_key
+from src.engine.buffer import KeyBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class LocalMatcher:
+    def __init__(self, name: str, capacity: int = 100):
+        self.reader = SharedIndexReader(name)
+        self.buffer = KeyBuffer(capacity)
+        self.profile_apps = frozenset()
+        self.app: Optional[str] = None
+        self._profiled = False
+
+    @property
+    def ready(self) -> bool:
+        """
+        False until the backend published a generation, and while the
+        foreground app has profiles; keys go to the backend meanwhile.
+        """
+        return not self._profiled and self.reader.current() is not None
+
+    def set_profile_apps(self, apps: Iterable[str]) -> None:
+        """From the backend's GATING message, on the hook's reader thread."""
+        self.profile_apps = frozenset(app_key(app) for app in apps)
+        self._profiled = app_key(self.app) in self.profile_apps
+
+    def set_app(self, app: Optional[str]) -> None:
+        """On the drain thread, before the first key typed in app."""
+        self.app = app
+        self._profiled = app_key(app) in self.profile_apps
+
+    def process_key(self, char: Optional[str], is_backspace: bool) -> Optional[Tuple[str, int]]:
+        """(snippet id, chars to delete) when the key completes an abbreviation."""
+        index = self.reader.current()
+        if is_backspace:
+            self.buffer.pop()
+            return None
+        if not char:
+            return None
+        self.buffer.push(char)
+        if index is None:
+            return None
+        found = index.match(self.buffer, char)
+        if found is None:
+            return None
+        entry, chars_to_delete = found
+        self.buffer.clear()
+        return index.entry_id(entry), chars_to_delete
+
+    def other_key(self, vk_code: int) -> None:
+        """A key that types nothing: caret moves forget the typed chars, as KEY_RESET does in the backend."""
+        if vk_code in RESET_KEYS:
+            self.buffer.clear()
+
+    def reset(self) -> None:
+        """Forgets the typed chars and the mapped index (backend restart)."""
+        self.buffer.clear()
+        self.reader.close()
+
+    def close(self) -> None:
+        self.reader.close()
@@ -0,0 +1,83 @@
+"""
+Sequence numbers for the hook -> backend -> hook pipeline.
+
+The hook never waits for the backend: every key is numbered and passed on,
+and the user keeps typing. A REPLACE_TEXT carries the number of the key
+that completed the abbreviation, so by the time it arrives the application
+may show more keys than the backend counted. PipelineTracker remembers the
+recent keys and reconciles each reply with them:
+
+*   nothing typed since: the reply applies as is;
+*   only characters typed since: they are deleted too and typed again after
+    the expansion;
+*   a backspace, or a key that moves the caret, since: the text around the
+    caret is no longer what the backend saw, the reply is dropped;
+*   the key is older than the remembered history: dropped as well.
+"""
+import logging
+import threading
+from collections import deque
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Keys remembered; a reply older than this many keys is discarded
+HISTORY = 256
+# Characters typed past a match that are still re-typed; longer tails are discarded
+MAX_DRIFT = 32
+
+# Marks a key that moved the caret (arrows, Home/End, Page Up/Down, Delete)
+MOVED = ""
+BACKSPACE = None
+
+
+class PipelineTracker:
+    def __init__(self, history: int = HISTORY, max_drift: int = MAX_DRIFT):
+        self.max_drift = max_drift
+        self._keys = deque(maxlen=history)  # (seq, char | BACKSPACE | MOVED)
+        self._next = 1
+        self._lock = threading.Lock()
+        self.adjusted = 0
+        self.discarded = 0
+
+    def typed(self, char: Optional[str], is_backspace: bool) -> int:
+        """Numbers a key the hook passes on to the backend."""
+        return self._add(BACKSPACE if is_backspace else char)
+
+    def moved(self) -> None:
+        """A caret-moving key: never sent, but it invalidates older replies."""
+        self._add(MOVED)
+
+    def _add(self, key) -> int:
+        with self._lock:
+            seq = self._next
+            self._next += 1
+            self._keys.append((seq, key))
+            return seq
+
+    def reconcile(
+        self, seq: int, backspaces: int, text: str, cursor_offset: int
+    ) -> Optional[Tuple[int, str, int]]:
+        """The replacement to perform for a reply to key `seq`, or None if it is stale."""
+        if not seq:
+            return backspaces, text, cursor_offset  # Not tied to a key
+        with self._lock:
+            keys = self._keys
+            if keys and keys[0][0] > seq + 1:
+                logger.info(f"Dropping reply to key {seq}: older than the key history")
+                self.discarded += 1
+                return None
+            # Answered keys are done with; replies come back in key order
+            while keys and keys[0][0] <= seq:
+                keys.popleft()
+            tail = [key for _, key in keys]
+
+        if not tail:
+            return backspaces, text, cursor_offset
+        if BACKSPACE in tail or MOVED in tail or len(tail) > self.max_drift:
+            logger.info(f"Dropping reply to key {seq}: {len(tail)} keys since changed the text")
+            self.discarded += 1
+            return None
+        self.adjusted += 1
+        # The caret ends after the re-typed chars, where the user left it
+        return backspaces + len(tail), text + "".join(tail), 0
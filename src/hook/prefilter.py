@@ -0,0 +1,186 @@
+"""
+Hook-side key filter driven by the backend's relevance table.
+
+A key can only complete an expansion if the text then ends with the last
+few chars of an abbreviation and its trigger (the table's "fire"
+suffixes). Every other key changes the backend's buffer but never
+produces a reply, so the filter holds those back and sends them in one
+KEY_EVENTS frame with the next key that does end a fire suffix; ordinary
+prose rarely sends anything.
+
+Held back keys are also reduced on the way:
+
+*   a backspace over a held back key cancels it, both are dropped;
+*   a run of chars outside the abbreviation alphabet (no abbreviation
+    can match across one) goes out as a single KEY_BARRIER event whose
+    vk_code is the run length, so backspacing into the run still lines up;
+*   a buffer-reset key (caret moves) drops everything held back and sends a
+    KEY_RESET, only if the backend may have a non-empty buffer.
+
+Until the first table arrives, every key is sent as it comes.
+"""
+import logging
+from collections import deque
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+from src.common.constants import KEY_BARRIER, KEY_RESET
+
+logger = logging.getLogger(__name__)
+
+# Held back keys at most before they are sent anyway
+MAX_PENDING = 64
+# Typed entries remembered for backspacing over sent keys, as many as the backend buffer holds
+MIRROR_SIZE = 100
+# A barrier's run length travels in the 16-bit vk_code field
+MAX_RUN = 0xFFFF
+
+Event = Tuple[Optional[str], bool, int, int]
+
+
+class RelevanceTable:
+    """The backend's table (src/engine/core.py relevance_table), ready for lookups."""
+
+    __slots__ = ("version", "alphabet", "suffix_len", "suffixes", "relevant", "reset_keys")
+
+    def __init__(self, version: int, alphabet: str, suffixes: Iterable[str], suffix_len: int, reset_keys=()):
+        self.version = version
+        self.alphabet: FrozenSet[str] = frozenset(alphabet)
+        self.suffixes: FrozenSet[str] = frozenset(suffixes)
+        self.suffix_len = suffix_len
+        # Trigger keys are relevant even when no abbreviation contains them
+        self.relevant = self.alphabet | {suffix[-1] for suffix in self.suffixes}
+        self.reset_keys: FrozenSet[int] = frozenset(reset_keys)
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "RelevanceTable":
+        return cls(
+            payload.get("version", 0),
+            payload.get("alphabet", ""),
+            payload.get("suffixes", ()),
+            payload.get("suffix_len", 1),
+            payload.get("reset_keys", ()),
+        )
+
+
+class KeyFilter:
+    """
+    key() is called for every key-down, from one thread, and returns the
+    events to send now. set_table() may be called from another thread.
+
+    The mirror holds what the typed text ends with, as the backend will
+    see it once everything pending is sent: a str per relevant char, an
+    int per run of irrelevant ones. Its last `unsent` entries are still in
+    pending; pending may start with backspaces that remove sent entries.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING, mirror_size: int = MIRROR_SIZE):
+        # Pending entries must never fall off the mirror
+        if mirror_size <= max_pending:
+            raise ValueError("mirror_size must exceed max_pending")
+        self.table: Optional[RelevanceTable] = None
+        self.max_pending = max_pending
+        self.mirror: deque = deque(maxlen=mirror_size)
+        self.pending: List[Event] = []
+        self.unsent = 0
+        self.dirty = False  # The backend may hold chars since the last reset
+        self.keys = 0
+        self.sent = 0
+
+    def set_table(self, table: RelevanceTable) -> None:
+        if self.table is None or table.version != self.table.version:
+            logger.info(
+                f"Key filter table v{table.version}: {len(table.relevant)} relevant chars, "
+                f"{len(table.suffixes)} fire suffixes"
+            )
+        self.table = table
+
+    def key(self, char: Optional[str], is_backspace: bool, vk_code: int, seq: int) -> List[Event]:
+        table = self.table
+        if not is_backspace and not char:
+            if table is not None and vk_code in table.reset_keys:
+                return self.reset()
+            return []
+        self.keys += 1
+        if table is None:
+            return self._emit([(char, is_backspace, vk_code, seq)])
+
+        if is_backspace:
+            self._backspace(vk_code, seq)
+        elif char in table.relevant:
+            self.mirror.append(char)
+            self.pending.append((char, False, vk_code, seq))
+            self.unsent += 1
+            if self._fires(table):
+                return self.flush()
+        else:
+            self._irrelevant(seq)
+
+        if len(self.pending) >= self.max_pending:
+            return self.flush()
+        return []
+
+    def _fires(self, table: RelevanceTable) -> bool:
+        """Whether the mirror ends with a fire suffix; runs end the search."""
+        mirror = self.mirror
+        suffixes = table.suffixes
+        suffix = ""
+        for i in range(1, min(table.suffix_len, len(mirror)) + 1):
+            entry = mirror[-i]
+            if entry.__class__ is not str:
+                return False
+            suffix = entry + suffix
+            if suffix in suffixes:
+                return True
+        return False
+
+    def _irrelevant(self, seq: int) -> None:
+        mirror = self.mirror
+        if mirror and isinstance(mirror[-1], int) and mirror[-1] < MAX_RUN:
+            mirror[-1] += 1
+            if self.unsent:
+                # The run is still pending: lengthen its barrier
+                _, _, run, _ = self.pending[-1]
+                self.pending[-1] = (KEY_BARRIER, False, run + 1, seq)
+            # Otherwise the backend already has a barrier there; no new event
+            return
+        mirror.append(1)
+        self.pending.append((KEY_BARRIER, False, 1, seq))
+        self.unsent += 1
+
+    def _backspace(self, vk_code: int, seq: int) -> None:
+        mirror = self.mirror
+        if mirror and isinstance(mirror[-1], int) and mirror[-1] > 1:
+            # Inside a run: still a barrier either way
+            mirror[-1] -= 1
+            if self.unsent:
+                _, _, run, last = self.pending[-1]
+                self.pending[-1] = (KEY_BARRIER, False, run - 1, last)
+            return
+        if mirror:
+            mirror.pop()
+        if self.unsent:
+            self.pending.pop()
+            self.unsent -= 1
+        else:
+            self.pending.append((None, True, vk_code, seq))
+
+    def flush(self) -> List[Event]:
+        events, self.pending = self.pending, []
+        self.unsent = 0
+        return self._emit(events)
+
+    def reset(self) -> List[Event]:
+        """The caret moved (or keys were missed): forget the text, reset the backend's buffer."""
+        self.mirror.clear()
+        self.pending = []
+        self.unsent = 0
+        if not self.dirty:
+            return []
+        self.dirty = False
+        self.sent += 1
+        return [(KEY_RESET, False, 0, 0)]
+
+    def _emit(self, events: List[Event]) -> List[Event]:
+        if events:
+            self.dirty = True
+            self.sent += len(events)
+        return events
@@ -0,0 +1,94 @@
+"""
+Key event sender for the hook.
+
+The hook callback only queues the key; a sender thread writes it to the
+backend. While a write is in flight (the backend is slow to read, or a burst
+of keys arrives faster than one frame each), keys pile up in the queue and
+the next write sends all of them as one KEY_EVENTS frame. A single queued key
+still goes out as a plain KEY_EVENT, so normal typing is unchanged. Other
+messages share the queue, so they stay in order with the keys.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Keys per KEY_EVENTS frame at most
+MAX_BATCH = 64
+
+
+class KeySender:
+    def __init__(self, client, max_batch: int = MAX_BATCH):
+        self.client = client
+        self.max_batch = max_batch
+        self._queue = deque()
+        self._wakeup = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.frames_sent = 0
+        # monotonic() when the write in flight started, 0 between writes
+        self.sending_since = 0.0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="key-sender", daemon=True)
+        self._thread.start()
+
+    def submit(self, char: Optional[str], is_backspace: bool, vk_code: int, seq: int = 0):
+        """Called from the hook callback: never touches the socket."""
+        with self._wakeup:
+            self._queue.append((char, is_backspace, vk_code, seq))
+            self._wakeup.notify()
+
+    def submit_many(self, events):
+        """Queues (char, is_backspace, vk_code, seq) events together, so they share a frame."""
+        with self._wakeup:
+            self._queue.extend(events)
+            self._wakeup.notify()
+
+    def submit_message(self, msg: dict):
+        with self._wakeup:
+            self._queue.append(msg)
+            self._wakeup.notify()
+
+    def _next_batch(self):
+        """A list of key tuples, or one message dict."""
+        with self._wakeup:
+            while not self._queue and self._running:
+                self._wakeup.wait()
+            queue = self._queue
+            if queue and isinstance(queue[0], dict):
+                return queue.popleft()
+            batch = []
+            while queue and len(batch) < self.max_batch and not isinstance(queue[0], dict):
+                batch.append(queue.popleft())
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return  # Stopped and drained
+            self.sending_since = time.monotonic()
+            try:
+                if isinstance(batch, dict):
+                    self.client.send(batch)
+                else:
+                    self.client.send_key_events(batch)
+                self.frames_sent += 1
+            except Exception as e:
+                logger.error(f"Failed to send to backend: {e}")
+            finally:
+                self.sending_since = 0.0
+
+    def stop(self):
+        """Sends what is still queued, then stops the thread."""
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
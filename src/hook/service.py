@@ -1,10 +1,25 @@
 import logging
+import os
 import sys
 import time
 import threading
 
-from src.common.ipc import IPCClient, MSG_KEY_EVENT, MSG_REPLACE_TEXT, MSG_PING
-from src.common.constants import IPC_PORT
+from src.common.ipc import IPCClient
+from src.common.constants import (
+    MSG_EXPAND,
+    MSG_FOREGROUND,
+    MSG_GATING,
+    MSG_RELEVANCE,
+    MSG_REPLACE_TEXT,
+    SHARED_INDEX_ENV,
+)
+from src.hook.foreground import ForegroundTracker
+from src.hook.gating import Gate
+from src.hook.handoff import HookDispatcher
+from src.hook.injection import Injector
+from src.hook.pipeline import PipelineTracker
+from src.hook.prefilter import KeyFilter, RelevanceTable
+from src.hook.sender import KeySender
 from src.hook.win32_input import Win32Input
 
 # Configure Logging
@@ -18,11 +33,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger("HookService")
 
+# Page Up/Down, End, Home, arrows, Delete: after these a pending reply's
+# backspaces would land somewhere else
+CARET_KEYS = frozenset(range(0x21, 0x29)) | {0x2E}
+
 
 class HookService:
-    def __init__(self):
-        self.client = IPCClient(IPC_PORT)
+    def __init__(self, backend_sock=None, shared_index=None):
+        # An inherited socketpair end from src/main.py, else the default transport
+        self.client = IPCClient.from_socket(backend_sock) if backend_sock is not None else IPCClient()
+        # Keys queued by the hook callback and written by a sender thread
+        self.sender = KeySender(self.client)
+        # Numbers keys so late replies can be corrected or dropped
+        self.pipeline = PipelineTracker()
+        # Holds back keys that cannot complete an expansion (once the backend sent its table)
+        self.filter = KeyFilter()
+        # Match locally against the backend's shared index, when it publishes one
+        self.local = None
+        shared_index = shared_index or os.environ.get(SHARED_INDEX_ENV)
+        if shared_index:
+            from src.hook.local_match import LocalMatcher
+
+            self.local = LocalMatcher(shared_index)
+        # Paused, or an ignored app in front: keys stop at the hook callback
+        self.gate = Gate()
+        # The hook callback only queues keys; _on_key_event runs on its drain thread
+        self.dispatcher = HookDispatcher(
+            self._on_key_event,
+            busy_since=lambda: self.sender.sending_since,
+            on_gap=self._on_keys_lost,
+            gate=self.gate,
+            on_focus=self._on_focus,
+        )
         self.win32 = Win32Input()
+        self.injector = Injector(self.win32, self.win32.planner)
+        # Focus-change notifications feed the gate and, through the drain
+        # thread, the backend's profile choice
+        self.foreground = ForegroundTracker(self.win32, self._on_foreground)
+        self.reported_app = None
         self.connected = False
         self.lock = threading.Lock()
 
@@ -34,14 +82,19 @@ class HookService:
 
         # Start reader thread to receive messages from backend
         if self.connected:
+            self.sender.start()
+            self.sender.submit_message({"type": MSG_RELEVANCE, "payload": {}})
             read_thread = threading.Thread(target=self._read_loop, daemon=True)
             read_thread.start()
 
         # Install keyboard hook
-        ok = self.win32.install_hook(self._on_key_event)
+        self.dispatcher.start()
+        ok = self.win32.install_hook(self.dispatcher.on_event)
         if not ok:
             logger.error("Could not install keyboard hook, exiting hook service.")
+            self.dispatcher.stop()
             return
+        self.foreground.start()
 
         # Pump Windows messages (blocking)
         try:
@@ -50,7 +103,11 @@ class HookService:
             pass
         finally:
             self.win32.uninstall_hook()
+            self.dispatcher.stop()
+            self.sender.stop()
             self.client.close()
+            if self.local:
+                self.local.close()
 
     def _connect_to_backend(self):
         try:
@@ -63,101 +120,123 @@ class HookService:
 
     def _read_loop(self):
         """Reads messages from the backend."""
-        from src.common.ipc import recv_msg
-
         while self.connected:
-            msg = recv_msg(self.client.sock)
+            msg = self.client.recv()
             if msg:
                 self._handle_backend_message(msg)
             else:
                 logger.error("Connection to backend lost.")
                 self.connected = False
+                if self.local:
+                    self.local.reset()
                 break
 
     def _handle_backend_message(self, msg):
         msg_type = msg.get("type")
         payload = msg.get("payload", {})
 
-        if msg_type == MSG_REPLACE_TEXT:
-            backspaces = payload.get("backspaces", 0)
-            text = payload.get("text", "")
-            cursor_offset = payload.get("cursor_offset", 0)
+        if msg_type == MSG_RELEVANCE:
+            self.filter.set_table(RelevanceTable.from_payload(payload))
+
+        elif msg_type == MSG_GATING:
+            self.gate.set_settings(payload.get("engine_enabled", True), payload.get("ignored_apps", ()))
+            if self.local:
+                self.local.set_profile_apps(payload.get("profile_apps", ()))
+
+        elif msg_type == MSG_REPLACE_TEXT:
+            # Keys typed since the matched one are still in the application
+            replacement = self.pipeline.reconcile(
+                payload.get("seq", 0),
+                payload.get("backspaces", 0),
+                payload.get("text", ""),
+                payload.get("cursor_offset", 0),
+            )
+            if replacement is None:
+                return
+            backspaces, text, cursor_offset = replacement
 
             logger.info(
                 f"Replacing: backspaces={backspaces}, text='{text}', cursor_offset={cursor_offset}"
             )
 
-            # 1) Delete abbreviation + trigger
-            self.win32.send_backspace(backspaces)
-
-            # 2) Clipboard-based insertion for reliability
-            try:
-                import pyperclip
-
-                old_clip = None
-                try:
-                    old_clip = pyperclip.paste()
-                except Exception:
-                    old_clip = None
-
-                pyperclip.copy(text)
-                logger.info("Clipboard set; sending Ctrl+V")
-                self.win32.send_ctrl_v()
-
-                # Optional: restore clipboard
-                if old_clip is not None:
-                    try:
-                        pyperclip.copy(old_clip)
-                    except Exception:
-                        pass
-            except Exception as e:
-                logger.error(f"Clipboard-based insertion failed: {e}")
-                # Fallback to direct key injection
-                self.win32.send_text(text)
-
-            # 3) Cursor offset (move left if needed)
-            if cursor_offset > 0:
-                for _ in range(cursor_offset):
-                    # VK_LEFT = 0x25
-                    self.win32._send_key(0x25)
+            # Backspaces, text and caret moves go out in one SendInput call
+            self.injector.replace(backspaces, text, cursor_offset)
+
+    def _on_keys_lost(self):
+        """Keys went by unseen (watchdog pass-through or a full queue)."""
+        self.pipeline.moved()
+        if self.local:
+            self.local.buffer.clear()
+        self._send_keys(self.filter.reset())
+
+    def _on_foreground(self, app):
+        """Focus source callback, on the hook thread: keep it to attribute writes."""
+        self.gate.set_app(app)
+        self.dispatcher.focus_changed()
+
+    def _on_focus(self):
+        """
+        On the drain thread, before the first key typed in a new window: the
+        text typed in the last one is of no use. The backend hears of app
+        switches only, and clears its buffer on them.
+        """
+        self.pipeline.moved()
+        app = self.foreground.app
+        if self.local:
+            self.local.buffer.clear()
+            self.local.set_app(app)
+        if app == self.reported_app:
+            self._send_keys(self.filter.reset())
+            return
+        self.filter.reset()
+        self.reported_app = app
+        self.sender.submit_message({"type": MSG_FOREGROUND, "payload": {"app": app}})
+
+    def _send_keys(self, events):
+        if len(events) == 1:
+            self.sender.submit(*events[0])
+        elif events:
+            self.sender.submit_many(events)
 
     def _on_key_event(self, vk_code, scan_code, is_down):
         """
-        Callback from Win32 Hook.
-        Returns True to block key, False to pass.
+        Handles a key from the hook, on the dispatcher's drain thread.
+        Self-injected keys never get here.
         """
-        # Log at INFO so we can see keystrokes in the terminal
-        logger.info(
-            f"Hook key event: vk={vk_code} scan={scan_code} is_down={is_down}"
-        )
+        logger.debug(f"Hook key event: vk={vk_code} scan={scan_code} is_down={is_down}")
 
         if not self.connected:
-            return False
+            return
 
         # Only care about key-down events
         if not is_down:
-            return False
+            return
 
         # Map VK to char (very basic) or mark as backspace
         char = self._vk_to_char(vk_code)
         is_backspace = (vk_code == 0x08)  # VK_BACK
 
         if char is not None or is_backspace:
-            msg = {
-                "type": MSG_KEY_EVENT,
-                "payload": {
-                    "char": char,
-                    "is_backspace": is_backspace,
-                    "vk_code": vk_code,
-                },
-            }
-            try:
-                self.client.send(msg)
-            except Exception as e:
-                logger.error(f"Failed to send key event to backend: {e}")
-
-        # We never block keys in v1
-        return False
+            seq = self.pipeline.typed(char, is_backspace)
+            local = self.local
+            if local is not None and local.ready:
+                # The backend is out of the per-key path; it only renders matches
+                match = local.process_key(char, is_backspace)
+                if match:
+                    snippet_id, backspaces = match
+                    self.sender.submit_message({
+                        "type": MSG_EXPAND,
+                        "payload": {"id": snippet_id, "backspaces": backspaces, "seq": seq},
+                    })
+            else:
+                # Queued only; the sender thread batches whatever piles up
+                self._send_keys(self.filter.key(char, is_backspace, vk_code, seq))
+        else:
+            if vk_code in CARET_KEYS:
+                self.pipeline.moved()
+            if self.local is not None:
+                self.local.other_key(vk_code)
+            self._send_keys(self.filter.key(None, False, vk_code, 0))
 
     def _vk_to_char(self, vk):
         # Basic mapping for A-Z, 0-9, space, enter
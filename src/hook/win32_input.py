@@ -2,6 +2,8 @@ import ctypes
 from ctypes import wintypes
 import logging
 
+from src.hook.injection import PASTE_EVENTS, InjectionPlan, InjectionPlanner
+
 logger = logging.getLogger(__name__)
 
 user32 = ctypes.windll.user32
@@ -25,6 +27,10 @@ VK_RIGHT = 0x27
 VK_DOWN = 0x28
 VK_V = 0x56
 
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+EVENT_SYSTEM_FOREGROUND = 0x0003
+WINEVENT_OUTOFCONTEXT = 0x0000
+
 # Structs
 class KBDLLHOOKSTRUCT(ctypes.Structure):
     _fields_ = [
@@ -36,21 +42,71 @@ class KBDLLHOOKSTRUCT(ctypes.Structure):
     ]
 
 
-# Callback type
+# SendInput structures; the union needs its largest member (MOUSEINPUT) for
+# sizeof(INPUT) to match what SendInput expects
+INPUT_KEYBOARD = 1
+
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [
+        ("dx", wintypes.LONG),
+        ("dy", wintypes.LONG),
+        ("mouseData", wintypes.DWORD),
+        ("dwFlags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ctypes.c_size_t),
+    ]
+
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ("wVk", wintypes.WORD),
+        ("wScan", wintypes.WORD),
+        ("dwFlags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ctypes.c_size_t),
+    ]
+
+
+class HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [
+        ("uMsg", wintypes.DWORD),
+        ("wParamL", wintypes.WORD),
+        ("wParamH", wintypes.WORD),
+    ]
+
+
+class INPUT(ctypes.Structure):
+    class _INPUT(ctypes.Union):
+        _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT), ("hi", HARDWAREINPUT)]
+
+    _anonymous_ = ("_input",)
+    _fields_ = [("type", wintypes.DWORD), ("_input", _INPUT)]
+
+
+# Callback types
 HOOKPROC = ctypes.CFUNCTYPE(
     ctypes.c_longlong, ctypes.c_int, wintypes.WPARAM, wintypes.LPARAM
 )
+WINEVENTPROC = ctypes.WINFUNCTYPE(
+    None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND, wintypes.LONG,
+    wintypes.LONG, wintypes.DWORD, wintypes.DWORD,
+)
 
 
 class Win32Input:
     def __init__(self):
         self.hook_id = None
         self.hook_proc = None  # Keep reference to prevent GC
+        self.focus_hook = None
+        self.focus_proc = None
+        self.planner = InjectionPlanner()
 
     def install_hook(self, callback):
         """
         Installs the low-level keyboard hook.
-        callback: function(vk_code, scan_code, is_down) -> bool (True to block, False to pass)
+        callback: function(vk_code, scan_code, flags, is_down) -> bool (True to block, False to pass)
+        It runs on the hook thread and must return quickly (see src/hook/handoff.py).
         """
 
         def low_level_handler(nCode, wParam, lParam):
@@ -58,15 +114,10 @@ class Win32Input:
                 kb_struct = ctypes.cast(lParam, ctypes.POINTER(KBDLLHOOKSTRUCT)).contents
                 is_down = wParam in (WM_KEYDOWN, WM_SYSKEYDOWN)
 
-                # Log a bit to see events
-                logger.info(
-                    f"Hook key event: vk={kb_struct.vkCode} scan={kb_struct.scanCode} is_down={is_down}"
-                )
-
-                # Call user callback
+                # No logging here: this runs on every key, within the hook timeout
                 try:
                     should_block = callback(
-                        kb_struct.vkCode, kb_struct.scanCode, is_down
+                        kb_struct.vkCode, kb_struct.scanCode, kb_struct.flags, is_down
                     )
                 except Exception as e:
                     logger.error(f"Error in hook callback: {e}")
@@ -101,6 +152,29 @@ class Win32Input:
             user32.UnhookWindowsHookEx(self.hook_id)
             self.hook_id = None
             logger.info("Keyboard hook uninstalled")
+        if self.focus_hook:
+            user32.UnhookWinEvent(self.focus_hook)
+            self.focus_hook = None
+
+    def watch(self, callback):
+        """
+        Calls callback(hwnd) whenever the foreground window changes. Like the
+        keyboard hook, it is delivered by pump_messages on this thread.
+        """
+
+        def on_foreground(hook, event, hwnd, id_object, id_child, thread, time_ms):
+            try:
+                callback(hwnd)
+            except Exception as e:
+                logger.error(f"Error in focus callback: {e}")
+
+        self.focus_proc = WINEVENTPROC(on_foreground)
+        self.focus_hook = user32.SetWinEventHook(
+            EVENT_SYSTEM_FOREGROUND, EVENT_SYSTEM_FOREGROUND, 0, self.focus_proc, 0, 0,
+            WINEVENT_OUTOFCONTEXT,
+        )
+        if not self.focus_hook:
+            logger.error(f"Failed to watch foreground changes: {ctypes.GetLastError()}")
 
     def pump_messages(self):
         """
@@ -112,81 +186,46 @@ class Win32Input:
             user32.TranslateMessage(ctypes.byref(msg))
             user32.DispatchMessageW(ctypes.byref(msg))
 
+    def send(self, plan):
+        """
+        Injects an InjectionPlan with one SendInput call. The INPUT array is
+        built on first use and kept on the plan, so cached plans reuse it.
+        Returns the number of events Windows accepted.
+        """
+        native = plan.native
+        if native is None:
+            native = (INPUT * len(plan.events))()
+            for slot, (vk, scan, flags) in zip(native, plan.events):
+                slot.type = INPUT_KEYBOARD
+                slot.ki.wVk = vk
+                slot.ki.wScan = scan
+                slot.ki.dwFlags = flags
+            plan.native = native
+        if not len(native):
+            return 0
+        return user32.SendInput(len(native), native, ctypes.sizeof(INPUT))
+
+    def get_clipboard(self):
+        import pyperclip
+
+        return pyperclip.paste()
+
+    def set_clipboard(self, text):
+        import pyperclip
+
+        pyperclip.copy(text)
+
     def send_backspace(self, count=1):
         """Sends N backspaces."""
-        for _ in range(count):
-            self._send_key(VK_BACK)
+        self.send(self.planner.plan(count, ""))
 
     def send_text(self, text):
-        """
-        Sends text using SendInput (Unicode), char by char.
-        """
-        for char in text:
-            self._send_unicode_char(char)
+        """Types text as Unicode keystrokes, in one SendInput call."""
+        self.send(self.planner.plan(0, text, paste=False))
 
     def send_ctrl_v(self):
         """Send Ctrl+V (paste)."""
-        # Key down CTRL
-        user32.keybd_event(VK_CONTROL, 0, 0, 0)
-        # Key down V
-        user32.keybd_event(VK_V, 0, 0, 0)
-        # Key up V
-        user32.keybd_event(VK_V, 0, 2, 0)
-        # Key up CTRL
-        user32.keybd_event(VK_CONTROL, 0, 2, 0)
-
-    def _send_key(self, vk_code):
-        # Down
-        user32.keybd_event(vk_code, 0, 0, 0)
-        # Up
-        user32.keybd_event(vk_code, 0, 2, 0)
-
-    def _send_unicode_char(self, char):
-        INPUT_KEYBOARD = 1
-        KEYEVENTF_UNICODE = 0x0004
-        KEYEVENTF_KEYUP = 0x0002
-
-        class KEYBDINPUT(ctypes.Structure):
-            _fields_ = [
-                ("wVk", wintypes.WORD),
-                ("wScan", wintypes.WORD),
-                ("dwFlags", wintypes.DWORD),
-                ("time", wintypes.DWORD),
-                ("dwExtraInfo", ctypes.c_ulonglong),
-            ]
-
-        class INPUT(ctypes.Structure):
-            class _INPUT(ctypes.Union):
-                _fields_ = [("ki", KEYBDINPUT)]
-
-            _anonymous_ = ("_input",)
-            _fields_ = [("type", wintypes.DWORD), ("_input", _INPUT)]
-
-        # Key down
-        x = INPUT(
-            type=INPUT_KEYBOARD,
-            ki=KEYBDINPUT(
-                wVk=0,
-                wScan=ord(char),
-                dwFlags=KEYEVENTF_UNICODE,
-                time=0,
-                dwExtraInfo=0,
-            ),
-        )
-        user32.SendInput(1, ctypes.byref(x), ctypes.sizeof(x))
-
-        # Key up
-        y = INPUT(
-            type=INPUT_KEYBOARD,
-            ki=KEYBDINPUT(
-                wVk=0,
-                wScan=ord(char),
-                dwFlags=KEYEVENTF_UNICODE | KEYEVENTF_KEYUP,
-                time=0,
-                dwExtraInfo=0,
-            ),
-        )
-        user32.SendInput(1, ctypes.byref(y), ctypes.sizeof(y))
+        self.send(InjectionPlan(PASTE_EVENTS))
 
     def get_foreground_window_title(self):
         hwnd = user32.GetForegroundWindow()
@@ -194,3 +233,24 @@ class Win32Input:
         buff = ctypes.create_unicode_buffer(length + 1)
         user32.GetWindowTextW(hwnd, buff, length + 1)
         return buff.value
+
+    def foreground_window(self):
+        return user32.GetForegroundWindow()
+
+    def process_name(self, hwnd):
+        """Executable file name of the process owning hwnd, or None (e.g. elevated processes)."""
+        pid = wintypes.DWORD()
+        user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        if not pid.value:
+            return None
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid.value)
+        if not handle:
+            return None
+        try:
+            size = wintypes.DWORD(260)
+            buff = ctypes.create_unicode_buffer(size.value)
+            if not kernel32.QueryFullProcessImageNameW(handle, 0, buff, ctypes.byref(size)):
+                return None
+            return buff.value.rsplit("\\", 1)[-1]
+        finally:
+            kernel32.CloseHandle(handle)
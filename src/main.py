@@ -13,17 +13,17 @@ PARENT_DIR = os.path.dirname(ROOT_DIR)
 if PARENT_DIR not in sys.path:
     sys.path.insert(0, PARENT_DIR)
 
-def run_backend():
+def run_backend(hook_sock=None):
     from src.engine.service import BackendService
-    service = BackendService()
+    service = BackendService(hook_sock=hook_sock)
     service.start()
 
-def run_hook():
+def run_hook(backend_sock=None):
     # Hook needs to be in a separate process, but ideally a separate executable or script
     # to avoid GIL issues and for stability.
     # For now, we run it as a function in a Process.
     from src.hook.service import HookService
-    service = HookService()
+    service = HookService(backend_sock)
     service.start()
 
 def run_gui():
@@ -33,16 +33,30 @@ def run_gui():
     ft.app(target=main)
 
 if __name__ == "__main__":
+    import socket
+    from src.common.constants import SHARED_INDEX_ENV
+
+    # Hook-side matching: one shared memory name per run, inherited by both children
+    if os.environ.get(SHARED_INDEX_ENV) == "1":
+        os.environ[SHARED_INDEX_ENV] = f"text_expander_{os.getpid()}"
+
+    # Hook <-> Backend get a private, already connected socketpair: no
+    # listener to find, no connect race, and the fastest local transport.
+    # multiprocessing hands each end to its child process.
+    backend_end, hook_end = socket.socketpair()
+
     # Start Backend
-    backend_process = multiprocessing.Process(target=run_backend, daemon=True)
+    backend_process = multiprocessing.Process(target=run_backend, args=(backend_end,), daemon=True)
     backend_process.start()
     
     # Wait for backend to init
     time.sleep(1)
     
     # Start Hook
-    hook_process = multiprocessing.Process(target=run_hook, daemon=True)
+    hook_process = multiprocessing.Process(target=run_hook, args=(hook_end,), daemon=True)
     hook_process.start()
+    backend_end.close()
+    hook_end.close()
     
     # Start GUI (Blocking)
     try:
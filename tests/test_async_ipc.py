@@ -0,0 +1,141 @@
+import asyncio
+import socket
+import threading
+import time
+
+from src.common import constants
+from src.common.async_ipc import AsyncIPCClient, AsyncIPCServer
+from src.common.ipc import IPCClient, encode_msg, encode_replace_text
+from src.common.transport import TCPTransport
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+        self.threads = set()
+        self.connection = None
+
+    def handle(self, msg, sock):
+        self.threads.add(threading.current_thread().name)
+        self.messages.append(msg)
+        if msg["type"] == constants.MSG_PING:
+            sock.sendall(encode_msg({"type": constants.MSG_PONG}))
+
+    def handle_key(self, char, is_backspace, vk_code, seq, sock):
+        self.connection = sock
+        sock.sendall(encode_replace_text(1, char.upper(), 0))
+
+
+def test_keys_on_loop_control_messages_on_worker():
+    recorder = Recorder()
+    server = AsyncIPCServer(handler=recorder.handle, key_handler=recorder.handle_key)
+    backend_end, hook_end = socket.socketpair()
+    server.serve(backend_end)
+    hook = IPCClient.from_socket(hook_end)
+    try:
+        hook.send_key_event("a")
+        assert hook.recv()["payload"]["text"] == "A"
+        hook.send({"type": constants.MSG_PING})
+        assert hook.recv() == {"type": constants.MSG_PONG, "payload": {}}
+        assert recorder.threads and all(t.startswith("ipc-control") for t in recorder.threads)
+    finally:
+        server.stop()
+    # Clean shutdown closes the connection instead of abandoning it
+    assert hook.recv() is None
+    hook.close()
+    assert not server.thread.is_alive()
+
+
+def test_disconnect_is_reported_on_the_loop():
+    lost = []
+    server = AsyncIPCServer(
+        handler=lambda msg, sock: None,
+        on_disconnect=lambda sock: lost.append((sock, threading.get_ident() == server.loop_thread_id)),
+    )
+    backend_end, hook_end = socket.socketpair()
+    connection = server.serve(backend_end)
+    try:
+        hook_end.close()
+        _wait_for(lambda: lost)
+    finally:
+        server.stop()
+    assert lost == [(connection, True)]
+
+
+def test_many_clients_on_one_loop():
+    recorder = Recorder()
+    transport = TCPTransport(port=0)
+    server = AsyncIPCServer(handler=recorder.handle, key_handler=recorder.handle_key, transport=transport)
+    server.start()
+    clients = [IPCClient(transport=transport) for _ in range(5)]
+    try:
+        for client in clients:
+            client.connect()
+        for i, client in enumerate(clients):
+            client.send_key_event("abcde"[i])
+        assert [c.recv()["payload"]["text"] for c in clients] == list("ABCDE")
+        assert len(server.connections) == 5
+    finally:
+        for client in clients:
+            client.close()
+        server.stop()
+
+
+def test_congested_client_drops_pings_then_gets_cut_off():
+    recorder = Recorder()
+    server = AsyncIPCServer(handler=recorder.handle, key_handler=recorder.handle_key, max_pending=4)
+    backend_end, hook_end = socket.socketpair()
+    hook_end.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    server.serve(backend_end)
+    hook = IPCClient.from_socket(hook_end)
+    try:
+        hook.send_key_event("a")
+        _wait_for(lambda: recorder.connection is not None)
+        connection = recorder.connection
+        # The hook never reads: big replies pile up until the connection congests
+        big = encode_replace_text(0, "x" * 32 * 1024)
+        while not connection.congested:
+            connection.sendall(big)
+            time.sleep(0.001)
+        pong = encode_msg({"type": constants.MSG_PONG})
+        for _ in range(10):
+            connection.sendall(pong)
+        _wait_for(lambda: connection.dropped == 10)
+        for _ in range(5):
+            connection.sendall(big)
+        _wait_for(lambda: connection.closed.done())
+        assert not server.connections
+    finally:
+        hook.close()
+        server.stop()
+
+
+def test_async_client_round_trip():
+    recorder = Recorder()
+    transport = TCPTransport(port=0)
+    server = AsyncIPCServer(handler=recorder.handle, key_handler=recorder.handle_key, transport=transport)
+    server.start()
+
+    async def talk():
+        client = AsyncIPCClient(transport=transport)
+        await client.connect()
+        await client.send_key_event("z")
+        reply = await client.recv()
+        await client.send({"type": constants.MSG_PING})
+        pong = await client.recv()
+        await client.close()
+        return reply, pong
+
+    try:
+        reply, pong = asyncio.run(talk())
+    finally:
+        server.stop()
+    assert reply["payload"]["text"] == "Z"
+    assert pong["type"] == constants.MSG_PONG
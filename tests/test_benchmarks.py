@@ -0,0 +1,45 @@
+import logging
+
+from benchmarks.bench_engine import compare, run_suite
+from benchmarks.synthetic import generate_library, generate_typing_stream
+
+
+def test_synthetic_library_is_reproducible():
+    first = generate_library(50, seed=7)
+    second = generate_library(50, seed=7)
+    assert [s.abbreviation for s in first] == [s.abbreviation for s in second]
+    assert len({(s.abbreviation, s.trigger) for s in first}) == 50
+    assert len(generate_typing_stream(first, 300, seed=7)) == 300
+
+
+def test_suite_reports_and_compares():
+    logging.disable(logging.CRITICAL)
+    try:
+        report = run_suite([50], keys=500)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    result = report["results"][0]
+    assert result["size"] == 50
+    assert result["per_key"]["count"] == 500
+    assert result["per_key"]["p50_us"] <= result["per_key"]["p99_us"] <= result["per_key"]["max_us"]
+    assert compare(report, report, threshold=0.0) == []
+
+
+def test_ipc_suite_reports_both_formats():
+    from benchmarks.bench_ipc import run_suite as run_ipc_suite
+
+    report = run_ipc_suite(events=200)
+    key = report["key_event"]
+    assert key["binary_frame_bytes"] < key["legacy_frame_bytes"]
+    assert set(report["stream_keys_per_sec"]) == {"legacy", "binary"}
+    assert set(report["burst_keys_per_sec"]) == {"1", "8", "64"}
+    assert report["prefilter"]["frames"] < report["prefilter"]["keys"] / 2
+
+
+def test_injection_suite_uses_one_call_per_replacement():
+    from benchmarks.bench_injection import run_suite as run_injection_suite
+
+    report = run_injection_suite(expansions=200, library_size=20)
+    assert report["os_calls_per_replacement"]["planned"] == 1.0
+    assert report["per_replacement"]["cached"]["cache_hit_rate"] > 0.5
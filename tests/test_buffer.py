@@ -0,0 +1,24 @@
+from src.engine.buffer import KeyBuffer
+
+
+def test_push_pop_rewinds():
+    buf = KeyBuffer(8)
+    for ch in "abc":
+        buf.push(ch)
+    buf.pop()
+    assert str(buf) == "ab"
+    buf.push("x")
+    assert str(buf) == "abx"
+
+
+def test_wraps_at_capacity():
+    buf = KeyBuffer(3)
+    for ch in "abcde":
+        buf.push(ch)
+    assert len(buf) == 3
+    assert str(buf) == "cde"
+    assert buf.last() == "e"
+    buf.clear()
+    assert len(buf) == 0
+    buf.pop()  # no-op on empty buffer
+    assert str(buf) == ""
@@ -63,3 +63,60 @@ def test_cursor_placeholder():
     _, text, cursor = result
     assert "{{cursor}}" not in text
     assert cursor == 0 # It's at the end
+
+def test_backspace_rewinds_buffer():
+    store = MockStore()
+    store.snippets.append(Snippet(abbreviation="btw", expansion="by the way", trigger=TriggerType.SPACE))
+
+    engine = ExpansionEngine(store)
+
+    for ch in "btx":
+        engine.process_key(ch)
+    assert engine.process_key("", is_backspace=True) is None
+    engine.process_key("w")
+
+    result = engine.process_key(" ")
+    assert result == (4, "by the way", 0)
+
+def _keys(text):
+    """'\b' stands for backspace."""
+    return [(None, True) if ch == "\b" else (ch, False) for ch in text]
+
+def test_process_keys_matches_like_process_key():
+    store = MockStore()
+    store.snippets.append(Snippet(abbreviation="btw", expansion="by the way", trigger=TriggerType.SPACE))
+    store.snippets.append(Snippet(abbreviation="omg", expansion="oh my god", trigger=TriggerType.NONE))
+
+    keys = _keys("so btw\bw ok omg")
+    expected = []
+    engine = ExpansionEngine(store)
+    for position, (char, is_backspace) in enumerate(keys):
+        result = engine.process_key(char or "", is_backspace)
+        if result:
+            expected.append((position, result))
+
+    batched = ExpansionEngine(store)
+    assert batched.process_keys(keys) == expected
+    assert [p for p, _ in expected] == [8, 14]
+
+def test_batch_replacement_rewrites_keys_typed_after_expansion():
+    from src.engine.core import batch_replacement
+
+    store = MockStore()
+    store.snippets.append(Snippet(abbreviation="btw", expansion="by the way", trigger=TriggerType.SPACE))
+    engine = ExpansionEngine(store)
+
+    # The app already shows "xbtw ok": "xb" stays, the rest becomes "y the wayok"
+    keys = _keys("xbtw ok")
+    assert batch_replacement(keys, engine.process_keys(keys)) == (5, "y the wayok", 0)
+
+    # Trigger typed in this batch, abbreviation in the previous one
+    engine.process_keys(_keys("btw"))
+    keys = _keys(" ")
+    assert batch_replacement(keys, engine.process_keys(keys)) == (4, "by the way", 0)
+
+    # Backspace right after the trigger eats into the expansion, not the abbreviation
+    engine.process_keys(_keys("btw"))
+    keys = _keys(" \b")
+    assert batch_replacement(keys, engine.process_keys(keys)) == (3, "by the wa", 0)
+    assert batch_replacement(keys, []) is None
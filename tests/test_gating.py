@@ -0,0 +1,78 @@
+from src.common.models import Settings
+from src.engine.store import Store
+from src.engine.sync import change_record
+from src.hook.foreground import FakeFocus, ForegroundTracker
+from src.hook.gating import Gate
+from src.hook.handoff import HookDispatcher
+from tests.test_handoff import _drive, _wait_for
+
+
+def make_hook(apps, window, **settings):
+    """Gate, tracker and dispatcher wired as HookService does, over a FakeFocus."""
+    focus = FakeFocus(apps, window)
+    gate = Gate(**settings)
+    seen = []
+    dispatcher = HookDispatcher(
+        lambda vk, scan, is_down: seen.append(vk),
+        on_gap=lambda: seen.append("gap"),
+        on_focus=lambda: seen.append(("focus", tracker.app)),
+        gate=gate,
+    )
+
+    def on_foreground(app):
+        gate.set_app(app)
+        dispatcher.focus_changed()
+
+    tracker = ForegroundTracker(focus, on_foreground)
+    tracker.start()
+    dispatcher.start()
+    return focus, gate, dispatcher, seen
+
+
+def test_ignored_app_keys_stop_at_the_callback():
+    focus, gate, dispatcher, seen = make_hook(
+        {1: "code.exe", 2: "KeePass.exe", 3: "code.exe"}, 1, ignored_apps=["keepass.exe"]
+    )
+    try:
+        _drive(dispatcher, [65, 66])
+        focus.switch(2)
+        assert not gate.open
+        _drive(dispatcher, [67, 68, 69])
+        focus.switch(3)
+        _drive(dispatcher, [70])
+        assert _wait_for(lambda: seen and seen[-1] == 70)
+    finally:
+        dispatcher.stop()
+    assert dispatcher.gated == 3
+    # Another window of the same app still counts as a focus change
+    assert seen == [("focus", "code.exe"), 65, 66, ("focus", "code.exe"), "gap", 70]
+
+
+def test_pause_and_resume_from_settings_push():
+    focus, gate, dispatcher, seen = make_hook({1: "notepad.exe"}, 1)
+    try:
+        _drive(dispatcher, [65])
+        gate.set_settings(False, [])
+        _drive(dispatcher, [66, 67])
+        gate.set_settings(True, ["code.exe"])
+        assert gate.open
+        _drive(dispatcher, [68])
+        assert _wait_for(lambda: seen and seen[-1] == 68)
+    finally:
+        dispatcher.stop()
+    assert seen == [("focus", "notepad.exe"), 65, "gap", 68]
+
+
+def test_settings_persist_and_reach_listeners(tmp_path):
+    path = str(tmp_path / "store.json")
+    gui = Store(path)
+    gui.update_settings(Settings(engine_enabled=False, ignored_apps=["keepass.exe"]))
+    backend = Store(path)
+    assert not backend.settings.engine_enabled
+
+    changes = []
+    backend.subscribe(lambda op, data: changes.append((op, data)))
+    gui.update_settings(gui.settings.model_copy(update={"engine_enabled": True}))
+    backend.apply_records([change_record("settings", gui.settings)])
+    assert changes == [("settings", gui.settings)]
+    assert backend.settings.ignored_apps == ["keepass.exe"]
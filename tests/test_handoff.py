@@ -0,0 +1,89 @@
+import threading
+import time
+
+from src.hook.handoff import LLKHF_INJECTED, HookDispatcher, KeyRing, Watchdog, pack, unpack
+
+
+def _drive(dispatcher, keys, interval=0.0):
+    """Simulates the hook thread: one on_event call per key down."""
+    for vk in keys:
+        assert dispatcher.on_event(vk, vk + 100, 0, True) is False
+        if interval:
+            time.sleep(interval)
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_pack_round_trip():
+    assert unpack(pack(0x41, 0x1E, LLKHF_INJECTED, True)) == (0x41, 0x1E, LLKHF_INJECTED, True)
+    assert unpack(pack(0x08, 0xE00E, 0, False)) == (0x08, 0xE00E, 0, False)
+
+
+def test_ring_drops_when_full_and_keeps_order():
+    ring = KeyRing(4)
+    assert all(ring.put(i, 0.0) for i in range(4))
+    assert not ring.put(4, 0.0)
+    assert ring.take(0) == [0, 1, 2, 3]
+    assert ring.put(5, 0.0) and ring.take(0) == [5]
+    assert ring.dropped == 1
+
+
+def test_keys_reach_handler_in_order_and_injected_are_filtered():
+    seen = []
+    dispatcher = HookDispatcher(lambda vk, scan, is_down: seen.append((vk, scan, is_down)))
+    dispatcher.start()
+    try:
+        dispatcher.on_event(0x08, 0x0E, LLKHF_INJECTED, True)
+        _drive(dispatcher, range(65, 91))
+        assert _wait_for(lambda: len(seen) == 26)
+    finally:
+        dispatcher.stop()
+    assert seen == [(vk, vk + 100, True) for vk in range(65, 91)]
+    assert dispatcher.injected == 1
+
+
+def test_stalled_handler_trips_pass_through_and_recovers():
+    release = threading.Event()
+    seen, gaps = [], []
+
+    def handler(vk, scan, is_down):
+        if vk == 65:
+            release.wait(2)
+        seen.append(vk)
+
+    dispatcher = HookDispatcher(
+        handler, on_gap=lambda: gaps.append(len(seen)), watchdog=Watchdog(stall_timeout=0.05)
+    )
+    dispatcher.start()
+    try:
+        _drive(dispatcher, [65])
+        assert _wait_for(lambda: dispatcher.ring.drained_at > 0 and not len(dispatcher.ring))
+        _drive(dispatcher, [66, 67], interval=0.1)
+        # 66 waited behind the stuck handler past the timeout: 67 passes through
+        assert dispatcher.watchdog.passthrough and dispatcher.passed == 1
+        release.set()
+        assert _wait_for(lambda: seen == [65, 66])
+        _drive(dispatcher, [68])
+        assert _wait_for(lambda: seen == [65, 66, 68])
+    finally:
+        dispatcher.stop()
+    assert not dispatcher.watchdog.passthrough
+    assert dispatcher.watchdog.trips == 1
+    assert gaps == [2]
+
+
+def test_backend_stall_trips_pass_through():
+    busy = [0.0]
+    dispatcher = HookDispatcher(lambda *key: None, busy_since=lambda: busy[0],
+                                watchdog=Watchdog(stall_timeout=0.05))
+    busy[0] = time.monotonic() - 1
+    _drive(dispatcher, [65])
+    assert dispatcher.watchdog.passthrough and len(dispatcher.ring) == 0
+    busy[0] = 0.0
+    _drive(dispatcher, [66])
+    assert not dispatcher.watchdog.passthrough and len(dispatcher.ring) == 1
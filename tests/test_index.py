@@ -0,0 +1,76 @@
+import threading
+
+from src.engine.core import ExpansionEngine
+from src.engine.index import IndexPublisher
+from src.common.models import Snippet, TriggerType
+from tests.test_engine import MockStore
+
+
+def test_published_snapshot_is_never_mutated():
+    btw = Snippet(abbreviation="btw", expansion="by the way", trigger=TriggerType.SPACE)
+    publisher = IndexPublisher([btw])
+    before = publisher.current
+
+    omg = Snippet(abbreviation="omg", expansion="oh my god")
+    publisher.upsert(omg)
+    publisher.delete(btw.id)
+    assert publisher.wait(timeout=5)
+    publisher.stop()
+
+    after = publisher.current
+    assert after.version > before.version
+    assert before.matcher.match("btw ", TriggerType.SPACE) is not None
+    assert before.matcher.match("omg") is None
+    assert after.matcher.match("btw ", TriggerType.SPACE) is None
+    assert after.matcher.match("omg")[0].id == omg.id
+
+
+def test_in_place_edit_keeps_precedence():
+    first = Snippet(abbreviation="sig", expansion="first")
+    second = Snippet(abbreviation="sig", expansion="second")
+    publisher = IndexPublisher([first, second])
+
+    first.expansion = "first, edited"
+    publisher.upsert(first)
+    assert publisher.wait(timeout=5)
+    publisher.stop()
+
+    entry, _ = publisher.current.matcher.match("sig")
+    assert entry.template.text == "first, edited"
+
+
+def test_engine_follows_store_changes():
+    store = MockStore()
+    engine = ExpansionEngine(store)
+    assert engine.process_key("x") is None
+
+    snippet = Snippet(abbreviation="ty", expansion="thank you")
+    engine.on_store_change("upsert", snippet)
+    assert engine.index.wait(timeout=5)
+    engine.index.stop()
+
+    engine.process_key("t")
+    assert engine.process_key("y") == (2, "thank you", 0)
+
+
+def test_concurrent_changes_start_one_worker():
+    before = set(threading.enumerate())
+    publisher = IndexPublisher()
+    snippets = [Snippet(abbreviation=f"k{i}", expansion=str(i)) for i in range(8)]
+    barrier = threading.Barrier(len(snippets))
+
+    def submit(snippet):
+        barrier.wait()
+        publisher.upsert(snippet)
+
+    threads = [threading.Thread(target=submit, args=(s,)) for s in snippets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert publisher.wait(timeout=5)
+    workers = [t for t in set(threading.enumerate()) - before if t.name == "IndexPublisher"]
+    publisher.stop()
+
+    assert len(workers) == 1
+    assert all(publisher.current.matcher.match(f"k{i}") for i in range(8))
@@ -0,0 +1,66 @@
+import time
+
+from src.hook.injection import (
+    KEYEVENTF_KEYUP,
+    VK_BACK,
+    VK_LEFT,
+    InjectionPlanner,
+    Injector,
+    RecordingBackend,
+)
+
+
+def _injector(clipboard="old", paste_threshold=10):
+    backend = RecordingBackend(clipboard)
+    planner = InjectionPlanner(paste_threshold=paste_threshold)
+    return backend, Injector(backend, planner, restore_delay=0)
+
+
+def test_replacement_is_one_call():
+    backend, injector = _injector(paste_threshold=64)
+    injector.replace(0, "x btw ", 0)
+    injector.replace(4, "by the way 😀\n", 3)
+
+    assert len(backend.calls) == 2
+    events = backend.calls[1]
+    assert events[:2] == ((VK_BACK, 0, 0), (VK_BACK, 0, KEYEVENTF_KEYUP))
+    assert sum(1 for vk, _, flags in events if vk == VK_LEFT and not flags & KEYEVENTF_KEYUP) == 3
+    assert backend.typed_text() == "x by the way 😀\n"
+    assert backend.clipboard_writes == []
+
+
+def test_long_text_is_pasted_and_clipboard_restored():
+    backend, injector = _injector()
+    plan = injector.replace(3, "a much longer expansion", 0)
+    assert plan.paste == "a much longer expansion"
+    assert len(plan) == 2 * 3 + 4
+    assert backend.clipboard_writes == ["a much longer expansion", "old"]
+    assert backend.typed_text() == "a much longer expansion"
+
+
+def test_quick_pastes_restore_the_users_clipboard():
+    backend = RecordingBackend("old")
+    injector = Injector(backend, InjectionPlanner(paste_threshold=10), restore_delay=0.05)
+    injector.replace(0, "first long expansion", 0)
+    injector.replace(0, "second long expansion", 0)
+    assert backend.clipboard == "second long expansion"
+    time.sleep(0.2)
+    assert backend.clipboard_writes == ["first long expansion", "second long expansion", "old"]
+    assert backend.typed_text() == "first long expansionsecond long expansion"
+
+
+def test_no_clipboard_falls_back_to_typing():
+    backend, injector = _injector(clipboard=None)
+    plan = injector.replace(0, "a much longer expansion", 0)
+    assert plan.paste is None
+    assert backend.typed_text() == "a much longer expansion"
+
+
+def test_plans_are_cached():
+    planner = InjectionPlanner(cache_size=2)
+    first = planner.plan(4, "by the way ", 0)
+    assert planner.plan(4, "by the way ", 0) is first
+    planner.plan(1, "a", 0)
+    planner.plan(1, "b", 0)
+    assert planner.plan(4, "by the way ", 0) is not first
+    assert (planner.hits, planner.misses) == (1, 4)
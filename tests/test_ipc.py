@@ -0,0 +1,213 @@
+import os
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from src.common import constants
+from src.common.ipc import (
+    HEADER,
+    IPCClient,
+    IPCServer,
+    MessageReader,
+    ProtocolError,
+    encode_key_event,
+    encode_msg,
+    encode_replace_text,
+    recv_msg,
+)
+from src.common.transport import (
+    HAS_AF_UNIX,
+    TCPTransport,
+    UnixTransport,
+    default_transport,
+    parse_transport,
+)
+from src.hook.sender import KeySender
+
+
+def test_message_types_come_from_one_registry():
+    from src.common import ipc
+
+    assert ipc.MSG_KEY_EVENT is constants.MSG_KEY_EVENT == "KEY_EVENT"
+    assert len(set(constants.MESSAGE_CODES.values())) == len(constants.MESSAGE_CODES)
+
+
+def test_round_trip_and_split_frames():
+    messages = [
+        {"type": constants.MSG_KEY_EVENT,
+         "payload": {"char": "é", "is_backspace": False, "vk_code": 69, "seq": 1}},
+        {"type": constants.MSG_KEY_EVENT,
+         "payload": {"char": None, "is_backspace": True, "vk_code": 8, "seq": 2}},
+        {"type": constants.MSG_REPLACE_TEXT,
+         "payload": {"backspaces": 4, "text": "by the way ✓", "cursor_offset": 2, "seq": 2}},
+        {"type": constants.MSG_RELOAD_CONFIG, "payload": {"records": [{"op": "delete", "id": "x"}]}},
+        {"type": constants.MSG_PING, "payload": {}},
+        {"type": constants.MSG_KEY_EVENTS, "payload": {"events": [
+            {"char": "a", "is_backspace": False, "vk_code": 65, "seq": 3},
+            {"char": None, "is_backspace": True, "vk_code": 8, "seq": 4},
+        ]}},
+    ]
+    stream = b"".join(encode_msg(m) for m in messages)
+    assert len(encode_key_event("a")) == HEADER.size + 11
+
+    a, b = socket.socketpair()
+    try:
+        # Deliver in awkward pieces: frames straddle recv boundaries
+        for i in range(0, len(stream), 5):
+            a.sendall(stream[i:i + 5])
+        a.close()
+        reader = MessageReader(b, size=16)
+        received = []
+        while True:
+            msg = reader.read()
+            if msg is None:
+                break
+            received.append(msg)
+    finally:
+        b.close()
+    assert received == messages
+
+
+def test_version_mismatch_is_rejected():
+    a, b = socket.socketpair()
+    try:
+        a.sendall(struct.pack(">IBB", 0, constants.PROTOCOL_VERSION + 1, 5))
+        with pytest.raises(ProtocolError):
+            MessageReader(b).read()
+        a.sendall(encode_msg({"type": constants.MSG_PONG}))
+        assert recv_msg(b) == {"type": constants.MSG_PONG, "payload": {}}
+    finally:
+        a.close()
+        b.close()
+
+
+def _echo_server(transport=None):
+    def reply(char, is_backspace, vk_code, seq, sock):
+        sock.sendall(encode_replace_text(1, char.upper(), 0))
+
+    return IPCServer(handler=lambda msg, sock: None, key_handler=reply, transport=transport)
+
+
+def _round_trip(client):
+    client.send_key_event("q", False, 81)
+    return client.recv()["payload"]["text"]
+
+
+def test_inherited_socketpair_round_trip():
+    backend_end, hook_end = socket.socketpair()
+    server = _echo_server()
+    server.serve(backend_end)
+    client = IPCClient.from_socket(hook_end)
+    try:
+        assert _round_trip(client) == "Q"
+    finally:
+        client.close()
+        server.stop()
+
+
+@pytest.mark.skipif(not HAS_AF_UNIX, reason="no AF_UNIX")
+def test_unix_transport_replaces_stale_socket(tmp_path):
+    path = str(tmp_path / "ipc.sock")
+    with open(path, "w"):
+        pass  # what a crashed backend leaves behind
+    server = _echo_server(UnixTransport(path))
+    server.start()
+    client = IPCClient(transport=UnixTransport(path))
+    try:
+        client.connect()
+        assert _round_trip(client) == "Q"
+    finally:
+        client.close()
+        server.stop()
+    assert not os.path.exists(path)
+
+
+@pytest.mark.skipif(not HAS_AF_UNIX, reason="no AF_UNIX")
+def test_unix_transport_leaves_a_live_socket_alone(tmp_path):
+    path = str(tmp_path / "ipc.sock")
+    server = _echo_server(UnixTransport(path))
+    server.start()
+    second = UnixTransport(path)
+    client = IPCClient(transport=UnixTransport(path))
+    try:
+        with pytest.raises(OSError):
+            second.listen()
+        second.close()
+        client.connect()
+        assert _round_trip(client) == "Q"
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_tcp_transport_disables_nagle():
+    transport = TCPTransport(port=0)
+    server = _echo_server(transport)
+    server.start()
+    client = IPCClient(transport=transport)
+    try:
+        client.connect()
+        assert client.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        assert _round_trip(client) == "Q"
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_parse_transport(monkeypatch):
+    tcp = parse_transport("tcp:127.0.0.1:5001")
+    assert (tcp.host, tcp.port) == ("127.0.0.1", 5001)
+    with pytest.raises(ValueError):
+        parse_transport("pipe")
+    monkeypatch.setenv(constants.IPC_TRANSPORT_ENV, "tcp")
+    assert isinstance(default_transport(), TCPTransport)
+
+
+class SlowClient:
+    """Blocks the first send until released, like a backend that stopped reading."""
+
+    def __init__(self):
+        self.frames = []
+        self.release = threading.Event()
+
+    def send_key_events(self, events):
+        self.release.wait(2)
+        self.frames.append(list(events))
+
+
+def test_key_sender_coalesces_while_a_send_is_in_flight():
+    client = SlowClient()
+    sender = KeySender(client, max_batch=4)
+    sender.start()
+    for ch in "abcdef":
+        sender.submit(ch, False, ord(ch))
+    client.release.set()
+    sender.stop()
+    chars = [[e[0] for e in frame] for frame in client.frames]
+    assert sum(chars, []) == list("abcdef")
+    assert len(chars) < 6 and max(len(c) for c in chars) <= 4
+
+
+def test_key_events_frames_reach_keys_handler():
+    received = []
+    server = IPCServer(
+        handler=lambda msg, sock: None,
+        key_handler=lambda *key: received.append([key[:4]]),
+        keys_handler=lambda events, sock: received.append(events),
+    )
+    backend_end, hook_end = socket.socketpair()
+    server.serve(backend_end)
+    client = IPCClient.from_socket(hook_end)
+    try:
+        client.send_key_events([("a", False, 65, 1)])
+        client.send_key_events([("b", False, 66, 2), (None, True, 8, 3)])
+        deadline = time.monotonic() + 2
+        while len(received) < 2 and time.monotonic() < deadline:
+            time.sleep(0.005)
+    finally:
+        client.close()
+        server.stop()
+    assert received == [[("a", False, 65, 1)], [("b", False, 66, 2), (None, True, 8, 3)]]
@@ -0,0 +1,100 @@
+from src.engine.matcher import SnippetMatcher
+from src.common.models import Snippet, TriggerType
+
+
+def test_longest_match_wins():
+    short = Snippet(abbreviation="ty", expansion="thank you", trigger=TriggerType.NONE)
+    long = Snippet(abbreviation="xty", expansion="thanks, x", trigger=TriggerType.NONE)
+    matcher = SnippetMatcher([short, long])
+
+    entry, chars_to_delete = matcher.match("hello xty")
+    assert entry.id == long.id
+    assert chars_to_delete == 3
+
+    entry, _ = matcher.match("hello ty")
+    assert entry.id == short.id
+
+
+def test_triggered_match_is_partitioned():
+    space = Snippet(abbreviation="btw", expansion="by the way", trigger=TriggerType.SPACE)
+    enter = Snippet(abbreviation="btw", expansion="BY THE WAY", trigger=TriggerType.ENTER)
+    matcher = SnippetMatcher([space, enter])
+
+    assert matcher.match("btw") is None
+    entry, chars_to_delete = matcher.match("btw ", TriggerType.SPACE)
+    assert (entry.id, chars_to_delete) == (space.id, 4)
+    entry, chars_to_delete = matcher.match("btw\n", TriggerType.ENTER)
+    assert (entry.id, chars_to_delete) == (enter.id, 4)
+
+
+def test_inactive_and_duplicates():
+    inactive = Snippet(abbreviation="sig", expansion="old", is_active=False)
+    first = Snippet(abbreviation="sig", expansion="first")
+    second = Snippet(abbreviation="sig", expansion="second")
+    matcher = SnippetMatcher([inactive, first, second])
+
+    assert matcher.size == 1
+    assert matcher.match("sig")[0].id == first.id
+
+
+def test_folded_paths_split_on_insert_and_update():
+    long = Snippet(abbreviation="xbtw", expansion="long")
+    matcher = SnippetMatcher([long])
+    assert matcher.match("btw") is None
+
+    short = Snippet(abbreviation="btw", expansion="short")
+    other = Snippet(abbreviation="ztw", expansion="other")
+    updated = matcher.updated([short, other])
+
+    assert updated.match("xbtw")[0].id == long.id
+    assert updated.match("a btw")[0].id == short.id
+    assert updated.match("ztw")[0].id == other.id
+    assert updated.match("tw") is None
+    # The original matcher still only knows the long one
+    assert matcher.match("a btw") is None
+    assert matcher.match("xbtw")[0].id == long.id
+
+
+def test_record_table_dedups_bodies():
+    first = Snippet(abbreviation="a1", expansion="same text")
+    second = Snippet(abbreviation="a2", expansion="same text", trigger=TriggerType.SPACE)
+    matcher = SnippetMatcher([first, second])
+    table = matcher.table
+
+    assert table.body_ids[0] == table.body_ids[1]
+    assert table.template(0) is table.template(1)
+    assert table.trigger(1) == TriggerType.SPACE and table.is_active(1)
+
+
+def test_updates_share_the_id_map_without_mutating_it():
+    snippets = [Snippet(abbreviation=f"k{i}", expansion=str(i)) for i in range(5)]
+    matcher = SnippetMatcher(snippets)
+    versions = [matcher]
+    for i in range(3):
+        versions.append(versions[-1].updated(deletes=[snippets[i].id]))
+
+    assert versions[-1].locations.base is matcher.locations.base
+    assert [v.match("k0") is not None for v in versions] == [True, False, False, False]
+    assert versions[2].match("k2") is not None and versions[3].match("k2") is None
+    assert versions[3].alphabet() == frozenset("k34")
+
+
+def test_duplicates_keep_store_order_across_edits():
+    first = Snippet(abbreviation="old", expansion="first")
+    second = Snippet(abbreviation="sig", expansion="second")
+    matcher = SnippetMatcher([first, second])
+
+    # first moves onto second's abbreviation, then is switched off and on again
+    first = first.model_copy(update={"abbreviation": "sig"})
+    matcher = matcher.updated([first])
+    assert matcher.match("sig")[0].id == first.id
+    matcher = matcher.updated([first.model_copy(update={"is_active": False})])
+    assert matcher.match("sig")[0].id == second.id
+    matcher = matcher.updated([first])
+    assert matcher.match("sig")[0].id == first.id
+    # What a rebuild from the store's list picks
+    assert SnippetMatcher([first, second]).match("sig")[0].id == first.id
+
+    third = Snippet(abbreviation="sig", expansion="third")
+    matcher = matcher.updated([third], [first.id])
+    assert matcher.match("sig")[0].id == second.id
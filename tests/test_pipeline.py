@@ -0,0 +1,51 @@
+from src.hook.pipeline import PipelineTracker
+
+
+def _typed(tracker, text):
+    return [tracker.typed(char, False) for char in text]
+
+
+def test_reply_in_order_applies_unchanged():
+    tracker = PipelineTracker()
+    seqs = _typed(tracker, "btw ")
+    assert tracker.reconcile(seqs[-1], 4, "by the way ", 0) == (4, "by the way ", 0)
+    assert tracker.adjusted == tracker.discarded == 0
+
+
+def test_keys_typed_since_are_retyped():
+    tracker = PipelineTracker()
+    seqs = _typed(tracker, "btw ")
+    _typed(tracker, "ok")
+    assert tracker.reconcile(seqs[-1], 4, "by the way ", 2) == (6, "by the way ok", 0)
+    assert tracker.adjusted == 1
+    # The tail was consumed by that reply
+    assert tracker.reconcile(tracker.typed("x", False), 1, "y", 0) == (1, "y", 0)
+
+
+def test_backspace_or_caret_move_since_discards():
+    tracker = PipelineTracker()
+    seq = _typed(tracker, "btw ")[-1]
+    tracker.typed(None, True)
+    assert tracker.reconcile(seq, 4, "by the way ", 0) is None
+
+    seq = _typed(tracker, "brb ")[-1]
+    tracker.moved()
+    assert tracker.reconcile(seq, 4, "be right back ", 0) is None
+    assert tracker.discarded == 2
+
+
+def test_drift_and_history_limits():
+    tracker = PipelineTracker(history=8, max_drift=3)
+    seq = _typed(tracker, "a ")[-1]
+    _typed(tracker, "wxyz")
+    assert tracker.reconcile(seq, 2, "alpha ", 0) is None
+
+    seq = tracker.typed("q", False)
+    _typed(tracker, "0123456789")
+    assert tracker.reconcile(seq, 1, "quit", 0) is None
+
+
+def test_unnumbered_reply_passes_through():
+    tracker = PipelineTracker()
+    _typed(tracker, "abc")
+    assert tracker.reconcile(0, 1, "x", 1) == (1, "x", 1)
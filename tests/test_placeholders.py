@@ -0,0 +1,74 @@
+import sys
+import threading
+import time
+
+from src.common.models import Settings, Snippet
+from src.engine.core import ExpansionEngine, PendingExpansion, settle
+from src.engine.placeholders import CACHEABLE, PURE, SLOW, Placeholder, PlaceholderResolver
+from src.engine.templates import ExpansionTemplate
+from tests.test_engine import MockStore
+
+
+def test_pure_and_cacheable_placeholders_are_cached():
+    resolver = PlaceholderResolver()
+    calls = []
+    minute = [0]
+    resolver.registry.register(Placeholder("greet", lambda arg: calls.append(arg) or f"hi {arg}", PURE))
+    resolver.registry.register(
+        Placeholder("tick", lambda _: calls.append("tick") or str(minute[0]), CACHEABLE, lambda: minute[0])
+    )
+    template = ExpansionTemplate("{{greet:bob}} {{tick}}")
+    assert resolver.render(template) == ("hi bob 0", 0)
+    assert resolver.render(template) == ("hi bob 0", 0)
+    minute[0] = 1
+    assert resolver.render(template) == ("hi bob 1", 0)
+    assert sorted(calls) == ["bob", "tick", "tick"]
+
+
+def test_hanging_placeholder_degrades_only_its_slot():
+    resolver = PlaceholderResolver()
+    release = threading.Event()
+    resolver.registry.register(
+        Placeholder("stuck", lambda _: release.wait(5) and "late", SLOW, timeout=0.05, fallback="?")
+    )
+    resolver.registry.register(Placeholder("quick", lambda _: "ok", SLOW, timeout=1))
+    started = time.monotonic()
+    future = resolver.submit(ExpansionTemplate("{{quick}} {{stuck}}{{cursor}}!"))
+    # submit never waits on the slow slots
+    assert time.monotonic() - started < 0.05
+    assert future.result(timeout=1) == ("ok ?!", 1)
+    assert resolver.timeouts == 1
+    release.set()
+
+
+def test_engine_defers_slow_expansions():
+    release = threading.Event()
+    store = MockStore()
+    store.snippets.append(Snippet(abbreviation="sl", expansion="<{{slowval}}>"))
+    store.snippets.append(Snippet(abbreviation="fa", expansion="fast"))
+    engine = ExpansionEngine(store)
+    engine.resolver.registry.register(Placeholder("slowval", lambda _: release.wait(5) and "v", SLOW, timeout=2))
+    engine.defer_slow = True
+
+    keys = [(c, False) for c in "slfa"]
+    expansions = engine.process_keys(keys)
+    assert isinstance(expansions[0][1], PendingExpansion)
+    assert expansions[1] == (3, (2, "fast", 0))
+    settled = settle(expansions)
+    assert not settled.done()
+    release.set()
+    assert settled.result(timeout=2) == [(1, (2, "<v>", 0)), (3, (2, "fast", 0))]
+
+
+def test_script_placeholder_runs_configured_command():
+    store = MockStore()
+    store.settings = Settings(commands={
+        "hello": f'"{sys.executable}" -c "print(\'hello\')"',
+        "hang": f'"{sys.executable}" -c "import time; time.sleep(10)"',
+    })
+    engine = ExpansionEngine(store)
+    engine.resolver.commands.timeout = 0.5
+    assert engine.resolver.render(ExpansionTemplate("[{{script:hello}}]")) == ("[hello]", 0)
+    started = time.monotonic()
+    assert engine.resolver.render(ExpansionTemplate("[{{script:hang}}]{{script:missing}}")) == ("[]", 0)
+    assert time.monotonic() - started < 5
@@ -0,0 +1,120 @@
+import random
+
+from benchmarks.synthetic import generate_library, generate_typing_stream
+from src.common.constants import KEY_BARRIER, KEY_RESET
+from src.common.models import Snippet, TriggerType
+from src.engine.core import ExpansionEngine, batch_replacement, relevance_table
+from src.hook.prefilter import KeyFilter, RelevanceTable
+from tests.test_engine import MockStore
+
+
+class _Screen:
+    """The text field the hook types into."""
+
+    def __init__(self):
+        self.text = []
+
+    def key(self, char, is_backspace):
+        if is_backspace:
+            if self.text:
+                self.text.pop()
+        else:
+            self.text.append(char)
+
+    def replace(self, result):
+        backspaces, text, _ = result
+        del self.text[max(0, len(self.text) - backspaces):]
+        self.text.extend(text)
+
+
+def _engine(snippets):
+    store = MockStore()
+    store.snippets = snippets
+    return ExpansionEngine(store)
+
+
+def _stream(library, keys, seed):
+    """Synthetic typing with runs of punctuation, some of them backspaced over."""
+    rng = random.Random(seed)
+    events = []
+    for event in generate_typing_stream(library, keys, seed=seed):
+        events.append(event)
+        if rng.random() < 0.08:
+            run = rng.randint(1, 3)
+            events.extend((rng.choice("'-?!\""), False) for _ in range(run))
+            if rng.random() < 0.4:
+                events.extend([(None, True)] * rng.randint(1, run + 2))
+    return events
+
+
+def test_filtered_keys_expand_like_every_key():
+    library = generate_library(300, seed=5)
+    for snippet in library:
+        snippet.expansion = f"[{snippet.abbreviation}]"
+    stream = _stream(library, 6000, seed=5)
+
+    baseline, screen = _engine(library), _Screen()
+    for char, is_backspace in stream:
+        screen.key(char, is_backspace)
+        result = baseline.process_key(char or "", is_backspace)
+        if result:
+            screen.replace(result)
+
+    engine, filtered = _engine(library), _Screen()
+    key_filter = KeyFilter()
+    key_filter.set_table(RelevanceTable.from_payload(relevance_table(engine.index.current)))
+    frames = 0
+    for seq, (char, is_backspace) in enumerate(stream, 1):
+        filtered.key(char, is_backspace)
+        events = key_filter.key(char, is_backspace, 0, seq)
+        if events:
+            frames += 1
+            result = batch_replacement(events, engine.process_keys(events))
+            if result:
+                filtered.replace(result)
+
+    assert "".join(filtered.text) == "".join(screen.text)
+    assert frames < len(stream) / 3
+    assert key_filter.sent < len(stream)
+
+
+def test_barriers_and_backspaces():
+    key_filter = KeyFilter()
+    # "btw" and "t", both triggered by space
+    key_filter.set_table(RelevanceTable(1, "btw", ["tw ", "t "], 3, reset_keys=[0x25]))
+    assert key_filter.key("b", False, 0, 1) == []
+    assert key_filter.key("x", False, 0, 2) == []
+    assert key_filter.key("y", False, 0, 3) == []
+    # Both backspaces land in the held back run and cancel it
+    assert key_filter.key(None, True, 8, 4) == []
+    assert key_filter.key(None, True, 8, 5) == []
+    assert key_filter.key("t", False, 0, 6) == []
+    assert key_filter.key("?", False, 0, 7) == []
+    assert key_filter.key("t", False, 0, 8) == []
+    assert key_filter.key(" ", False, 0, 9) == [
+        ("b", False, 0, 1), ("t", False, 0, 6), (KEY_BARRIER, False, 1, 7),
+        ("t", False, 0, 8), (" ", False, 0, 9),
+    ]
+    # Into what was sent: real backspaces, held back until the next fire
+    for seq in (10, 11, 12):
+        assert key_filter.key(None, True, 8, seq) == []
+    assert key_filter.key("w", False, 0, 13) == []
+    assert key_filter.key(" ", False, 0, 14) == [
+        (None, True, 8, 10), (None, True, 8, 11), (None, True, 8, 12),
+        ("w", False, 0, 13), (" ", False, 0, 14),
+    ]
+    assert key_filter.key(None, False, 0x25, 0) == [(KEY_RESET, False, 0, 0)]
+    assert key_filter.key(None, False, 0x25, 0) == []
+
+
+def test_engine_applies_reset_and_barrier_counts():
+    engine = _engine([Snippet(abbreviation="btw", expansion="by the way", trigger=TriggerType.SPACE)])
+    events = [("b", False, 0, 1), (KEY_RESET, False, 0, 0), ("t", False, 0, 2), ("w", False, 0, 3), (" ", False, 0, 4)]
+    assert engine.process_keys(events) == []
+
+    events = [(KEY_BARRIER, False, 3, 1), ("b", False, 0, 2), ("t", False, 0, 3), ("w", False, 0, 4), (" ", False, 0, 5)]
+    expansions = engine.process_keys(events)
+    assert batch_replacement(events, expansions) == (3, "y the way", 0)
+
+    table = relevance_table(engine.index.current)
+    assert table["alphabet"] == "btw" and table["suffixes"] == ["tw "]
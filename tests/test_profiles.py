@@ -0,0 +1,79 @@
+from src.common.models import Profile, Snippet, TriggerType
+from src.engine.core import ExpansionEngine
+from src.engine.store import Store
+from tests.test_engine import MockStore
+
+
+def type_text(engine, text):
+    results = [engine.process_key(char) for char in text]
+    return [r for r in results if r]
+
+
+def make_engine():
+    store = MockStore()
+    store.snippets.append(Snippet(abbreviation="sig", expansion="Regards", trigger=TriggerType.SPACE))
+    store.profiles.append(Profile(
+        name="Editor",
+        target_apps=["Code.exe"],
+        snippets=[
+            Snippet(abbreviation="sig", expansion="-- dev", trigger=TriggerType.SPACE),
+            Snippet(abbreviation="fn", expansion="function", trigger=TriggerType.SPACE),
+        ],
+    ))
+    return ExpansionEngine(store)
+
+
+def test_foreground_app_selects_profile_index():
+    engine = make_engine()
+    # Profiles are compiled on first use only
+    assert engine.profiles.loaded() == []
+    assert type_text(engine, "fn sig ") == [(4, "Regards", 0)]
+
+    engine.set_app("C:\\Program Files\\VS Code\\code.exe")
+    assert engine.profiles.wait(2)
+    assert len(engine.profiles.loaded()) == 1
+    # The profile wins a tie with the global library
+    assert type_text(engine, "fn sig ") == [(3, "function", 0), (4, "-- dev", 0)]
+    assert engine.process_keys([(c, False) for c in "fn "]) == [(2, (3, "function", 0))]
+    # Hook-side matches of profile snippets render too
+    profile_snippet = engine.store.profiles[0].snippets[0]
+    assert engine.render(profile_snippet.id) == ("-- dev", 0)
+
+    engine.set_app("notepad.exe")
+    assert type_text(engine, "fn sig ") == [(4, "Regards", 0)]
+    engine.profiles.stop()
+
+
+def test_relevance_covers_compiled_profiles():
+    engine = make_engine()
+    assert "f" not in engine.relevance()["alphabet"]
+    engine.set_app("code.exe")
+    engine.profiles.wait(2)
+    assert "fn " in engine.relevance()["suffixes"]
+    engine.profiles.stop()
+
+
+def test_profile_edits_persist_and_recompile(tmp_path):
+    store = Store(str(tmp_path / "store.json"))
+    engine = ExpansionEngine(store)
+    store.subscribe(engine.on_store_change)
+    profile = Profile(name="Mail", target_apps=["outlook.exe"], snippets=[
+        Snippet(abbreviation="hi", expansion="Hello", trigger=TriggerType.SPACE),
+    ])
+    store.add_profile(profile)
+    engine.set_app("OUTLOOK.EXE")
+    engine.profiles.wait(2)
+    assert type_text(engine, "hi ") == [(3, "Hello", 0)]
+
+    edited = profile.model_copy(update={"snippets": [
+        Snippet(abbreviation="hi", expansion="Hi there", trigger=TriggerType.SPACE),
+    ]})
+    store.update_profile(edited)
+    engine.profiles.wait(2)
+    assert type_text(engine, "hi ") == [(3, "Hi there", 0)]
+
+    reloaded = Store(str(tmp_path / "store.json"))
+    assert [p.snippets[0].expansion for p in reloaded.profiles] == ["Hi there"]
+    store.delete_profile(profile.id)
+    assert type_text(engine, "hi ") == []
+    engine.profiles.stop()
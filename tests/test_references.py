@@ -0,0 +1,107 @@
+from src.common.models import Snippet, TriggerType
+from src.engine.core import ExpansionEngine
+from src.engine.references import MAX_DEPTH, ReferenceGraph
+from src.engine.snapshot import SnapshotColumns
+from src.engine.store import Store
+from src.engine.templates import ExpansionTemplate
+from tests.test_engine import MockStore
+
+
+def _graph(**expansions):
+    snippets = {abbr: Snippet(abbreviation=abbr, expansion=text) for abbr, text in expansions.items()}
+    graph = ReferenceGraph()
+    graph.load(lambda: list(snippets.values()))
+    return graph, snippets
+
+
+def test_nested_static_references_are_prerendered():
+    graph, _ = _graph(
+        sig="Best,\nAnn",
+        reply="Thanks!\n{{snippet:sig}}",
+        wrap="Hi,\n{{snippet:reply}}",
+    )
+    template = ExpansionTemplate("{{snippet:wrap}} / {{snippet:sig}}")
+    flat = graph.flatten(template)
+    assert flat.is_static
+    assert flat.text == "Hi,\nThanks!\nBest,\nAnn / Best,\nAnn"
+    # Memoized per source text; templates without references pass through
+    assert graph.flatten(ExpansionTemplate(template.source)) is flat
+    plain = ExpansionTemplate("no refs {{date}}")
+    assert graph.flatten(plain) is plain
+
+
+def test_cycles_missing_and_deep_references_render_empty():
+    chain = {f"c{i}": f"{i}{{{{snippet:c{i + 1}}}}}" for i in range(MAX_DEPTH + 4)}
+    graph, snippets = _graph(a="A{{snippet:b}}", b="B{{snippet:a}}", top="<{{snippet:a}}{{snippet:nope}}>", **chain)
+    assert graph.flatten(ExpansionTemplate("{{snippet:top}}")).text == "<>"
+    assert graph.cyclic == {"a", "b"}
+    deep = graph.flatten(ExpansionTemplate("{{snippet:c0}}")).text
+    assert deep == "".join(str(i) for i in range(MAX_DEPTH))
+
+    # Breaking the cycle brings its members and their dependents back
+    graph.upsert(snippets["b"].model_copy(update={"expansion": "B"}))
+    assert graph.cyclic == frozenset()
+    assert graph.flatten(ExpansionTemplate("{{snippet:top}}")).text == "<AB>"
+
+
+def test_depth_limit_does_not_stick_to_shared_links():
+    chain = {f"a{i}": f"x{i}{{{{snippet:a{i + 1}}}}}" for i in range(18)}
+    graph, _ = _graph(a18="END", **chain)
+    cut = "".join(f"x{i}" for i in range(MAX_DEPTH))
+    assert graph.flatten(ExpansionTemplate("{{snippet:a0}}")).text == cut
+    assert graph.flatten(ExpansionTemplate("{{snippet:a15}}")).text == "x15x16x17END"
+    graph, _ = _graph(a18="END", **chain)
+    assert graph.flatten(ExpansionTemplate("{{snippet:a15}}")).text == "x15x16x17END"
+    assert graph.flatten(ExpansionTemplate("{{snippet:a0}}")).text == cut
+
+
+def test_change_invalidates_only_dependents():
+    graph, snippets = _graph(sig="Ann", reply="Thanks {{snippet:sig}}", other="Bye {{snippet:name}}", name="Bob")
+    reply = ExpansionTemplate("{{snippet:reply}}")
+    other = ExpansionTemplate("{{snippet:other}}")
+    assert graph.flatten(reply).text == "Thanks Ann"
+    kept = graph.flatten(other)
+
+    graph.upsert(snippets["sig"].model_copy(update={"expansion": "Ann{{cursor}}!"}))
+    assert graph.invalidated == 2  # sig and reply
+    assert graph.flatten(other) is kept
+    flat = graph.flatten(reply)
+    assert (flat.text, flat.cursor_offset) == ("Thanks Ann!", 1)
+
+    graph.delete(snippets["name"].id)
+    assert graph.flatten(other).text == "Bye "
+
+
+def test_engine_expands_nested_snippets_and_follows_edits():
+    store = MockStore()
+    sig = Snippet(abbreviation="sig", expansion="-- {{date:%Y}}Ann")
+    store.snippets.extend([sig, Snippet(abbreviation="ty", expansion="Thanks!{{cursor}} {{snippet:sig}}")])
+    engine = ExpansionEngine(store)
+    engine.resolver.registry.lookup("date")[0].resolve = lambda _: "D"
+
+    result = engine.process_keys([(c, False) for c in "ty"])
+    assert result == [(1, (2, "Thanks! -- DAnn", 8))]
+
+    sig.expansion = "-- Bob"
+    engine.on_store_change("upsert", sig)
+    result = engine.process_keys([(c, False) for c in "ty"])
+    assert result == [(1, (2, "Thanks! -- Bob", 7))]
+
+
+def test_cached_library_bodies_stay_encoded(tmp_path, monkeypatch):
+    path = str(tmp_path / "store.json")
+    store = Store(path)
+    store.snippets = [Snippet(abbreviation=f"a{i}", expansion=f"body {i} " * 50) for i in range(50)]
+    store.snippets.append(Snippet(abbreviation="sig", expansion="Ann"))
+    store.snippets.append(Snippet(abbreviation="ty", expansion="Thanks {{snippet:sig}}", trigger=TriggerType.SPACE))
+    store.save()
+
+    decoded = []
+    expansion = SnapshotColumns.expansion
+    monkeypatch.setattr(SnapshotColumns, "expansion", lambda self, row: decoded.append(row) or expansion(self, row))
+    engine = ExpansionEngine(Store(path))
+    assert decoded == [] and not engine.references.built
+
+    assert engine.process_keys([(c, False) for c in "ty "]) == [(2, (3, "Thanks Ann", 0))]
+    # The matched body, then the one body mentioning a reference and its target
+    assert sorted(decoded) == [50, 51, 51]
@@ -0,0 +1,51 @@
+from src.engine.core import ExpansionEngine
+from src.engine.session import (
+    REDACTED_CHAR,
+    SessionRecorder,
+    diff_decisions,
+    read_session,
+    replay,
+)
+from src.common.models import Snippet, TriggerType
+from tests.test_engine import MockStore
+
+
+def _engine(*snippets):
+    store = MockStore()
+    store.snippets.extend(snippets)
+    return ExpansionEngine(store)
+
+
+def test_record_redact_and_replay(tmp_path):
+    path = str(tmp_path / "session.bin")
+    engine = _engine(Snippet(abbreviation="btw", expansion="by the way", trigger=TriggerType.SPACE))
+
+    recorder = SessionRecorder(path, alphabet=lambda: engine.index.current.alphabet)
+    for ch in "xbtw ":
+        recorder.record({"char": ch, "is_backspace": False, "vk_code": ord(ch.upper())})
+    recorder.record({"char": None, "is_backspace": True, "vk_code": 8})
+    recorder.close()
+
+    events = list(read_session(path))
+    assert [e.char for e in events] == [REDACTED_CHAR, "b", "t", "w", " ", None]
+    assert events[0].redacted and events[-1].is_backspace
+    assert events[0].vk_code == 0 and events[1].vk_code == ord("B")
+
+    result = replay(_engine(Snippet(abbreviation="btw", expansion="by the way", trigger=TriggerType.SPACE)), events)
+    assert result.decisions == [(4, (4, "by the way", 0))]
+    assert result.profile()["events"] == 6
+
+
+def test_diff_between_engines(tmp_path):
+    path = str(tmp_path / "session.bin")
+    recorder = SessionRecorder(path)
+    for ch in "omg":
+        recorder.record({"char": ch})
+    recorder.close()
+    events = list(read_session(path))
+
+    baseline = replay(_engine(Snippet(abbreviation="omg", expansion="oh my god")), events)
+    candidate = replay(_engine(), events)
+    assert diff_decisions(baseline, candidate) == [
+        {"event": 2, "baseline": (3, "oh my god", 0), "candidate": None}
+    ]
@@ -0,0 +1,139 @@
+import os
+
+from benchmarks.synthetic import generate_library, generate_typing_stream
+from src.common.flat_index import FlatIndex
+from src.common.constants import KEY_RESET
+from src.common.models import Profile, Snippet, TriggerType
+from src.engine.core import TRIGGER_MAP, ExpansionEngine
+from src.engine.buffer import KeyBuffer
+from src.engine.shared_index import SharedIndexWriter, compile_flat
+from src.hook.local_match import LocalMatcher
+from tests.test_engine import MockStore
+
+
+def _name():
+    return f"txidx_test_{os.getpid()}"
+
+
+def test_flat_index_matches_like_the_matcher():
+    library = generate_library(500, seed=3)
+    store = MockStore()
+    store.snippets = library
+    engine = ExpansionEngine(store)
+    matcher = engine.matcher
+    flat = FlatIndex(compile_flat(matcher, 1, TRIGGER_MAP).tobytes())
+
+    buffer = KeyBuffer(100)
+    matches = 0
+    for char, is_backspace in generate_typing_stream(library, 5000, seed=3):
+        if is_backspace:
+            buffer.pop()
+            continue
+        buffer.push(char)
+        expected = matcher.match(buffer, TRIGGER_MAP.get(char))
+        found = flat.match(buffer, char)
+        if expected is None:
+            assert found is None
+            continue
+        matches += 1
+        entry, chars_to_delete = found
+        assert (flat.entry_id(entry), chars_to_delete) == (expected[0].id, expected[1])
+        buffer.clear()
+    assert matches > 20
+    flat.release()
+
+
+def test_generations_are_followed_and_rendered_by_the_backend():
+    store = MockStore()
+    store.snippets.append(Snippet(abbreviation="btw", expansion="by the way", trigger=TriggerType.SPACE))
+    engine = ExpansionEngine(store)
+    writer = SharedIndexWriter(_name(), TRIGGER_MAP)
+    local = LocalMatcher(_name())
+    try:
+        writer.publish(engine.index.current)
+        engine.index.subscribe(writer.publish)
+        assert local.ready
+
+        for ch in "btw":
+            assert local.process_key(ch, False) is None
+        snippet_id, backspaces = local.process_key(" ", False)
+        assert backspaces == 4
+        assert engine.render(snippet_id) == ("by the way", 0)
+
+        # A GUI edit: the backend publishes generation 2 and the hook switches to it
+        omg = Snippet(abbreviation="omg", expansion="oh my god", trigger=TriggerType.NONE)
+        engine.on_store_change("upsert", omg)
+        engine.index.wait(2)
+        assert writer.generation == 2
+        for ch in "om":
+            local.process_key(ch, False)
+        assert local.process_key("g", False) == (omg.id, 3)
+        assert local.reader.current().generation == 2
+    finally:
+        engine.index.stop()
+        writer.close()
+    # Backend gone: the hook falls back to sending keys
+    assert not local.ready
+    local.close()
+
+
+def test_apps_with_profiles_send_keys_to_the_backend():
+    store = MockStore()
+    store.snippets.append(Snippet(abbreviation="sig", expansion="Regards", trigger=TriggerType.SPACE))
+    store.profiles.append(Profile(
+        name="Editor", target_apps=["Code.exe"],
+        snippets=[Snippet(abbreviation="sig", expansion="-- dev", trigger=TriggerType.SPACE)],
+    ))
+    engine = ExpansionEngine(store)
+    writer = SharedIndexWriter(_name(), TRIGGER_MAP)
+    local = LocalMatcher(_name())
+    try:
+        writer.publish(engine.index.current)
+        local.set_profile_apps(engine.profiles.apps())
+
+        # No profile for notepad: the hook matches the global index itself
+        local.set_app("C:\\Windows\\notepad.exe")
+        assert local.ready
+        for ch in "sig":
+            local.process_key(ch, False)
+        snippet_id, backspaces = local.process_key(" ", False)
+        assert engine.render(snippet_id) == ("Regards", 0)
+
+        # The editor has a profile: keys go to the backend, which matches it
+        local.set_app("C:\\VS Code\\code.exe")
+        assert not local.ready
+        engine.set_app("code.exe")
+        assert engine.profiles.wait(2)
+        assert engine.process_keys([(c, False) for c in "sig "]) == [(3, (4, "-- dev", 0))]
+
+        local.set_profile_apps([])
+        assert local.ready
+    finally:
+        writer.close()
+        local.close()
+
+
+def test_caret_keys_reset_both_modes_alike():
+    store = MockStore()
+    store.snippets.append(Snippet(abbreviation="abc", expansion="alphabet", trigger=TriggerType.NONE))
+    engine = ExpansionEngine(store)
+    writer = SharedIndexWriter(_name(), TRIGGER_MAP)
+    local = LocalMatcher(_name())
+    vk_left = 0x25
+    try:
+        writer.publish(engine.index.current)
+        for ch in "ab":
+            local.process_key(ch, False)
+        local.other_key(vk_left)
+        assert local.process_key("c", False) is None
+        # What the hook sends the backend for the same keys
+        assert engine.process_keys([("a", False), ("b", False), (KEY_RESET, False), ("c", False)]) == []
+
+        local.other_key(0x10)  # Shift moves nothing
+        for ch in "ab":
+            local.process_key(ch, False)
+        local.other_key(0x10)
+        assert local.process_key("c", False) == (store.snippets[0].id, 3)
+    finally:
+        writer.close()
+        local.close()
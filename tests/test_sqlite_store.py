@@ -0,0 +1,82 @@
+from src.engine.core import ExpansionEngine
+from src.engine.sqlite_store import SQLiteRecord, SQLiteStore
+from src.engine.store import Store
+from src.common.models import Snippet, TriggerType
+
+
+def test_crud_and_lookups(tmp_path):
+    store = SQLiteStore(str(tmp_path / "store.db"))
+    btw = Snippet(abbreviation="btw", expansion="by the way", label="Casual", trigger=TriggerType.SPACE)
+    sig = Snippet(abbreviation="sig", expansion="Best regards,\nAlex", label="Email signature")
+    store.add_snippet(btw)
+    store.add_snippet(sig)
+
+    assert store.get_snippet_by_abbreviation("btw").id == btw.id
+    assert [s.id for s in store.active_snippets(TriggerType.SPACE)] == [btw.id]
+
+    btw.is_active = False
+    store.update_snippet(btw)
+    assert store.get_snippet_by_abbreviation("btw") is None
+
+    store.delete_snippet(sig.id)
+    assert [s.id for s in store.snippets] == [btw.id]
+    store.close()
+
+    # Data survives reopening
+    reopened = SQLiteStore(str(tmp_path / "store.db"))
+    assert reopened.get_snippet(btw.id).is_active is False
+
+
+def test_search_and_engine(tmp_path):
+    store = SQLiteStore(str(tmp_path / "store.db"))
+    store.add_snippet(Snippet(abbreviation="addr", expansion="221B Baker Street", label="Home address"))
+    store.add_snippet(Snippet(abbreviation="omg", expansion="oh my god"))
+
+    assert [s.abbreviation for s in store.search("baker")] == ["addr"]
+    assert [s.abbreviation for s in store.search("addr")] == ["addr"]
+    assert store.search("nothing-here") == []
+
+    engine = ExpansionEngine(store)
+    for ch in "om":
+        engine.process_key(ch)
+    assert engine.process_key("g") == (3, "oh my god", 0)
+
+
+def test_import_json(tmp_path):
+    json_store = Store(str(tmp_path / "store.json"))
+    json_store.snippets = [Snippet(abbreviation="ty", expansion="thank you")]
+    json_store.save()
+
+    store = SQLiteStore(str(tmp_path / "store.db"))
+    assert store.import_json(str(tmp_path / "store.json")) == 1
+    assert store.get_snippet_by_abbreviation("ty").expansion == "thank you"
+
+
+def test_engine_compiles_without_reading_bodies(tmp_path):
+    store = SQLiteStore(str(tmp_path / "store.db"))
+    store.snippets = [Snippet(abbreviation=f"a{i}", expansion=f"body {i}") for i in range(20)]
+    store.add_snippet(Snippet(abbreviation="omg", expansion="oh my god"))
+
+    statements = []
+    store.conn.set_trace_callback(statements.append)
+    engine = ExpansionEngine(store)
+    assert all(isinstance(r, SQLiteRecord) for r in store.match_records())
+    assert not any("expansion" in sql for sql in statements)
+
+    for ch in "om":
+        engine.process_key(ch)
+    assert engine.process_key("g") == (3, "oh my god", 0)
+    assert sum("SELECT expansion" in sql for sql in statements) == 1
+
+
+def test_like_search_matches_wildcards_literally(tmp_path):
+    store = SQLiteStore(str(tmp_path / "store.db"))
+    store.has_fts = False
+    store.add_snippet(Snippet(abbreviation="pct", expansion="100% sure"))
+    store.add_snippet(Snippet(abbreviation="snake", expansion="snake_case"))
+    store.add_snippet(Snippet(abbreviation="path", expansion="C:\\temp"))
+    store.add_snippet(Snippet(abbreviation="plain", expansion="nothing special"))
+
+    assert [s.abbreviation for s in store.search("%")] == ["pct"]
+    assert [s.abbreviation for s in store.search("_")] == ["snake"]
+    assert [s.abbreviation for s in store.search("\\")] == ["path"]
@@ -0,0 +1,145 @@
+import json
+import os
+
+from src.engine.store import Store
+from src.common.models import Snippet
+
+
+def test_journal_mode_appends_and_replays(tmp_path):
+    path = str(tmp_path / "store.json")
+    store = Store(path)
+    kept = Snippet(abbreviation="btw", expansion="by the way")
+    gone = Snippet(abbreviation="omg", expansion="oh my god")
+    store.snippets = [kept, gone]
+    store.save()
+    snapshot = open(path, "rb").read()
+
+    store = Store(path, journal=True)
+    edited = store.snippets[0]
+    edited.expansion = "by the way!"
+    store.update_snippet(edited)
+    store.delete_snippet(gone.id)
+    store.add_snippet(Snippet(abbreviation="ty", expansion="thank you"))
+    store.close()
+
+    # The snapshot is untouched; the edits live in the journal
+    assert open(path, "rb").read() == snapshot
+    assert len(open(path + ".journal").read().splitlines()) == 3
+
+    reloaded = Store(path)
+    assert [(s.abbreviation, s.expansion) for s in reloaded.snippets] == [
+        ("btw", "by the way!"),
+        ("ty", "thank you"),
+    ]
+
+
+def test_compaction_folds_journal_into_snapshot(tmp_path):
+    path = str(tmp_path / "store.json")
+    store = Store(path, journal=True)
+    for i in range(5):
+        store.add_snippet(Snippet(abbreviation=f"a{i}", expansion=str(i)))
+    store.flush()
+    store.compact()
+    store.close()
+
+    assert not os.path.exists(path + ".journal")
+    assert not os.path.exists(path + ".journal.old")
+    assert len(json.load(open(path))) == 5
+
+
+def test_torn_journal_tail_is_ignored(tmp_path):
+    path = str(tmp_path / "store.json")
+    store = Store(path, journal=True)
+    store.add_snippet(Snippet(abbreviation="btw", expansion="by the way"))
+    store.close()
+    with open(path + ".journal", "a") as f:
+        f.write('{"op": "upsert", "snip')
+
+    assert [s.abbreviation for s in Store(path).snippets] == ["btw"]
+
+
+def test_append_after_torn_journal_tail_survives(tmp_path):
+    path = str(tmp_path / "store.json")
+    store = Store(path, journal=True)
+    store.add_snippet(Snippet(abbreviation="a1", expansion="one"))
+    store.close()
+    with open(path + ".journal", "a") as f:
+        f.write('{"op":"upsert","snip')
+
+    store = Store(path, journal=True)
+    store.add_snippet(Snippet(abbreviation="a2", expansion="two"))
+    store.close()
+    assert [s.abbreviation for s in Store(path).snippets] == ["a1", "a2"]
+
+
+def test_snapshot_cache_restores_lazily(tmp_path):
+    from src.engine.snapshot import LazySnippetList, cache_path
+
+    path = str(tmp_path / "store.json")
+    store = Store(path)
+    store.snippets = [Snippet(abbreviation=f"a{i}", expansion=str(i)) for i in range(3)]
+    store.save()
+    assert os.path.exists(cache_path(path))
+
+    cached = Store(path)
+    assert isinstance(cached.snippets, LazySnippetList)
+    assert cached.snippets.materialized == 0
+    assert [r.abbreviation for r in cached.match_records()] == ["a0", "a1", "a2"]
+    assert cached.snippets.materialized == 0
+
+    snippet = cached.snippets[1]
+    assert snippet.id == store.snippets[1].id
+    assert snippet.created_at == store.snippets[1].created_at
+    assert cached.snippets.materialized == 1
+
+
+def test_snapshot_cache_is_invalidated_by_edits(tmp_path):
+    from src.engine.snapshot import LazySnippetList
+
+    path = str(tmp_path / "store.json")
+    store = Store(path)
+    store.snippets = [Snippet(abbreviation="btw", expansion="by the way")]
+    store.save()
+
+    # Same content, new mtime: still served from the cache
+    os.utime(path, ns=(1, 1))
+    assert isinstance(Store(path).snippets, LazySnippetList)
+
+    # Edited behind our back: the cache must not be trusted
+    data = json.load(open(path))
+    data[0]["expansion"] = "BY THE WAY"
+    with open(path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    reloaded = Store(path)
+    assert not isinstance(reloaded.snippets, LazySnippetList)
+    assert reloaded.snippets[0].expansion == "BY THE WAY"
+
+
+def test_bodies_are_mapped_and_read_on_demand(tmp_path):
+    import glob
+    from src.engine.core import ExpansionEngine
+
+    path = str(tmp_path / "store.json")
+    legal = "Lorem ipsum dolor sit amet. " * 200
+    store = Store(path)
+    store.snippets = [
+        Snippet(abbreviation=";legal", expansion=legal),
+        Snippet(abbreviation=";ty", expansion="thank you"),
+    ]
+    store.save()
+    store.save()
+    # Every cache write gets a new body file; the stale one is cleaned up
+    assert len(glob.glob(path + ".bodies.*")) == 1
+
+    cached = Store(path)
+    columns = cached.snippets.columns
+    assert columns.compressed == b"\x01\x00"
+    assert columns.offsets[-1] < len(legal)
+    assert [r.preview(11) for r in cached.match_records()] == ["Lorem ipsum", "thank you"]
+
+    engine = ExpansionEngine(cached)
+    for ch in ";legal":
+        result = engine.process_key(ch)
+    assert result == (6, legal, 0)
+    assert cached.snippets.materialized == 0
+    assert cached.get_snippet(store.snippets[1].id).expansion == "thank you"
@@ -0,0 +1,77 @@
+from src.common.constants import MSG_RELOAD_CONFIG
+from src.common.models import Snippet
+from src.engine.core import ExpansionEngine
+from src.engine.store import Store
+from src.engine.sync import ChangeForwarder
+
+
+class LoopbackClient:
+    """Delivers RELOAD_CONFIG messages straight to a backend store."""
+
+    def __init__(self, backend_store):
+        self.backend_store = backend_store
+        self.sent = []
+
+    def connect(self):
+        pass
+
+    def send(self, msg):
+        self.sent.append(msg)
+        assert msg["type"] == MSG_RELOAD_CONFIG
+        self.backend_store.apply_records(msg["payload"]["records"])
+
+    def close(self):
+        pass
+
+
+def type_keys(engine, keys):
+    result = None
+    for ch in keys:
+        result = engine.process_key(ch)
+    return result
+
+
+def test_gui_edits_patch_the_backend_without_reloading(tmp_path):
+    path = str(tmp_path / "store.json")
+    seed = Store(path)
+    seed.snippets = [Snippet(abbreviation=";a", expansion="alpha")]
+    seed.save()
+
+    backend = Store(path)
+    engine = ExpansionEngine(backend)
+    backend.subscribe(engine.on_store_change)
+    backend.load = lambda: (_ for _ in ()).throw(AssertionError("full reload"))
+
+    gui = Store(path, journal=True)
+    client = LoopbackClient(backend)
+    gui.subscribe(ChangeForwarder(lambda: client))
+
+    added = Snippet(abbreviation=";b", expansion="beta")
+    gui.add_snippet(added)
+    edited = gui.get_snippet(seed.snippets[0].id)
+    edited.expansion = "ALPHA"
+    gui.update_snippet(edited)
+    gui.delete_snippet(added.id)
+    gui.close()
+    assert engine.index.wait(timeout=5)
+    engine.index.stop()
+
+    assert len(client.sent) == 3
+    assert [s.expansion for s in backend.snippets] == ["ALPHA"]
+    assert type_keys(engine, ";a") == (2, "ALPHA", 0)
+    assert type_keys(engine, ";b") is None
+
+
+def test_unreachable_backend_is_not_an_error():
+    attempts = []
+
+    class DownClient:
+        def connect(self):
+            attempts.append(1)
+            raise ConnectionRefusedError("backend down")
+
+    forwarder = ChangeForwarder(DownClient)
+    forwarder("upsert", Snippet(abbreviation="x", expansion="y"))
+    forwarder("delete", "some-id")
+    # The second change falls inside the reconnect back-off
+    assert len(attempts) == 1
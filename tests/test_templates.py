@@ -0,0 +1,29 @@
+from src.engine.templates import ExpansionTemplate
+from src.engine.placeholders import PlaceholderResolver
+
+
+def test_static_template_is_prerendered():
+    template = ExpansionTemplate("Hello {{cursor}}world {{unknown}}")
+    assert template.is_static
+    assert template.text == "Hello world {{unknown}}"
+    assert template.cursor_offset == len("world {{unknown}}")
+
+
+def test_only_contained_slots_are_resolved():
+    template = ExpansionTemplate("On {{date}}: {{cursor}}{{clipboard}}!")
+    calls = []
+
+    def resolve_slot(name):
+        calls.append(name)
+        return "<" + name + ">"
+
+    text, cursor_offset = template.render(resolve_slot)
+    assert text == "On <date>: <clipboard>!"
+    assert cursor_offset == len("<clipboard>!")
+    assert sorted(calls) == ["clipboard", "date"]
+
+
+def test_resolver_renders_dates():
+    text, cursor_offset = PlaceholderResolver().render(ExpansionTemplate("{{date}} {{time}}"))
+    assert len(text) == len("2024-01-01 12:00")
+    assert cursor_offset == 0